@@ -1,222 +1,148 @@
-import time
-import networkx as nx
-
-big_int = 1000000
-class AlphaBetaPlayer:
-    def __init__(self):
-        self.loc = None
-        self.board = None
-        self.directions = [(1, 0), (0, 1), (-1, 0), (0, -1)]
-        self.opp_loc = None
-        # self.alpha = -float('inf')
-        # self.beta = float('inf')
+from functools import partial
+from SearchEngine import SearchEngine, ORDERED, big_int
+from Evaluators import TerritoryEvaluator, load_weights, evaluator_weights
+from Pondering import Ponderer
+from LazySMP import LazySMP, SharedTranspositionTable
+from EndgameSolver import EndgameSolver
+from OpeningBook import OpeningBook, engine_fingerprint
+from Tablebase import Tablebase
+
+endgame_time_share = 0.5  # of the move's time, for the endgame solver before falling back to the search
+class AlphaBetaPlayer(SearchEngine):
+    def __init__(self, tt_memory_mb=64, use_pvs=False, ponder=False, smp_workers=0, use_chambers=False,
+                 use_book=True, use_tablebase=True, weights_file=None):
+        # weights_file: evaluator weights (TuneWeights.py) instead of the ones Evaluators loaded, to compare them
+        weights = load_weights(weights_file) if weights_file is not None else evaluator_weights
+        super().__init__(evaluator=partial(TerritoryEvaluator, use_chambers=use_chambers, weights=weights),
+                         policy=ORDERED, tt_memory_mb=tt_memory_mb, use_pvs=use_pvs)
+        self.use_chambers = use_chambers
+        self.weights_file = weights_file
+        self.weights = weights
+        self.ponderer = None
+        self.pondered_answer = None
+        self.smp_workers = smp_workers
+        self.smp = None
+        self.endgame = None
+        self.endgame_result = None
+        self.use_book = use_book
+        self.book = None
+        self.use_tablebase = use_tablebase
+        self.tablebase = None
+        self.set_pondering(ponder)
 
     def set_game_params(self, board):
-        self.board = board
-        for i, row in enumerate(board):
-            for j, val in enumerate(row):
-                if val == 1:
-                    self.loc = (i, j)
-                if val == 2:
-                    self.opp_loc = (i, j)
+        super().set_game_params(board)
+        if self.ponderer is not None:  # the last game's answers would be taken for this game's
+            self.ponderer.new_game(board)
+        self.pondered_answer = None
+        self.endgame_result = None
+        self.endgame = EndgameSolver(self.state)
+        # None when no valid book was built for the map and this configuration
+        self.book = OpeningBook.find(board, engine_fingerprint(self)) if self.use_book else None
+        if self.tablebase is not None:  # the previous game's
+            self.tablebase.close()
+        self.tablebase = Tablebase.find(board) if self.use_tablebase else None  # None when the map was not solved
+        if self.smp_workers > 0:
+            # Lazy SMP: helper processes search the same root and share the transposition table with us. The
+            # helpers only search: no table of their own (they attach to ours), no book and no tablebase
+            self.stop_smp()
+            self.tt = SharedTranspositionTable(self.tt_memory_mb)
+            make_player = partial(AlphaBetaPlayer, 0, self.use_pvs, use_chambers=self.use_chambers,
+                                  weights_file=self.weights_file, use_book=False, use_tablebase=False)
+            self.smp = LazySMP(self.smp_workers, make_player, self.state, self.tt)
+
+    def set_pondering(self, ponder: bool):
+        # the worker searches with a fresh player of the same configuration, without pondering, book or tablebase
+        assert not ponder or self.tt is not None, 'pondering sends back transposition table entries, ' \
+                                                  'it needs tt_memory_mb > 0'
+        self.stop_pondering()
+        make_player = partial(AlphaBetaPlayer, self.tt_memory_mb, self.use_pvs, use_chambers=self.use_chambers,
+                              weights_file=self.weights_file, use_book=False, use_tablebase=False)
+        self.ponderer = Ponderer(make_player) if ponder else None
+        if self.ponderer is not None and self.state is not None:  # turned on in a game
+            self.ponderer.new_game(self.state.to_array())
+
+    def stop_pondering(self):
+        # ends the ponder worker process, the next game starts it again
+        if self.ponderer is not None:
+            self.ponderer.close()
+
+    def stop_smp(self):
+        if self.smp is not None:
+            self.smp.close()
+            self.smp = None
 
     def set_rival_move(self, loc):
-        self.board[self.opp_loc] = -1
-        self.opp_loc = loc
-        self.board[loc] = 2
-
-    def get_player_loc(self, player: int):
-        return self.loc if player == 1 else self.opp_loc
-
-    def get_other_player(self, player: int):
-        return 1 if player == 2 else 2
-
-    def build_graph_from_board(self):
-        g = nx.Graph()
-        for i in range(len(self.board)):
-            for j in range(len(self.board[i])):
-                if self.board[i][j] == 0:
-                    if i < len(self.board) - 1 and self.board[i + 1][j] != -1:
-                        g.add_edge((i, j), (i + 1, j))
-                    if j < len(self.board[i]) - 1 and self.board[i][j + 1] != -1:
-                        g.add_edge((i, j), (i, j + 1))
-                if self.board[i][j] == 1 or self.board[i][j] == 2:
-                    if i < len(self.board) - 1 and self.board[i + 1][j] == 0:
-                        g.add_edge((i, j), (i + 1, j))
-                    if j < len(self.board[i]) - 1 and self.board[i][j + 1] == 0:
-                        g.add_edge((i, j), (i, j + 1))
-        return g.to_undirected()
-
-    def achievable_cells_score(self, graph):
-        my_achievable_cells = len(nx.shortest_path(graph, source=self.loc))
-        opp_achievable_cells = len(nx.shortest_path(graph, source=self.opp_loc))
-        return my_achievable_cells - opp_achievable_cells
-
-    def adjacent_cells_score(self):
-        legal_moves = self.legal_moves_num(1)
-        return -legal_moves if legal_moves > 0 else -5
-
-    def path_between_players_score(self, graph):
-        #  return -sum(1 for _ in nx.all_simple_paths(graph, self.loc, self.opp_loc))
-        return -1 if nx.has_path(graph, self.loc, self.opp_loc) else 1
-
-    def calc_heuristic_val(self, deadline_time) -> float:
-        board_graph = self.build_graph_from_board()
-        score1 = self.achievable_cells_score(board_graph)
-        score2 = self.adjacent_cells_score()
-        score3 = self.path_between_players_score(board_graph)
-        return score1 + score2 + score3
-
-    def get_legal_moves(self, player: int):  # returns the direction!
-        loc = self.get_player_loc(player)
-        for d in self.directions:
-            i = loc[0] + d[0]
-            j = loc[1] + d[1]
-            if 0 <= i < len(self.board) and 0 <= j < len(self.board[0]) and self.board[i][j] == 0:  # then move is legal
-                yield d
-
-    def apply_move(self, player: int, move: (int, int)):
-        assert move in self.get_legal_moves(player)
-        old_loc = self.get_player_loc(player)
-        new_loc = (old_loc[0] + move[0]), (old_loc[1] + move[1])
-        self.board[new_loc] = player
-        self.board[old_loc] = -1
-        if player == 1:
-            self.loc = new_loc
-        else:
-            self.opp_loc = new_loc
-
-    def undo_move(self, player: int, move: (int, int)):
-        curr_loc = self.get_player_loc(player)
-        prev_loc = (curr_loc[0] - move[0]), (curr_loc[1] - move[1])
-        self.board[curr_loc] = 0
-        self.board[prev_loc] = player
-        if player == 1:
-            self.loc = prev_loc
-        else:
-            self.opp_loc = prev_loc
-
-    """
-    checks if game ended for player
-    returns:
-    true in case game ended else false
-    the last 2 return values are relevant for game end case only
-    game result: -1 is player lost, 0 if tie, 1 if winning
-    move to make: if winning or tie then don't make a move, if winning then make a winning move
-    """
-
-    def game_ended(self, player: int) -> (bool, int, (int, int)):
-        if not self.has_moves(player):
-            if not self.has_moves(self.get_other_player(player)):  # tie
-                return True, 0, (0, 0)
-            return True, -1, (0, 0)  # player lost
-
-        #  check winning
-        assert self.has_moves(player)
-        if not self.has_moves(self.get_other_player(player)):
-            winning_move = self.get_final_winning_move(player)
-            # print("looks like player " + str(player) + " winning, my winning move is " + str(self.get_player_loc(player)))
-            if winning_move is None:  # all coming moves will bring a tie
-                return True, 0, self.get_random_legal_move(player)
-            # there is a way to win
-            return True, 1, winning_move
-
-        return False, -2, (-2, -2)
-
-    def get_random_legal_move(self, player):
-        assert self.has_moves(player)
-        for m in self.get_legal_moves(player):
-            return m
-
-    def has_time(self, deadline_time):
-        return time.time() < deadline_time
-
-    def has_moves(self, player):
-        for _ in self.get_legal_moves(player):
-            return True
-        return False
-
-    def legal_moves_num(self, player):
-        return sum(1 for _ in self.get_legal_moves(player))
-
-    def get_final_winning_move(self, player: int) -> (int, int):
-        assert self.has_moves(player)
-        winning_move = None
-        for move in self.get_legal_moves(player):
-            self.apply_move(player, move)
-            if self.has_moves(player):
-                winning_move = move
-            self.undo_move(player, move)
-        return winning_move
-
-    def  AlphaBeta(self, player: int, depth: int, deadline_time, alpha, beta) -> (float, (int, int)):
-        game_ended, utility, move = self.game_ended(player)
-
-        if game_ended:
-            # print("in this move game for player " + str(player) + " ends with utiity " + str(utility))
-            if utility == 1:
-                if player == 1:
-                    return big_int, move
-                return -big_int, move
-            if utility == -1:
-                if player == 1:
-                    return -big_int, move
-                return big_int, move
-            return 0, move
-
-        # assuming we have at least one sec, and function in never called when player has lost -> will always find another move
-        if depth == 0 or not self.has_time(deadline_time):
-            h = self.calc_heuristic_val(deadline_time), self.get_random_legal_move(player)
-            # print("end of recursion wfor payer " + str(player) + "with heursitc :" + str(h))
-            return h
-
-        if player == 1:  # my turn
-            cur_max = -float('inf')
-            best_move = None
-            for move in self.get_legal_moves(player):
-
-                self.apply_move(player, move)
-                res = (self. AlphaBeta(2, depth - 1, deadline_time, alpha, beta))[0]
-                if res > cur_max:
-                    cur_max = res
-                    best_move = move
-                self.undo_move(player, move)
-                alpha = max(alpha,cur_max)
-                if(cur_max >= beta):
-                    break
-            assert best_move is not None  # other wise would not get to here
-            return cur_max, best_move
-        else:  # opponent's turn
-            cur_min = float('inf')
-            worst_move = None
-            for move in self.get_legal_moves(player):
-                self.apply_move(player, move)
-                res = (self. AlphaBeta(1, depth - 1, deadline_time, alpha, beta))[0]
-                if res < cur_min:
-                    cur_min = res
-                    worst_move = move
-                self.undo_move(2, move)
-                beta = min(beta,cur_min)
-                if(cur_min <= alpha):
-                    break
-            assert worst_move is not None  # other wise would not get to here
-            return cur_min, worst_move
+        move = loc[0] - self.opp_loc[0], loc[1] - self.opp_loc[1]
+        if self.ponderer is not None and self.ponderer.is_running():
+            answers, entries = self.ponderer.stop()
+            for key, depth, entry_val, bound, entry_move, _ in entries:
+                self.tt.store(key, depth, entry_val, bound, entry_move)
+            self.pondered_answer = answers.get(move)
+        super().set_rival_move(loc)
 
     def make_move(self, player_time) -> (int, int):
-        deadline_time = player_time + time.time() - 0.2
-        depth = 0
-        best_val = -float('inf')
         move = None
-        alpha = -float('inf')
-        beta = float('inf')
-        while self.has_time(deadline_time) and depth < self.board.size:
-            cut_val, cur_move = self. AlphaBeta(1, depth, deadline_time, alpha, beta)
-            if cut_val > best_val:
-                move = cur_move
-                best_val = cut_val
-            depth += 1
-        new_loc = self.loc[0] + move[0], self.loc[1] + move[1]
-        self.board[self.loc] = -1
-        self.board[new_loc] = 1
-        self.loc = new_loc
+        self.reset_stats()
+        source = 'search'
+        solved = self.tablebase.best_move(self.state) if self.tablebase is not None else None
+        entry = self.book.probe(self.state.hash) if self.book is not None else None
+        if solved is not None:  # perfect play
+            move = solved[2]
+            self.score = solved[0] * big_int
+            source = 'tablebase'
+        elif entry is not None:
+            move, self.completed_depth = entry
+            source = 'book'
+        elif self.endgame.separated():  # an exact solution beats any search, pondered or not
+            move = self.solve_endgame(player_time * endgame_time_share)
+            if move is not None:
+                self.score = self.endgame_result * big_int
+            player_time *= 1 - endgame_time_share
+            source = 'endgame'
+        if move is None and self.pondered_answer is not None and self.pondered_answer[0] >= self.last_search_depth:
+            # the predicted reply came, and it was searched at least as deep as our own last search
+            self.completed_depth, move = self.pondered_answer
+            self.last_search_depth = self.completed_depth
+            source = 'ponder'
+        if move is None:
+            stats_start_time = self.stats_start_time
+            move = self.iterative_deepening(player_time)
+            self.stats_start_time = stats_start_time  # the time of the endgame solver counts too
+            source = 'search'
+        self.stats = self.search_stats(source)
+        self.pondered_answer = None
+        self.play_move(move)
+        if self.ponderer is not None and self.state.has_moves(2) and self.endgame_result is None:
+            entry = self.tt.probe(self.state.hash)
+            self.ponderer.start(self.state, entry[4] if entry is not None else None)
+        return move
+
+    def solve_endgame(self, player_time):
+        # the first move of our longest path, or None if the solver ran out of time.
+        # endgame_result keeps the exact result: 1 win, 0 tie, -1 loss (None when unsolved)
+        self.time_manager.start(player_time)
+        solved = self.endgame.solve(self.time_manager)
+        if solved is None:
+            self.endgame_result = None
+            return None
+        self.endgame_result, move = solved
+        return move
+
+    def start_search(self, player_time):
+        deadline_time = super().start_search(player_time)
+        if self.smp is not None:
+            self.smp.start_search(self.tt.generation, deadline_time)
+        return deadline_time
+
+    def iterative_deepening(self, player_time, max_depth=None) -> (int, int):
+        move = super().iterative_deepening(player_time, max_depth)
+        if self.smp is not None:
+            result = self.smp.stop_search()
+            if result is not None and result[0] > self.completed_depth:
+                self.completed_depth, self.score, move = result
+        if self.pondered_answer is not None and self.pondered_answer[0] > self.completed_depth:
+            self.completed_depth, move = self.pondered_answer
+            self.score = None
+        self.last_search_depth = self.completed_depth
         return move
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+
+import sys
+import time
+import numpy as np
+from MapsGenerator import maps, map_names, build_board
+
+directions = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+padding = 2  # blocked cells around every board: the targets of a move and their neighbors are always in it
+running, blocked, illegal = 0, 1, 2  # the reasons of games, as Match's 'blocked' and 'illegal'
+reason_names = ['running', 'blocked', 'illegal']
+
+
+class BatchGames:
+    def __init__(self, boards, player=1):
+        '''
+        :param boards: (N, H, W) array of N games in Board.map's encoding (-1 blocked, 0 free, 1 and 2 the
+                       players), of the same size (stack_maps pads smaller maps with blocked cells).
+        :param player: the player to move in every game.
+
+        Plays N games at once with the rules of Game: the player to move moves in every game still running,
+        a player that can not move loses, or ties if the other can not move either. Every step is a few NumPy
+        operations over all the games. The boards are kept in an (N, H + 4, W + 4) int8 array with a blocked
+        border (boards is the (N, H, W) view of the games in it), a location is an index into a flat board.
+        winners[k] is -1 while game k runs, then 0 for a tie or the winner, like Game.result, and reasons[k]
+        how it ended (blocked or illegal).
+        '''
+        boards = np.asarray(boards)
+        games_num, height, width = boards.shape
+        self.height, self.width = height, width
+        self.padded_width = width + 2 * padding
+        self.padded = np.full((games_num, height + 2 * padding, self.padded_width), -1, dtype=np.int8)
+        self.boards = self.padded[:, padding:-padding, padding:-padding]
+        self.boards[:] = boards
+        self.flat = self.padded.reshape(games_num, -1)
+        self.offsets = np.array([i * self.padded_width + j for i, j in directions])
+        self.rows = np.arange(games_num)
+        self.locs = np.zeros((games_num, 3), dtype=np.int64)  # locs[:, player], index 0 unused
+        for player_index in (1, 2):
+            found = (self.flat == player_index)
+            assert (found.sum(axis=1) == 1).all(), 'every board needs one cell of player %d' % player_index
+            self.locs[:, player_index] = found.argmax(axis=1)
+        self.player = player
+        self.winners = np.full(games_num, -1, dtype=np.int8)
+        self.reasons = np.full(games_num, running, dtype=np.int8)
+        self.lengths = np.zeros(games_num, dtype=np.int64)  # moves played in every game
+        self.running = self.rows  # the games still running
+        self.history = []  # per step, the direction index every game moved in, -1 for a game that had ended
+
+    @classmethod
+    def from_maps(cls, game_maps, player=1):
+        return cls(stack_maps(game_maps), player)
+
+    @classmethod
+    def from_board(cls, board, games_num, player=1):
+        # games_num copies of one position, e.g. the rollouts of a search
+        return cls(np.broadcast_to(np.asarray(board, dtype=np.int8), (games_num,) + np.shape(board)), player)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def targets(self, player, rows) -> np.ndarray:
+        # (len(rows), 4) flat locations of player's moves in the games of rows, in the order of directions
+        return self.locs[rows, player, None] + self.offsets
+
+    def legal(self, player, rows) -> np.ndarray:
+        return self.flat[rows[:, None], self.targets(player, rows)] == 0
+
+    def free_around(self, cells, rows) -> np.ndarray:
+        # the free neighbors of every cell of cells, (len(rows), k) flat locations in the games of rows
+        return (self.flat[rows[:, None, None], cells[:, :, None] + self.offsets] == 0).sum(axis=2)
+
+    def step(self, policy_1, policy_2=None):
+        '''
+        Ends the games whose player to move can not move and moves that player in all the others.
+        :param policy_1, policy_2: the policies of the players (policy_2 defaults to policy_1), called as
+                                   policy(games, player, rows, legal) with the running games' indices rows and
+                                   their (len(rows), 4) legal moves, returning the index in directions of the
+                                   move of every game of rows. An illegal move loses its game.
+        '''
+        player, other = self.player, 3 - self.player
+        moves = np.full(len(self), -1, dtype=np.int8)
+        rows = self.running
+        targets = self.locs[rows, player, None] + self.offsets
+        legal = self.flat[rows[:, None], targets] == 0
+        stuck = ~legal.any(axis=1)
+        if stuck.any():
+            stuck_rows = rows[stuck]
+            other_stuck = ~self.legal(other, stuck_rows).any(axis=1)
+            self.winners[stuck_rows] = np.where(other_stuck, 0, other)
+            self.reasons[stuck_rows] = blocked
+            rows, legal, targets = rows[~stuck], legal[~stuck], targets[~stuck]
+        if len(rows):
+            policy = policy_1 if player == 1 or policy_2 is None else policy_2
+            choices = np.asarray(policy(self, player, rows, legal), dtype=np.int64)
+            in_range = (0 <= choices) & (choices < len(directions))
+            valid = in_range & legal[np.arange(len(rows)), np.where(in_range, choices, 0)]
+            if not valid.all():
+                self.winners[rows[~valid]] = other
+                self.reasons[rows[~valid]] = illegal
+                rows, choices, targets = rows[valid], choices[valid], targets[valid]
+            new_locs = targets[np.arange(len(rows)), choices]
+            self.flat[rows, self.locs[rows, player]] = -1
+            self.flat[rows, new_locs] = player
+            self.locs[rows, player] = new_locs
+            self.lengths[rows] += 1
+            moves[rows] = choices
+        self.running = rows
+        self.history.append(moves)
+        self.player = other
+
+    def run(self, policy_1, policy_2=None) -> np.ndarray:
+        # plays every game to its end, returns the winners
+        while len(self.running):
+            self.step(policy_1, policy_2)
+        return self.winners
+
+    def moves(self, game_index):
+        # the moves of a game, player 1's first if it moved first, as play_match's MatchResult.moves
+        return [directions[step[game_index]] for step in self.history if step[game_index] >= 0]
+
+    def scores(self, player=1) -> np.ndarray:
+        # player's points of every ended game, a tie is half a point
+        return np.where(self.winners == player, 1.0, np.where(self.winners == 0, 0.5, 0.0))
+
+
+def stack_maps(game_maps) -> np.ndarray:
+    # the boards of game_maps ((size, blocks, starts) each), padded with blocked cells to the largest size
+    height = max(size[0] for size, _, _ in game_maps)
+    width = max(size[1] for size, _, _ in game_maps)
+    boards = np.full((len(game_maps), height, width), -1, dtype=np.int8)
+    for k, (size, blocks, starts) in enumerate(game_maps):
+        boards[k, :size[0], :size[1]] = build_board(size, blocks, starts)
+    return boards
+
+
+def simple_policy(games, player, rows, legal):
+    # SimplePlayer: the move to the cell with the fewest free neighbors, a dead end last, the first of equals
+    free_around = games.free_around(games.targets(player, rows), rows)
+    scores = np.where(free_around == 0, -1, 4 - free_around)
+    scores[~legal] = -2
+    return scores.argmax(axis=1)
+
+
+class RandomPolicy:
+    def __init__(self, seed=None):
+        # a legal move chosen uniformly
+        self.random = np.random.default_rng(seed)
+
+    def __call__(self, games, player, rows, legal):
+        return np.where(legal, self.random.random(legal.shape), -1).argmax(axis=1)
+
+
+class NoisySimplePolicy:
+    def __init__(self, noise=1.5, seed=None):
+        '''
+        simple_policy with uniform noise of up to noise added to the scores, so games from the same position
+        differ (MCTSPlayer's rollout policy).
+        '''
+        self.noise = noise
+        self.random = np.random.default_rng(seed)
+
+    def __call__(self, games, player, rows, legal):
+        free_around = games.free_around(games.targets(player, rows), rows)
+        scores = np.where(free_around == 0, -1, 4 - free_around) + self.noise * self.random.random(legal.shape)
+        scores[~legal] = -np.inf
+        return scores.argmax(axis=1)
+
+
+def replay(game_map, moves):
+    '''
+    Plays moves on game_map with Game, the single game referee.
+    :return: Game.result() after them, None if a move was illegal or the game went on.
+    '''
+    from Game import Game
+    game = Game(*game_map)
+    for move in moves:
+        if game.result() is not None:
+            return None
+        if not game.check_move(game.tup_add(game.board.get_player_location(game.current_player), move)):
+            return None
+    return game.result()
+
+
+def create_flags():
+    d = {'games': 1000, 'maps': list(range(len(maps))), 'policy': 'simple', 'noise': 1.5, 'seed': 0,
+         'check': False}
+    flags_input = sys.argv[1:]
+    while len(flags_input) > 0:
+        flag = flags_input[0]
+        assert flag[0] == '-'
+        flag = flag[1:]
+        if flag == 'check':
+            d['check'] = True
+            flags_input = flags_input[1:]
+            continue
+        val = flags_input[1]
+        if flag == 'maps':
+            d['maps'] = [int(map_index) for map_index in val.split(',')]
+        elif flag == 'policy':
+            assert val in ('simple', 'random', 'noisy'), 'unknown policy ' + val
+            d['policy'] = val
+        elif flag == 'noise':
+            d['noise'] = float(val)
+        else:
+            assert flag in ('games', 'seed'), 'unknown flag ' + flag
+            d[flag] = int(val)
+        flags_input = flags_input[2:]
+    return d
+
+
+if __name__ == '__main__':
+    # python BatchGames.py [-games n] [-maps 0,1] [-policy simple|random|noisy] [-noise x] [-seed n] [-check]
+    # self-play statistics of a policy, games spread over the maps in turn. -check replays every game with Game
+    # and compares its result
+    d = create_flags()
+    game_maps = [maps[d['maps'][k % len(d['maps'])]] for k in range(d['games'])]
+    policy = {'simple': lambda: simple_policy, 'random': lambda: RandomPolicy(d['seed']),
+              'noisy': lambda: NoisySimplePolicy(d['noise'], d['seed'])}[d['policy']]()
+    start = time.time()
+    games = BatchGames.from_maps(game_maps)
+    games.run(policy)
+    seconds = time.time() - start
+    print('%d games in %.2f seconds, %.0f games/sec, %.0f moves/sec' % (
+        len(games), seconds, len(games) / seconds, games.lengths.sum() / seconds))
+    print('%-20s %6s %6s %6s %6s %8s' % ('map', 'games', 'p1', 'p2', 'ties', 'moves'))
+    for map_index in d['maps']:
+        rows = np.array([k for k in range(len(games)) if d['maps'][k % len(d['maps'])] == map_index])
+        winners = games.winners[rows]
+        print('%-20s %6d %5.1f%% %5.1f%% %5.1f%% %8.1f' % (
+            map_names[map_index], len(rows), 100 * (winners == 1).mean(), 100 * (winners == 2).mean(),
+            100 * (winners == 0).mean(), games.lengths[rows].mean()))
+    print('game ends:', ', '.join('%s %d' % (reason_names[reason], (games.reasons == reason).sum())
+                                  for reason in (blocked, illegal) if (games.reasons == reason).any()))
+    if d['check']:
+        mismatches = sum(1 for k in range(len(games)) if replay(game_maps[k], games.moves(k)) != games.winners[k])
+        print('checked against Game:', mismatches, 'mismatches')
+        exit(1 if mismatches else 0)
@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+from BitBoard import BitBoard
+from EndgameSolver import EndgameSolver
+from MapsGenerator import maps, map_names, build_board
+from TimeManager import safety_margin
+
+benchmarks_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks')
+corpus_path = os.path.join(benchmarks_dir, 'corpus.json')
+stages = {'opening': 0.0, 'middle': 0.2, 'late': 0.4}  # share of the map's free cells already blocked
+corpus_seed = 2021
+player_names = ['MinimaxPlayer', 'LiteAlphaBetaPlayer', 'HeavyAlphaBetaPlayer', 'OrderedAlphaBetaPlayer',
+                'ContestPlayer', 'AlphaBetaPlayer', 'MCTSPlayer']
+baseline_path = os.path.join(benchmarks_dir, 'baseline.json')
+# the fast subset of the corpus the regression check runs, positions that are not solved within the check time
+check_positions = ['tunnels_map/opening', 'trick_map/opening', 'ai_map/opening', 'ai_map/middle', 'ai_map/late']
+nps_tolerance = 0.10  # the least relative nodes/sec drop that fails the check, widened by the measured noise
+noise_factor = 3  # the drop must also be this many times the relative spread of the repeated runs
+depth_tolerance = 1  # plies a depth may drop by, widened by the measured noise: an iteration ends around the deadline
+
+
+def make_player(name):
+    # a fresh player of every benchmarked class, the searches alone: no book, tablebase, pondering or helpers
+    module = __import__(name)
+    if name == 'AlphaBetaPlayer':
+        return module.AlphaBetaPlayer(use_book=False, use_tablebase=False)
+    return getattr(module, name)()
+
+
+def playout_move(state, player, rand):
+    # SimplePlayer's wall following (the fewest free neighbors, a dead end last), a random move one time in 4
+    moves = list(state.get_legal_moves(player))
+    if rand.random() < 0.25:
+        return rand.choice(moves)
+    scores = []
+    for move in moves:
+        state.apply_move(player, move)
+        free_around = state.legal_moves_num(player)
+        state.undo_move(player, move)
+        scores.append(free_around if free_around > 0 else 5)
+    return rand.choice([move for move, score in zip(moves, scores) if score == min(scores)])
+
+
+def stage_position(map_index, share, rand):
+    '''
+    Plays the game from the initial map until share of its free cells are blocked.
+    :return: the board as the player to move sees it (itself as 1), None if the game ended first.
+    '''
+    state = BitBoard(build_board(*maps[map_index]))
+    target = state.free_cells_num() - int(share * state.free_cells_num())
+    mover = 1
+    while state.free_cells_num() > target:
+        if not state.has_moves(mover):
+            return None
+        state.apply_move(mover, playout_move(state, mover, rand))
+        mover = 3 - mover
+    if not state.has_moves(1) or not state.has_moves(2):
+        return None
+    board = state.to_array()
+    if mover == 2:
+        board[state.coords[state.locs[1]]], board[state.coords[state.locs[2]]] = 2, 1
+    return board
+
+
+def build_corpus():
+    # one position of every map at every stage, from the first playout (of a fixed seed) that gets there
+    rand = random.Random(corpus_seed)
+    corpus = []
+    for map_index, map_name in enumerate(map_names):
+        for stage, share in stages.items():
+            board = None
+            while board is None:
+                board = stage_position(map_index, share, rand)
+            corpus.append({'name': '%s/%s' % (map_name, stage), 'board': board.astype(int).tolist()})
+    return corpus
+
+
+def load_corpus():
+    with open(corpus_path) as f:
+        return json.load(f)
+
+
+def fixed_time(name, board, seconds):
+    # nodes per second and the depth completed in a move of seconds
+    player = make_player(name)
+    player.set_game_params(board.copy())
+    if name == 'MCTSPlayer':
+        player.make_move(seconds)
+        return {'nps': round(player.stats.nodes_per_second()), 'depth': None}  # rollouts, the tree has no depths
+    player.iterative_deepening(seconds)
+    stats = player.search_stats()
+    return {'nps': round(stats.nodes_per_second()), 'depth': stats.completed_depth, 'ebf': round(stats.ebf, 3),
+            'first_move_cutoff_ratio': round(stats.first_move_cutoff_ratio(), 3)}
+
+
+def time_to_depth(name, board, depth, time_limit):
+    # seconds until the iteration of depth finished, None if it did not within time_limit (or has no depths)
+    if name == 'MCTSPlayer':
+        return None
+    player = make_player(name)
+    player.set_game_params(board.copy())
+    start = time.perf_counter()
+    player.iterative_deepening(time_limit, max_depth=depth)
+    elapsed = time.perf_counter() - start
+    return round(elapsed, 4) if player.completed_depth >= depth else None
+
+
+def peak_memory(name, board, seconds):
+    # peak bytes allocated by set_game_params and a move of seconds, traced apart from the timed runs
+    tracemalloc.start()
+    player = make_player(name)
+    player.set_game_params(board.copy())
+    player.make_move(seconds)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def run(players, times, depth, depth_time_limit, memory_time):
+    '''
+    Every measure of every player on every corpus position.
+    :return: the results document: the settings, the environment and a record per player and position.
+    '''
+    corpus = load_corpus()
+    records = []
+    for name in players:
+        for position in corpus:
+            board = np.array(position['board'], dtype=float)
+            record = {'player': name, 'position': position['name'], 'fixed_time': {}}
+            for seconds in times:
+                record['fixed_time'][str(seconds)] = fixed_time(name, board, seconds)
+            record['time_to_depth'] = time_to_depth(name, board, depth, depth_time_limit)
+            record['peak_memory'] = peak_memory(name, board, memory_time)
+            records.append(record)
+            print(name, position['name'], json.dumps(record['fixed_time']), 'to depth', depth,
+                  record['time_to_depth'], 'memory', record['peak_memory'], file=sys.stderr)
+    return {'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'environment': environment(),
+            'settings': {'times': times, 'depth': depth,
+                         'depth_time_limit': depth_time_limit, 'memory_time': memory_time},
+            'corpus': [position['name'] for position in corpus], 'records': records}
+
+
+def plot(result_paths, out_path):
+    # depth and nodes per second against the move time of every player, one line per results file
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
+    for path in result_paths:
+        with open(path) as f:
+            results = json.load(f)
+        label = os.path.splitext(os.path.basename(path))[0]
+        times = results['settings']['times']
+        for name in sorted({record['player'] for record in results['records']}):
+            records = [record for record in results['records'] if record['player'] == name]
+            nps = [np.mean([record['fixed_time'][str(t)]['nps'] for record in records]) for t in times]
+            ax2.plot(times, nps, marker='o', label='%s %s' % (label, name))
+            if name != 'MCTSPlayer':
+                depths = [np.mean([record['fixed_time'][str(t)]['depth'] for record in records]) for t in times]
+                ax1.plot(times, depths, marker='o', label='%s %s' % (label, name))
+    ax1.set_xlabel('Time')
+    ax1.set_ylabel('Mean depth')
+    ax2.set_xlabel('Time')
+    ax2.set_ylabel('Mean nodes/sec')
+    ax2.set_yscale('log')
+    ax1.legend(loc='upper left', fontsize='small')
+    ax2.legend(loc='upper left', fontsize='small')
+    fig.savefig(out_path)
+    print('saved', out_path)
+
+
+def cpu_model() -> str:
+    # the processor's name: platform.processor() is '' on Linux and only the architecture on macOS
+    if os.path.exists('/proc/cpuinfo'):
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    return line.split(':', 1)[1].strip()
+    if platform.system() == 'Darwin':
+        try:
+            return subprocess.run(['sysctl', '-n', 'machdep.cpu.brand_string'], capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            pass
+    return platform.processor() or platform.machine()
+
+
+def environment() -> dict:
+    # what the numbers depend on besides the code, measurements of different environments are not compared.
+    # usable_cpus: the cores this process may run on (a container or taskset may allow fewer than cpus)
+    return {'python': platform.python_implementation() + ' ' + platform.python_version(),
+            'machine': platform.machine(), 'processor': cpu_model(), 'cpus': os.cpu_count(),
+            'usable_cpus': len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count(),
+            'system': platform.system() + ' ' + platform.release(), 'numpy': np.__version__}
+
+
+def measure(players, seconds, repeats):
+    '''
+    Nodes per second and depth completed in a move of seconds, repeats times for every player and check
+    position. The repeats are rounds over all the measures, so a slow spell of the machine hits all of them.
+    :return: {player: {position: {'nps': [...], 'depth': [...]}}}
+    '''
+    corpus = {position['name']: np.array(position['board'], dtype=float) for position in load_corpus()}
+    caps = depth_caps()
+    samples = {name: {position: {'nps': [], 'depth': []} for position in check_positions} for name in players}
+    for repeat in range(repeats):
+        for name in players:
+            for position in check_positions:
+                result = fixed_time(name, corpus[position], seconds)
+                samples[name][position]['nps'].append(result['nps'])
+                depth = result['depth']
+                samples[name][position]['depth'].append(min(depth, caps[position]) if depth is not None else None)
+        print('round', repeat + 1, 'of', repeats, 'done', file=sys.stderr)
+    return samples
+
+
+def depth_cap(board) -> int:
+    '''
+    The most moves left in a position: the cells either player can reach, and once the players are separated,
+    twice the shorter of their longest path bounds, plus one. A search that completes deeper has solved the
+    position, and how much deeper it goes by the deadline says nothing about the code.
+    '''
+    state = BitBoard(board)
+    solver = EndgameSolver(state)
+    regions = {player: solver.region(state.locs[player], state.free) for player in (1, 2)}
+    if solver.separated():
+        return 2 * min(solver.upper_bound(state.locs[player], regions[player]) for player in (1, 2)) + 1
+    return bin(regions[1] | regions[2]).count('1')
+
+
+def depth_caps() -> dict:
+    # depth_cap of every check position
+    return {position['name']: depth_cap(np.array(position['board'])) for position in load_corpus()
+            if position['name'] in check_positions}
+
+
+def deviation(values) -> float:
+    # the median absolute deviation of repeated measures
+    return float(np.median(np.abs(np.array(values) - np.median(values))))
+
+
+def spread(values) -> float:
+    # relative spread of repeated measures: the median absolute deviation over the median
+    median = np.median(values)
+    return deviation(values) / median if median > 0 else 0.0
+
+
+def unsearched(samples) -> list:
+    # the 'player/position' of samples where a repeat searched nothing: no nodes, or no completed iteration
+    return ['%s/%s' % (name, position) for name, positions in samples.items()
+            for position, measures in positions.items()
+            if min(measures['nps']) <= 0 or any(depth is not None and depth < 0 for depth in measures['depth'])]
+
+
+def compare(baseline, current):
+    '''
+    :return: (rows, failed): a row (player, position, measure, baseline, current, change, status) for every
+             measure, failed if any of them regressed.
+    Nodes per second fail when the median dropped by more than max(nps_tolerance, noise_factor times the
+    spread of both runs). Nodes per second of a player also fail as a whole, with the same threshold on the
+    geometric mean of its position ratios, which is less noisy than any one position. A depth fails when the
+    median dropped by more than depth_tolerance plus noise_factor times the deviation of both runs, the
+    depths capped at the moves left in the position (depth_caps).
+    '''
+    caps = depth_caps()
+    rows = []
+    failed = False
+    for name, positions in current.items():
+        if name not in baseline:
+            rows.append((name, '-', '-', '-', '-', '-', 'NEW'))
+            continue
+        ratios = []
+        thresholds = []
+        for position, measures in positions.items():
+            old = baseline[name].get(position)
+            if old is None:
+                rows.append((name, position, '-', '-', '-', '-', 'NEW'))
+                continue
+            old_nps, new_nps = np.median(old['nps']), np.median(measures['nps'])
+            threshold = max(nps_tolerance, noise_factor * max(spread(old['nps']), spread(measures['nps'])))
+            ratio = new_nps / old_nps if old_nps > 0 else 1.0
+            ratios.append(ratio)
+            thresholds.append(threshold)
+            status = 'SLOWER' if ratio < 1 - threshold else 'ok'
+            rows.append((name, position, 'nps', round(old_nps), round(new_nps), '%+.1f%%' % (100 * (ratio - 1)),
+                         status))
+            failed |= status != 'ok'
+            if measures['depth'][0] is not None:
+                cap = caps.get(position, float('inf'))
+                old_depths, new_depths = [min(depth, cap) for depth in old['depth']], measures['depth']
+                old_depth, new_depth = np.median(old_depths), np.median(new_depths)
+                allowed = depth_tolerance + noise_factor * max(deviation(old_depths), deviation(new_depths))
+                status = 'SHALLOWER' if old_depth - new_depth > allowed else 'ok'
+                rows.append((name, position, 'depth', old_depth, new_depth, '%+g' % (new_depth - old_depth), status))
+                failed |= status != 'ok'
+        if ratios:
+            ratio = float(np.exp(np.mean(np.log(ratios))))
+            status = 'SLOWER' if ratio < 1 - np.median(thresholds) else 'ok'
+            rows.append((name, 'all', 'nps', '', '', '%+.1f%%' % (100 * (ratio - 1)), status))
+            failed |= status != 'ok'
+    return rows, failed
+
+
+def print_diff(rows):
+    widths = [max(len(str(row[k])) for row in rows) for k in range(len(rows[0]))]
+    for row in rows:
+        print('  '.join(str(cell).ljust(width) for cell, width in zip(row, widths)).rstrip())
+
+
+def save_baseline(path, players, seconds, repeats) -> int:
+    # :return: the exit code: 0 written, 2 not written, a move of seconds searched nothing somewhere
+    if seconds <= safety_margin:
+        print('a move of %g seconds does not search, the players keep %g seconds of it' % (seconds, safety_margin))
+        return 2
+    samples = measure(players, seconds, repeats)
+    empty = unsearched(samples)
+    if empty:
+        print('not written, nothing searched in', ', '.join(empty), '- measure with more -seconds')
+        return 2
+    baseline = {'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'environment': environment(),
+                'settings': {'seconds': seconds, 'repeats': repeats}, 'samples': samples}
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=1)
+    print('wrote', path)
+    return 0
+
+
+def check(path, players, repeats, force=False) -> int:
+    '''
+    Measures the players as the baseline at path was measured and prints the difference.
+    :return: the exit code: 0 no regression, 1 a regression, 2 no baseline, one of another environment
+             (compared anyway with force, the numbers of other hardware or Python mean little) or samples
+             where nothing was searched, in the baseline or now.
+    '''
+    if not os.path.exists(path):
+        print('no baseline at', path, '- create it with: Benchmark.py baseline')
+        return 2
+    with open(path) as f:
+        baseline = json.load(f)
+    current_environment = environment()
+    if baseline['environment'] != current_environment:
+        for key in sorted(set(baseline['environment']) | set(current_environment)):
+            if baseline['environment'].get(key) != current_environment.get(key):
+                print('warning: environment differs:', key, 'baseline', baseline['environment'].get(key), 'now',
+                      current_environment.get(key))
+        if not force:
+            print('not comparing, rebuild the baseline on this environment or check with -force')
+            return 2
+    empty = unsearched(baseline['samples'])
+    if empty:
+        print('not comparing, the baseline searched nothing in', ', '.join(empty), '- rebuild it with more -seconds')
+        return 2
+    samples = measure([name for name in players if name in baseline['samples']], baseline['settings']['seconds'],
+                      repeats if repeats is not None else baseline['settings']['repeats'])
+    empty = unsearched(samples)
+    if empty:
+        print('not comparing, nothing searched now in', ', '.join(empty))
+        return 2
+    rows, failed = compare(baseline['samples'], samples)
+    print_diff([('player', 'position', 'measure', 'baseline', 'now', 'change', 'status')] + rows)
+    print('REGRESSION' if failed else 'no regression', 'against the baseline of', baseline['created'])
+    return 1 if failed else 0
+
+
+def create_flags():
+    d = {'players': player_names, 'times': [0.5, 1.0], 'depth': 12, 'depth_time_limit': 30.0, 'memory_time': 0.5,
+         'out': None, 'seconds': 0.5, 'repeats': None, 'baseline': baseline_path, 'force': False}
+    flags_input = sys.argv[2:]
+    while len(flags_input) > 0:
+        flag = flags_input[0]
+        assert flag[0] == '-'
+        flag = flag[1:]
+        if flag == 'force':
+            d['force'] = True
+            flags_input = flags_input[1:]
+            continue
+        val = flags_input[1]
+        if flag == 'players':
+            d['players'] = val.split(',')
+        elif flag == 'times':
+            d['times'] = [float(t) for t in val.split(',')]
+        elif flag == 'depth':
+            d['depth'] = int(val)
+        elif flag == 'depth_time_limit':
+            d['depth_time_limit'] = float(val)
+        elif flag == 'memory_time':
+            d['memory_time'] = float(val)
+        elif flag == 'seconds':
+            d['seconds'] = float(val)
+        elif flag == 'repeats':
+            d['repeats'] = int(val)
+        elif flag == 'baseline':
+            d['baseline'] = val
+        else:
+            assert flag == 'out', 'unknown flag ' + flag
+            d['out'] = val
+        flags_input = flags_input[2:]
+    return d
+
+
+if __name__ == '__main__':
+    # python Benchmark.py corpus
+    # python Benchmark.py run [-players A,B] [-times 0.5,1] [-depth d] [-depth_time_limit s] [-memory_time s] [-out path]
+    # python Benchmark.py plot results.json [results.json ...] [-out plot.png]
+    # python Benchmark.py baseline [-players A,B] [-seconds s] [-repeats n] [-out path]
+    # python Benchmark.py check [-players A,B] [-repeats n] [-baseline path] [-force]
+    usage = 'usage: Benchmark.py corpus | run [-players A,B] [-times 0.5,1] [-depth d] [-depth_time_limit s] ' \
+            '[-memory_time s] [-out results.json] | plot results.json [...] [-out plot.png] | ' \
+            'baseline [-players A,B] [-seconds s] [-repeats n] [-out path] | ' \
+            'check [-players A,B] [-repeats n] [-baseline path] [-force]'
+    if len(sys.argv) < 2 or sys.argv[1] not in ('corpus', 'run', 'plot', 'baseline', 'check'):
+        print(usage)
+        exit(-1)
+    if sys.argv[1] == 'corpus':
+        os.makedirs(benchmarks_dir, exist_ok=True)
+        with open(corpus_path, 'w') as f:
+            f.write('[\n' + ',\n'.join(json.dumps(position) for position in build_corpus()) + '\n]\n')
+        print('wrote', corpus_path)
+    elif sys.argv[1] == 'run':
+        d = create_flags()
+        results = json.dumps(run(d['players'], d['times'], d['depth'], d['depth_time_limit'], d['memory_time']),
+                             indent=1)
+        if d['out'] is None:
+            print(results)
+        else:
+            with open(d['out'], 'w') as f:
+                f.write(results)
+    elif sys.argv[1] == 'baseline':
+        d = create_flags()
+        exit(save_baseline(d['out'] or baseline_path, d['players'], d['seconds'], d['repeats'] or 5))
+    elif sys.argv[1] == 'check':
+        d = create_flags()
+        exit(check(d['baseline'], d['players'], d['repeats'], d['force']))
+    else:
+        paths = [arg for arg in sys.argv[2:] if not arg.startswith('-')]
+        out = sys.argv[sys.argv.index('-out') + 1] if '-out' in sys.argv else 'benchmark.png'
+        plot([path for path in paths if path != out], out)
@@ -0,0 +1,132 @@
+import random
+import numpy as np
+
+zobrist_seed = 20190613
+
+
+class BitBoard:
+    def __init__(self, board):
+        '''
+        :param board: map as given to set_game_params (-1 blocked, 0 free, 1 me, 2 rival).
+
+        The state is kept in Python ints used as bitmasks over the map, cell (i, j) is bit i * width + j:
+            free - one bit for every free cell.
+            locs - the cell index of each player, locs[1] and locs[2] (locs[0] is unused).
+            hash - Zobrist hash of (blocked cells, both locations, side to move), updated on every move.
+                   The side key is toggled by every move, so it marks an odd number of moves since creation.
+
+        The neighbor mask of every cell and the tuple of legal moves for every pattern of free neighbors
+        are computed once, so get_legal_moves, apply_move and undo_move only do table lookups and
+        integer operations.
+        '''
+        self.height = len(board)
+        self.width = len(board[0])
+        self.directions = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+        self.deltas = {d: d[0] * self.width + d[1] for d in self.directions}
+        cells_num = self.height * self.width
+        self.bits = [1 << k for k in range(cells_num)]
+        self.coords = [(k // self.width, k % self.width) for k in range(cells_num)]
+        self.all_cells = (1 << cells_num) - 1
+
+        self.free = 0
+        self.locs = [None, None, None]
+        for i, row in enumerate(board):
+            for j, val in enumerate(row):
+                k = i * self.width + j
+                if val == 0:
+                    self.free |= self.bits[k]
+                elif val == 1 or val == 2:
+                    self.locs[int(val)] = k
+
+        # fixed seed, so a position has the same hash in every process
+        rand = random.Random(zobrist_seed)
+        self.zobrist_blocked = [rand.getrandbits(64) for _ in range(cells_num)]
+        self.zobrist_locs = [None] + [[rand.getrandbits(64) for _ in range(cells_num)] for _ in range(2)]
+        self.zobrist_side = rand.getrandbits(64)
+        self.hash = self.zobrist_locs[1][self.locs[1]] ^ self.zobrist_locs[2][self.locs[2]]
+        for k in range(cells_num):
+            if not self.free >> k & 1 and k != self.locs[1] and k != self.locs[2]:
+                self.hash ^= self.zobrist_blocked[k]
+
+        self.neighbors = []
+        self.legal_moves_table = []
+        for k, (i, j) in enumerate(self.coords):
+            cell_moves = []
+            for d in self.directions:
+                ni, nj = i + d[0], j + d[1]
+                if 0 <= ni < self.height and 0 <= nj < self.width:
+                    cell_moves.append((d, self.bits[ni * self.width + nj]))
+            mask = 0
+            for _, bit in cell_moves:
+                mask |= bit
+            self.neighbors.append(mask)
+            # every subset of the neighbors, keyed by its mask, keeps the order of self.directions
+            table = {}
+            for subset in range(1 << len(cell_moves)):
+                subset_mask = 0
+                subset_moves = []
+                for index, (d, bit) in enumerate(cell_moves):
+                    if subset >> index & 1:
+                        subset_mask |= bit
+                        subset_moves.append(d)
+                table[subset_mask] = tuple(subset_moves)
+            self.legal_moves_table.append(table)
+
+    def copy(self):
+        # the precomputed tables are shared, only the mutable state is copied
+        other = object.__new__(BitBoard)
+        other.__dict__.update(self.__dict__)
+        other.locs = list(self.locs)
+        return other
+
+    def get_location(self, player: int):
+        return self.coords[self.locs[player]]
+
+    def get_legal_moves(self, player: int):  # returns the directions, in the order of self.directions
+        loc = self.locs[player]
+        return self.legal_moves_table[loc][self.neighbors[loc] & self.free]
+
+    def has_moves(self, player: int) -> bool:
+        return (self.neighbors[self.locs[player]] & self.free) != 0
+
+    def legal_moves_num(self, player: int) -> int:
+        return len(self.get_legal_moves(player))
+
+    def apply_move(self, player: int, move: (int, int)):
+        # the move is assumed legal, the cell left behind is never free again
+        old_loc = self.locs[player]
+        new_loc = old_loc + self.deltas[move]
+        self.free ^= self.bits[new_loc]
+        self.locs[player] = new_loc
+        zobrist_locs = self.zobrist_locs[player]
+        self.hash ^= zobrist_locs[old_loc] ^ zobrist_locs[new_loc] ^ self.zobrist_blocked[old_loc] ^ self.zobrist_side
+
+    def undo_move(self, player: int, move: (int, int)):
+        curr_loc = self.locs[player]
+        prev_loc = curr_loc - self.deltas[move]
+        self.free ^= self.bits[curr_loc]
+        self.locs[player] = prev_loc
+        zobrist_locs = self.zobrist_locs[player]
+        self.hash ^= zobrist_locs[curr_loc] ^ zobrist_locs[prev_loc] ^ self.zobrist_blocked[prev_loc] ^ self.zobrist_side
+
+    def move_to(self, player: int, loc: (int, int)):
+        # for moves reported as a location (set_rival_move), returns the direction that was applied
+        curr_loc = self.coords[self.locs[player]]
+        move = loc[0] - curr_loc[0], loc[1] - curr_loc[1]
+        self.apply_move(player, move)
+        return move
+
+    def free_cells_num(self) -> int:
+        return bin(self.free).count('1')
+
+    def to_array(self):
+        '''
+        :return: the map in the set_game_params convention, as a numpy array of shape (height, width).
+        '''
+        cells_num = self.height * self.width
+        free_bytes = self.free.to_bytes((cells_num + 7) // 8, 'little')
+        free = np.unpackbits(np.frombuffer(free_bytes, dtype=np.uint8), bitorder='little')[:cells_num]
+        board = np.where(free == 1, 0.0, -1.0)
+        board[self.locs[1]] = 1
+        board[self.locs[2]] = 2
+        return board.reshape(self.height, self.width)
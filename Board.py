@@ -24,7 +24,7 @@ class Board:
         for player_index, (i, j) in enumerate(starts):
             self.map[i][j] = player_index + 1
 
-        self.players_locations = starts
+        self.players_locations = list(starts)  # a copy, the maps' starts are shared by every game
         self.current_player = 1
 
     def __getitem__(self, indexes):
@@ -0,0 +1,76 @@
+from VoronoiEvaluator import VoronoiEvaluator
+
+
+class ChamberEvaluator:
+    def __init__(self, state):
+        '''
+        :param state: BitBoard of the map, only its dimensions are used.
+
+        A drop-in replacement for VoronoiEvaluator's territory_score that counts the cells a player can
+        actually fill instead of the cells it reaches first. Each player's Voronoi territory is split into
+        chambers, the biconnected components of its free cells, found with Tarjan's articulation point DFS
+        (iterative, over adjacency lists). The chambers form a tree hanging from the player's cell, and a
+        player entering a chamber through an articulation point can leave it through only one other, so the
+        fillable space is the best chain of chambers from the root, each chamber counted with the checkerboard
+        parity bound of a path entering it at its articulation point.
+        '''
+        self.voronoi = VoronoiEvaluator(state)
+        self.adjacent = []
+        for k in range(len(state.bits)):
+            self.adjacent.append([k + state.deltas[d] for d in state.legal_moves_table[k][state.neighbors[k]]])
+        self.is_black = [(i + j) % 2 == 0 for i, j in state.coords]
+
+    def parity_fill(self, entry, cells) -> int:
+        # the longest a path entering at entry can be in cells, by the checkerboard colors alone
+        entry_black = self.is_black[entry]
+        same = sum(1 for cell in cells if self.is_black[cell] == entry_black)
+        other = len(cells) - same
+        return 2 * same + 1 if other > same else 2 * other
+
+    def fillable(self, cell, region) -> int:
+        '''
+        :param cell: the player's cell.
+        :param region: mask of the free cells the player may use.
+        :return: estimated number of moves the player can make in region.
+        '''
+        adjacent = self.adjacent
+        disc = {cell: 0}
+        low = {cell: 0}
+        visited = []  # cells in discovery order not yet assigned to a chamber
+        best = {}  # articulation point -> best chain of the chambers hanging from it
+        stack = [(cell, iter(adjacent[cell]))]
+        while stack:
+            v, neighbors = stack[-1]
+            for u in neighbors:
+                if not region >> u & 1:
+                    continue
+                if u in disc:
+                    if disc[u] < low[v]:
+                        low[v] = disc[u]
+                    continue
+                disc[u] = low[u] = len(disc)
+                visited.append(u)
+                stack.append((u, iter(adjacent[u])))
+                break
+            else:
+                stack.pop()
+                if not stack:
+                    break
+                parent = stack[-1][0]
+                if low[v] < low[parent]:
+                    low[parent] = low[v]
+                if low[v] >= disc[parent]:  # parent is an articulation point, the chamber under it is complete
+                    index = len(visited) - 1
+                    while visited[index] != v:
+                        index -= 1
+                    chamber = visited[index:]
+                    del visited[index:]
+                    val = self.parity_fill(parent, chamber) + max(best.get(w, 0) for w in chamber)
+                    if val > best.get(parent, 0):
+                        best[parent] = val
+        return best.get(cell, 0)
+
+    def territory_score(self, state):
+        mine, theirs, _, connected = self.voronoi.regions(state)
+        score = self.fillable(state.locs[1], mine) - self.fillable(state.locs[2], theirs)
+        return score, connected
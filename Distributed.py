@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+
+import json
+import multiprocessing
+import os
+import random
+import socket
+import socketserver
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+import numpy as np
+from MapsGenerator import maps, map_names
+from Match import play_match, seeded_opening
+from Tournament import game_players, schedule, load_games, report
+
+default_port = 5577
+wait_seconds = 1.0  # a worker asks again after this long when every job left is running elsewhere
+reconnect_seconds = 2.0
+max_reconnects = 30  # a worker gives up after this many failed connections in a row, the coordinator is gone
+done_seconds = 3.0  # the coordinator stays up this long after the last result, telling waiting workers it is done
+
+
+def make_jobs(specs, map_indices, rounds, time_to_make_a_move, seed, opening_plies, sandbox=False):
+    '''
+    The tournament of Tournament.schedule as jobs. A job's id names the game and the settings it is played with
+    (the results of a run with another move time, seed or openings are not this run's), its index is its place
+    in the schedule (results are aggregated in this order, whatever order they came in). The seed is the
+    schedule's, every game on a map in a round starts from the same opening.
+    '''
+    settings = 'time=%g,seed=%d,opening_plies=%d%s' % (time_to_make_a_move, seed, opening_plies,
+                                                       ',sandbox' if sandbox else '')
+    jobs = []
+    for index, (spec_1, spec_2, map_index, round_index, opening_seed, *_) in enumerate(
+            schedule(specs, map_indices, rounds, time_to_make_a_move, seed=seed, opening_plies=opening_plies)):
+        jobs.append({'id': '%d/%d/%s/%s/%s' % (round_index, map_index, spec_1, spec_2, settings), 'index': index,
+                     'player_1': spec_1, 'player_2': spec_2, 'map': map_index, 'round': round_index,
+                     'seed': opening_seed, 'time': time_to_make_a_move, 'opening_plies': opening_plies,
+                     'sandbox': sandbox})
+    return jobs
+
+
+def run_job(job):
+    # plays the game of a job, with NotAnimatedGame's rules (Match.play_match)
+    random.seed(job['seed'])
+    np.random.seed(job['seed'] % 2 ** 32)
+    game_map = seeded_opening(maps[job['map']], job['opening_plies'], job['seed'])
+    start = time.time()
+    result = play_match(*game_players(job['player_1'], job['player_2'], job['sandbox']), game_map, job['time'])
+    game = {'job': job['id'], 'index': job['index'], 'player_1': job['player_1'], 'player_2': job['player_2'],
+            'map': job['map'], 'round': job['round'], 'seed': job['seed'], 'opening_plies': job['opening_plies'],
+            'seconds': round(time.time() - start, 2)}
+    game.update(result.as_dict())
+    return game
+
+
+class JobQueue:
+    def __init__(self, jobs, done_ids, lease, max_attempts):
+        '''
+        :param done_ids: jobs with a result already, from an earlier run of the coordinator.
+        :param lease: seconds a worker has for a job before it is given to another worker too.
+        :param max_attempts: times a job is handed out before it is given up (a job whose game raised, or
+                             that hangs its workers past the lease).
+
+        A job goes back to the queue when its worker's connection closes before the result came (the
+        worker crashed or was killed), when its lease runs out (the worker's host is gone without closing the
+        connection) or when the worker reports it failed. The first result of a job is kept, a late result of
+        a job that was handed out again is dropped.
+        '''
+        self.lock = threading.Lock()
+        self.pending = deque(job for job in jobs if job['id'] not in done_ids)
+        self.running = {}  # job id -> (job, connection, lease end)
+        self.attempts = {}
+        self.done = set(done_ids)
+        self.failed = {}
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.changed = threading.Event()
+
+    def take(self, connection):
+        # the next job, 'wait' if all the jobs left are running, None when all are done
+        with self.lock:
+            now = time.time()
+            for job_id, (job, _, lease_end) in list(self.running.items()):
+                if lease_end < now:
+                    del self.running[job_id]
+                    self.requeue(job, 'lease expired')
+            if not self.pending:
+                return 'wait' if self.running else None
+            job = self.pending.popleft()
+            self.attempts[job['id']] = self.attempts.get(job['id'], 0) + 1
+            self.running[job['id']] = (job, connection, now + self.lease)
+            return job
+
+    def finish(self, job_id) -> bool:
+        # True for the first result of the job
+        with self.lock:
+            self.running.pop(job_id, None)
+            for job in list(self.pending):  # a late result of a job that was queued again
+                if job['id'] == job_id:
+                    self.pending.remove(job)
+            first = job_id not in self.done
+            self.done.add(job_id)
+            self.failed.pop(job_id, None)  # a late result of a job given up
+            self.changed.set()
+            return first
+
+    def release(self, job_id, error, connection):
+        with self.lock:
+            entry = self.running.get(job_id)
+            if entry is None or entry[1] != connection:  # the job was handed out again meanwhile
+                return
+            del self.running[job_id]
+            self.requeue(entry[0], error)
+
+    def requeue(self, job, error):
+        # a job that did not finish goes back to the queue, or is given up after max_attempts; under the lock
+        job_id = job['id']
+        if self.attempts[job_id] >= self.max_attempts:
+            self.failed[job_id] = error
+            print('job', job_id, 'failed', self.attempts[job_id], 'times, giving up:', error, file=sys.stderr)
+        else:
+            self.pending.append(job)
+        self.changed.set()
+
+    def release_connection(self, connection):
+        # the jobs of a connection that closed go back to the queue
+        with self.lock:
+            job_ids = [job_id for job_id, (_, job_connection, _) in self.running.items()
+                       if job_connection == connection]
+        for job_id in job_ids:
+            print('connection', connection, 'lost with job', job_id, file=sys.stderr)
+            self.release(job_id, 'connection lost', connection)
+
+    def finished(self) -> bool:
+        with self.lock:
+            return not self.pending and not self.running
+
+
+class CoordinatorHandler(socketserver.StreamRequestHandler):
+    '''
+    The protocol is JSON lines, the worker asks and the coordinator answers:
+        {'type': 'request'} -> {'type': 'job', 'job': job} | {'type': 'wait', 'seconds': s} | {'type': 'done'}
+        {'type': 'result', 'game': game} -> {'type': 'ack'}
+        {'type': 'failed', 'job': job id, 'error': text} -> {'type': 'ack'}
+    '''
+    def handle(self):
+        queue = self.server.queue
+        connection = '%s:%d' % self.client_address[:2]
+        try:
+            for line in self.rfile:
+                message = json.loads(line)
+                if message['type'] == 'request':
+                    job = queue.take(connection)
+                    if job is None:
+                        answer = {'type': 'done'}
+                    elif job == 'wait':
+                        answer = {'type': 'wait', 'seconds': wait_seconds}
+                    else:
+                        answer = {'type': 'job', 'job': job}
+                elif message['type'] == 'result':
+                    game = message['game']
+                    if queue.finish(game['job']):
+                        self.server.record(game)
+                    answer = {'type': 'ack'}
+                else:
+                    assert message['type'] == 'failed', 'unknown message ' + message['type']
+                    queue.release(message['job'], message['error'], connection)
+                    answer = {'type': 'ack'}
+                self.wfile.write((json.dumps(answer) + '\n').encode())
+                self.wfile.flush()
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            queue.release_connection(connection)
+
+
+class Coordinator(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, jobs, out_path, lease=3600.0, max_attempts=3):
+        '''
+        Hands out jobs to the workers that connect and appends every first result to out_path as a JSON line.
+        Results of jobs already in out_path are not played again, a restarted coordinator resumes the tournament.
+        Other runs' results in out_path (other players or settings) are left there and not reported.
+        Workers run what the coordinator sends them (player classes and arguments), listen on a trusted
+        network only.
+        '''
+        self.out_path = out_path
+        job_ids = {job['id'] for job in jobs}
+        self.queue = JobQueue(jobs, {game['job'] for game in load_games(out_path) if game.get('job') in job_ids},
+                              lease, max_attempts)
+        self.jobs = jobs
+        self.jobs_num = len(jobs)
+        self.out_lock = threading.Lock()
+        super().__init__(address, CoordinatorHandler)
+
+    def record(self, game):
+        with self.out_lock:
+            with open(self.out_path, 'a') as out:
+                out.write(json.dumps(game) + '\n')
+            print('%d/%d' % (len(self.queue.done), self.jobs_num), game['player_1'], 'vs', game['player_2'],
+                  map_names[game['map']], 'winner', game['winner'], game['reason'], file=sys.stderr)
+
+    def run(self):
+        # serves until every job has a result or was given up, returns the results in the schedule's order
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        while not self.queue.finished():
+            self.queue.changed.wait(1.0)
+            self.queue.changed.clear()
+        time.sleep(done_seconds)
+        self.shutdown()
+        self.server_close()
+        return aggregate(load_games(self.out_path), self.jobs)
+
+
+def aggregate(games, jobs):
+    # one result per job of jobs, in schedule order: the same list whatever workers played the jobs and when.
+    # Lines of other jobs (another run's, or Tournament.py's without a job in a shared file) are left out
+    job_ids = {job['id'] for job in jobs}
+    first = {}
+    for game in games:
+        if game.get('job') in job_ids:
+            first.setdefault(game['job'], game)
+    return sorted(first.values(), key=lambda game: game['index'])
+
+
+def worker_loop(host, port, name):
+    # one worker process: asks for jobs until the coordinator has none left, reconnecting if it went away
+    failures = 0
+    while failures < max_reconnects:
+        try:
+            with socket.create_connection((host, port)) as sock:
+                failures = 0
+                stream = sock.makefile('rwb')
+
+                def ask(message):
+                    stream.write((json.dumps(message) + '\n').encode())
+                    stream.flush()
+                    line = stream.readline()
+                    if not line:
+                        raise ConnectionError('coordinator closed the connection')
+                    return json.loads(line)
+
+                while True:
+                    answer = ask({'type': 'request'})
+                    if answer['type'] == 'done':
+                        return
+                    if answer['type'] == 'wait':
+                        time.sleep(answer['seconds'])
+                        continue
+                    job = answer['job']
+                    try:
+                        game = run_job(job)
+                    except Exception:
+                        ask({'type': 'failed', 'job': job['id'], 'error': traceback.format_exc()})
+                        continue
+                    ask({'type': 'result', 'game': game})
+        except OSError:
+            failures += 1
+            time.sleep(reconnect_seconds)
+    print(name, 'no coordinator at %s:%d, stopping' % (host, port), file=sys.stderr)
+
+
+def run_workers(host, port, processes):
+    # processes worker processes on this host, each with its own connection
+    workers = [multiprocessing.Process(target=worker_loop, args=(host, port, 'worker %d' % k))
+               for k in range(processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def create_flags():
+    d = {'players': ['AlphaBetaPlayer', 'ContestPlayer', 'HeavyAlphaBetaPlayer'], 'maps': list(range(len(maps))),
+         'rounds': 1, 'time': 1.0, 'seed': 0, 'opening_plies': 8, 'host': '127.0.0.1', 'port': default_port,
+         'lease': 3600.0, 'attempts': 3, 'processes': os.cpu_count(), 'out': 'distributed.jsonl', 'sandbox': False}
+    flags_input = sys.argv[2:]
+    while len(flags_input) > 0:
+        flag = flags_input[0]
+        assert flag[0] == '-'
+        flag = flag[1:]
+        if flag == 'sandbox':
+            d['sandbox'] = True
+            flags_input = flags_input[1:]
+            continue
+        val = flags_input[1]
+        if flag == 'players':
+            d['players'] = val.split()
+        elif flag == 'maps':
+            d['maps'] = [int(map_index) for map_index in val.split(',')]
+        elif flag in ('time', 'lease'):
+            d[flag] = float(val)
+        elif flag in ('host', 'out'):
+            d[flag] = val
+        else:
+            assert flag in ('rounds', 'seed', 'opening_plies', 'port', 'attempts', 'processes'), 'unknown flag ' + flag
+            d[flag] = int(val)
+        flags_input = flags_input[2:]
+    return d
+
+
+if __name__ == '__main__':
+    # python Distributed.py coordinator [-players "A B:arg=value"] [-maps 0,1] [-rounds n] [-time s] [-seed n]
+    #                       [-opening_plies n] [-host address] [-port n] [-lease s] [-attempts n] [-out path]
+    #                       [-sandbox]
+    # python Distributed.py worker [-host address] [-port n] [-processes n]
+    # on one machine: a coordinator, and workers in other terminals (or on other hosts with -host 0.0.0.0 on
+    # the coordinator and its address on the workers)
+    if len(sys.argv) < 2 or sys.argv[1] not in ('coordinator', 'worker'):
+        print('usage: Distributed.py coordinator [-players "A B:arg=value"] [-maps 0,1] [-rounds n] [-time s] '
+              '[-seed n] [-opening_plies n] [-host address] [-port n] [-lease s] [-attempts n] [-out path] '
+              '[-sandbox] | worker [-host address] [-port n] [-processes n]')
+        exit(-1)
+    d = create_flags()
+    if sys.argv[1] == 'worker':
+        run_workers(d['host'], d['port'], d['processes'])
+    else:
+        jobs = make_jobs(d['players'], d['maps'], d['rounds'], d['time'], d['seed'], d['opening_plies'],
+                         d['sandbox'])
+        coordinator = Coordinator((d['host'], d['port']), jobs, d['out'], d['lease'], d['attempts'])
+        print('coordinator on %s:%d,' % (d['host'], d['port']), len(jobs), 'jobs,',
+              len(coordinator.queue.pending), 'to play', file=sys.stderr)
+        games = coordinator.run()
+        if coordinator.queue.failed:
+            print(len(coordinator.queue.failed), 'jobs failed:', ', '.join(sorted(coordinator.queue.failed)))
+        if games:
+            report(games)
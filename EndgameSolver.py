@@ -0,0 +1,115 @@
+import sys
+from VoronoiEvaluator import VoronoiEvaluator
+
+memo_memory_mb = 128  # the memo is cleared when its entries grow past this
+memo_entry_bytes = 180  # dict slot, key and value tuples of one entry in CPython, besides the region int
+
+
+class EndgameSolver:
+    def __init__(self, state):
+        '''
+        :param state: BitBoard of the game, read (never changed) by separated and solve.
+
+        Once no path connects the players, each one only fills its own region, and the game is decided by the
+        longest path each player can still walk. longest solves that single-agent problem exactly by
+        depth-first search, with:
+            memoization - on (cell, region), the region being the free cells reachable from the cell. Cells that
+                          were cut off do not matter anymore, so positions reached by different paths merge.
+            upper bounds - the region size, and the checkerboard parity: a path alternates colors, starting
+                           with the color the player is not standing on, so it can only be one cell longer on
+                           that color than on the other. Children are tried best bound first and skipped once
+                           their bound cannot beat the best path found.
+        The memo is kept between moves, the regions of later positions are mostly already solved. Its size is
+        counted in bytes, a region int grows with the board.
+        '''
+        self.state = state
+        self.expand = VoronoiEvaluator(state).expand
+        self.black = 0
+        for k, (i, j) in enumerate(state.coords):
+            if (i + j) % 2 == 0:
+                self.black |= state.bits[k]
+        self.memo = {}
+        self.memo_bytes = 0
+        self.time_manager = None
+        self.aborted = False
+
+    def region(self, cell, free):
+        # the free cells reachable from cell
+        reached = front = self.state.bits[cell]
+        while front:
+            front = self.expand(front) & free & ~reached
+            reached |= front
+        return reached & free
+
+    def separated(self) -> bool:
+        state = self.state
+        reached = self.region(state.locs[1], state.free) | state.bits[state.locs[1]]
+        return self.expand(reached) & state.bits[state.locs[2]] == 0
+
+    def upper_bound(self, cell, region) -> int:
+        size = bin(region).count('1')
+        black = bin(region & self.black).count('1')
+        same, other = (black, size - black) if self.black >> cell & 1 else (size - black, black)
+        return 2 * same + 1 if other > same else 2 * other
+
+    def longest(self, cell, region) -> (int, (int, int)):
+        '''
+        :return: (length, move) of the longest path from cell through region, move is None when there is none.
+        Sets aborted when the time manager runs out, the returned values are not exact then.
+        '''
+        key = (cell, region)
+        result = self.memo.get(key)
+        if result is not None:
+            return result
+        if not self.time_manager.has_time():
+            self.aborted = True
+            return 0, None
+
+        state = self.state
+        children = []
+        for move in state.legal_moves_table[cell][state.neighbors[cell] & region]:
+            next_cell = cell + state.deltas[move]
+            next_region = self.region(next_cell, region & ~state.bits[next_cell])
+            children.append((self.upper_bound(next_cell, next_region), next_cell, next_region, move))
+        children.sort(key=lambda child: -child[0])
+
+        bound = children[0][0] + 1 if children else 0
+        best = (0, None)
+        for child_bound, next_cell, next_region, move in children:
+            if child_bound + 1 <= best[0]:
+                break
+            length = self.longest(next_cell, next_region)[0] + 1
+            if length > best[0]:
+                best = (length, move)
+            if best[0] == bound or self.aborted:
+                break
+
+        if not self.aborted:
+            if self.memo_bytes >= memo_memory_mb * 2 ** 20:
+                self.memo = {}
+                self.memo_bytes = 0
+            self.memo[key] = best
+            self.memo_bytes += memo_entry_bytes + sys.getsizeof(region)
+        return best
+
+    def solve(self, time_manager):
+        '''
+        Call when separated() holds and player 1 is to move.
+        :return: (result, move), result is 1 if player 1 wins, 0 for a tie and -1 if it loses, both playing
+                 their longest path; move is the first move of player 1's longest path.
+                 None if the time manager ran out first.
+        '''
+        state = self.state
+        self.time_manager = time_manager
+        self.aborted = False
+        mine, move = self.longest(state.locs[1], self.region(state.locs[1], state.free))
+        theirs, _ = self.longest(state.locs[2], self.region(state.locs[2], state.free))
+        if self.aborted:
+            return None
+        # a player loses on its turn with no moves while the other still has one, moves alternate from us:
+        # stuck after mine moves each, we lose if they have more; they are stuck first if we have 2 more
+        if mine >= theirs + 2:
+            return 1, move
+        if mine < theirs:
+            return -1, move
+        return 0, move
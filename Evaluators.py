@@ -0,0 +1,94 @@
+import json
+import os
+from VoronoiEvaluator import VoronoiEvaluator
+from ChamberEvaluator import ChamberEvaluator
+
+weights_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'weights', 'evaluator.json')
+# TerritoryEvaluator's terms: territory difference, player 1's mobility (0 when it can not move), the penalty
+# when player 1 can not move, path between the players. These are the hand set values the terms always had
+default_weights = {'territory': 1, 'mobility': 1, 'stuck': 5, 'path': 1}
+territory_unit = 16  # TerritoryEvaluator's points per territory cell, so fractional weights survive the rounding
+
+
+def load_weights(path=weights_path):
+    # the weights of a weight file written by TuneWeights.py, the default weights if there is no file
+    if not os.path.exists(path):
+        return dict(default_weights)
+    with open(path) as f:
+        weights = json.load(f)['weights']
+    assert set(weights) == set(default_weights), 'not an evaluator weight file ' + path
+    return weights
+
+
+evaluator_weights = load_weights()  # read once, when the players are imported
+
+
+def adjacent_cells_score(state, mobility=1, stuck=5):
+    legal_moves = state.legal_moves_num(1)
+    return -mobility * legal_moves if legal_moves > 0 else -stuck
+
+
+def path_between_players_score(connected):
+    return -1 if connected else 1
+
+
+class MobilityEvaluator:
+    def __init__(self, state):
+        '''
+        Player 1's mobility only, the cheapest evaluation (LiteAlphaBetaPlayer, ContestPlayer).
+        Every evaluator is built once per game from the BitBoard and scores states for player 1 with evaluate,
+        in integer points: unit of them are worth one cell (the search's aspiration windows scale with it).
+        '''
+        self.unit = 1
+
+    def evaluate(self, state) -> float:
+        return adjacent_cells_score(state)
+
+
+class ReachabilityEvaluator:
+    def __init__(self, state):
+        '''
+        The cells each player can reach, its mobility, and whether a path connects the players
+        (MinimaxPlayer's achievable cells, adjacent cells and path between players scores). The reachable
+        cells are a bit-parallel flood fill over the graph MinimaxPlayer built with networkx: free cells and
+        the players' cells, with an edge between two neighbors unless one is blocked or both are players.
+        '''
+        self.expand = VoronoiEvaluator(state).expand
+        self.unit = 1
+
+    def reachable(self, state, player):
+        free = state.free
+        players = state.bits[state.locs[1]] | state.bits[state.locs[2]]
+        reached = front = state.bits[state.locs[player]]
+        while front:
+            front = ((self.expand(front) & free) | (self.expand(front & free) & players)) & ~reached
+            reached |= front
+        return reached
+
+    def evaluate(self, state) -> float:
+        reached1 = self.reachable(state, 1)
+        reached2 = self.reachable(state, 2)
+        connected = (reached1 & state.bits[state.locs[2]]) != 0
+        score1 = bin(reached1).count('1') - bin(reached2).count('1')
+        return score1 + adjacent_cells_score(state) + path_between_players_score(connected)
+
+
+class TerritoryEvaluator:
+    def __init__(self, state, use_chambers=False, weights=None):
+        '''
+        :param use_chambers: count fillable space (ChamberEvaluator) instead of the Voronoi territory, slower
+                             but more accurate in corridors.
+        :param weights: the weights of the terms (see default_weights), None for evaluator_weights.
+        The territory difference, player 1's mobility and whether a path connects the players, weighted, in
+        territory_unit points per cell. The sum is rounded: the transposition tables keep integer values.
+        '''
+        self.territory = ChamberEvaluator(state) if use_chambers else VoronoiEvaluator(state)
+        weights = evaluator_weights if weights is None else weights
+        self.unit = territory_unit
+        self.weights = tuple(territory_unit * weights[name] for name in ('territory', 'mobility', 'stuck', 'path'))
+
+    def evaluate(self, state) -> float:
+        territory, mobility, stuck, path = self.weights
+        score1, connected = self.territory.territory_score(state)
+        return round(territory * score1 + adjacent_cells_score(state, mobility, stuck) +
+                     path * path_between_players_score(connected))
@@ -88,21 +88,41 @@ class Game:
                 return second
         return 0
 
+    def player_cant_move(self, player_index):
+        player_loc = self.board.get_player_location(player_index)
+        directions = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+        all_next_locations = [self.tup_add(player_loc, direction) for direction in directions]
+        in_board_next_locations = [loc for loc in all_next_locations if self.board.loc_is_in_board(loc)]
+        return not any(self.board[loc] == 0 for loc in in_board_next_locations)
+
+    def result(self):
+        '''
+        :return: None while the current player can move, else the winner: 0 for a tie (neither player can
+                 move), else the other player.
+        '''
+        if not self.player_cant_move(self.current_player):
+            return None
+        other = 3 - self.current_player
+        return 0 if self.player_cant_move(other) else other
+
     def run_game(self):
         # starting with player 2 because player 1 moved at the "set_players"
         players = [None, self.player_1, self.player_2]  # pushing None so players[i] = player_i
-        while self.check_victory() == 0:
+        while self.result() is None:
             # print('player', self.current_player, 'is making a move...')
-            move = players[self.current_player].make_move(5)
-            new_loc = self.tup_add(move, self.board.get_player_location(self.board.current_player))
-            self.paths[self.current_player].append(new_loc)
+            player_index = self.current_player
+            move = players[player_index].make_move(5)
+            new_loc = self.tup_add(move, self.board.get_player_location(player_index))
+            self.paths[player_index].append(new_loc)
             assert self.check_move(new_loc)
-            players[self.current_player].set_rival_move(new_loc)
+            players[3 - player_index].set_rival_move(new_loc)
 
         print('####################')
         print('####################')
-        print("    Player", self.check_victory(), "Won!")
+        if self.result() == 0:
+            print("     It's a Tie!")
+        else:
+            print("    Player", self.result(), "Won!")
         print('####################')
         print('####################')
         return self.paths[1:]
-
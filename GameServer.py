@@ -0,0 +1,496 @@
+#!/usr/bin/env python3
+
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from Game import Game
+from MapsGenerator import maps
+from Match import MoveTimeout
+from SandboxPlayer import SandboxPlayer, SandboxError, close_player
+from Tournament import make_player
+
+default_port = 5588
+directions = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+default_engines = ['AlphaBetaPlayer', 'SimplePlayer']  # the engine specs clients may play, without -engines
+cached_players = 4  # games an engine process keeps a player of between their moves, the least recent is dropped
+
+
+class SeatLost(Exception):
+    # a player lost the game outside the board: reason is 'time', 'illegal', 'error' or 'disconnect'
+    def __init__(self, reason, detail=None):
+        super().__init__(reason)
+        self.reason = reason
+        self.detail = detail
+
+
+def board_line(board) -> str:
+    return 'board %d %d %s' % (len(board), len(board[0]), ' '.join(str(int(val)) for row in board for val in row))
+
+
+class Connection:
+    def __init__(self, reader, writer):
+        '''
+        A client connection and its clock: the seconds of all the moves it made on this server (clock) and in
+        its current game (game_clock), from the your_move line sent to it to its move line received.
+        '''
+        self.reader = reader
+        self.writer = writer
+        peer = writer.get_extra_info('peername')
+        self.name = '%s:%s' % peer[:2] if isinstance(peer, tuple) else 'unix:%d' % id(self)
+        self.clock = 0.0
+        self.game_clock = 0.0
+        self.moves = 0
+
+    async def send(self, line):
+        try:
+            self.writer.write((line + '\n').encode())
+            await self.writer.drain()
+        except (ConnectionError, RuntimeError):
+            raise SeatLost('disconnect')
+
+    async def readline(self, timeout=None) -> str:
+        try:
+            line = await asyncio.wait_for(self.reader.readline(), timeout)
+        except ConnectionError:
+            raise SeatLost('disconnect')
+        except ValueError:  # over the stream's line limit
+            raise SeatLost('illegal')
+        if not line:
+            raise SeatLost('disconnect')
+        return line.decode().strip()
+
+
+class RemoteSeat:
+    # a player connected to the server
+    def __init__(self, connection):
+        self.connection = connection
+        self.name = connection.name
+
+    async def start(self, game_id, player_index, board, seconds):
+        self.connection.game_clock = 0.0
+        await self.connection.send('start %d %d %g' % (game_id, player_index, seconds))
+        await self.connection.send(board_line(board))
+
+    async def move(self, game, player_index, seconds):
+        connection = self.connection
+        await connection.send('your_move %g' % seconds)
+        start = time.time()
+        try:
+            line = await connection.readline(seconds)
+        except asyncio.TimeoutError:
+            raise SeatLost('time')
+        finally:
+            elapsed = time.time() - start
+            connection.clock += elapsed
+            connection.game_clock += elapsed
+            connection.moves += 1
+        words = line.split()
+        try:
+            assert words[0] == 'move' and len(words) == 3
+            return (int(words[1]), int(words[2])), elapsed
+        except (AssertionError, IndexError, ValueError):
+            raise SeatLost('illegal', line)
+
+    async def rival(self, loc):
+        await self.connection.send('rival %d %d' % loc)
+
+    async def end(self, winner, reason):
+        try:
+            await self.connection.send('end %d %s %.3f' % (winner, reason, self.connection.game_clock))
+        except SeatLost:
+            pass
+
+
+def engine_worker(conn):
+    '''
+    A process of the server's engine pool, it plays the moves of any games with players of any spec:
+        ('move', (game id, spec, board, rival locations, seconds)) -> ('ok', None) once the player is ready,
+            then ('ok', (move, wall seconds))
+        ('end', game id) -> ('ok', None)
+    A move carries the game as the engine sees it (board) and the rival's moves since the engine's last move.
+    The players of the last cached_players games are kept, told those rival moves, so they keep their
+    transposition table and book between moves; the player of any other game is made again from board.
+    '''
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()  # a killed process takes the SMP processes of its players with it
+    players = OrderedDict()  # game id -> player, the least recent first
+    while True:
+        try:
+            command, arg = conn.recv()
+        except EOFError:  # the server is gone
+            break
+        if command == 'stop':
+            break
+        try:
+            if command == 'end':
+                player = players.pop(arg, None)
+                if player is not None:
+                    close_player(player)
+                conn.send(('ok', None))
+                continue
+            assert command == 'move', 'unknown command ' + command
+            game_id, spec, board, rival_locs, seconds = arg
+            player = players.pop(game_id, None)
+            if player is None:
+                player = make_player(spec)
+                player.set_game_params(board)
+            else:
+                for loc in rival_locs:
+                    player.set_rival_move(loc)
+            players[game_id] = player
+            if len(players) > cached_players:
+                close_player(players.popitem(last=False)[1])
+            conn.send(('ok', None))
+            wall = time.time()
+            move = player.make_move(seconds)
+            conn.send(('ok', (move, time.time() - wall)))
+        except Exception:
+            players.pop(arg[0] if command == 'move' else arg, None)  # its state is unknown now
+            conn.send(('error', traceback.format_exc()))
+    for player in players.values():
+        close_player(player)
+
+
+class EngineProcess(SandboxPlayer):
+    worker = staticmethod(engine_worker)
+
+    def __init__(self, index):
+        '''
+        A process of the server's engine pool (engine_worker), with SandboxPlayer's process handling: a move
+        that runs out of time kills the process, with the players it kept, and the next move starts it again.
+        lock is held by the seat using the process, one move at a time.
+        '''
+        super().__init__('engine process %d' % index)
+        self.lock = asyncio.Lock()
+
+    def move(self, game_id, spec, board, rival_locs, seconds):
+        if self.process is None or not self.process.is_alive():
+            if self.process is not None:
+                self.kill()
+            self.start()
+        self.call('move', (game_id, spec, board, rival_locs, seconds), self.setup_time)
+        return self.receive('move', seconds)
+
+    def end(self, game_id):
+        if self.process is not None and self.process.is_alive():
+            self.call('end', game_id, self.setup_time)
+
+
+class EngineSeat:
+    def __init__(self, spec, pool, engines):
+        '''
+        A player of the server played by the engine pool: every move of a game goes to the same process of
+        engines (by game id), which keeps the game's player between moves while it has room for it. Every move
+        carries the board, so a process that dropped the player or was killed makes it again. The blocking
+        calls run on the pool's threads; a move waiting for a busy process is not on the engine's clock.
+        '''
+        self.spec = spec
+        self.pool = pool
+        self.engines = engines
+        self.name = spec
+        self.engine = None
+        self.game_id = None
+        self.rival_locs = []
+
+    async def call(self, method, *args):
+        async with self.engine.lock:
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self.pool, method, *args)
+            except MoveTimeout:
+                raise SeatLost('time')
+            except SandboxError as error:
+                raise SeatLost('error', str(error))
+
+    async def start(self, game_id, player_index, board, seconds):
+        self.game_id = game_id
+        self.engine = self.engines[game_id % len(self.engines)]
+
+    async def move(self, game, player_index, seconds):
+        board = game.board.get_map_for_player_i(player_index)
+        move, elapsed = await self.call(self.engine.move, self.game_id, self.spec, board, self.rival_locs, seconds)
+        self.rival_locs = []
+        return tuple(move), elapsed
+
+    async def rival(self, loc):
+        self.rival_locs.append(loc)
+
+    async def end(self, winner, reason):
+        if self.engine is not None:
+            try:
+                await self.call(self.engine.end, self.game_id)
+            except SeatLost:
+                pass
+
+
+class GameServer:
+    def __init__(self, engine_workers=os.cpu_count(), out_path=None, engine_specs=default_engines):
+        '''
+        Hosts any number of games at once on one event loop, with the rules of Game. The protocol is lines of
+        words, a client sends:
+            play <map index> <seconds a move> [<engine spec>]
+                to play the next client that asks for the same map and time (the first one to ask moves
+                first), or the engine (Tournament.make_player spec, the client moves first), one of
+                engine_specs: a spec is code the server runs, memory and processes it takes, clients only
+                choose among those the server was started with
+            move <di> <dj>    after your_move
+            status
+            quit
+        and the server answers:
+            waiting    for a rival to ask for the same game
+            start <game id> <your player index> <seconds a move>
+            board <rows> <columns> <cells row by row>    the board as set_game_params gets it
+            your_move <seconds>
+            rival <i> <j>    the rival moved there, as set_rival_move gets it
+            end <winner, 0 for a tie> <reason> <your seconds in the game>
+            status <open games> <games played> <your moves> <your seconds>    the clock of the connection
+            error <text>
+        A client is free to play again after a game ends. The reasons are those of Match: 'blocked', 'time',
+        'illegal' and 'error', and 'disconnect' for a client that closed its connection in the game.
+        A waiting client can only quit, one that disconnects frees its place at once. The engine moves of all the
+        games are played by engine_workers processes (EngineSeat), however many games are open.
+        A person can play with a terminal client (nc host port), as with LivePlayer.
+        '''
+        self.pool = ThreadPoolExecutor(engine_workers)
+        self.engines = [EngineProcess(k) for k in range(engine_workers)]  # started by their first move
+        self.engine_specs = set(engine_specs)
+        self.out = open(out_path, 'a') if out_path is not None else None
+        self.waiting = {}  # (map index, seconds) -> (connection, future of the rival's connection and game end)
+        self.game_ids = itertools.count(1)
+        self.open_games = 0
+        self.played = 0
+
+    async def handle(self, reader, writer):
+        connection = Connection(reader, writer)
+        try:
+            while True:
+                words = (await connection.readline()).split()
+                if not words:
+                    continue
+                if words[0] == 'quit':
+                    break
+                if words[0] == 'status':
+                    await connection.send('status %d %d %d %.3f' % (self.open_games, self.played, connection.moves,
+                                                                    connection.clock))
+                    continue
+                if words[0] != 'play' or len(words) not in (3, 4):
+                    await connection.send('error expected: play <map index> <seconds> [<engine spec>]')
+                    continue
+                try:
+                    map_index, seconds = int(words[1]), float(words[2])
+                    assert 0 <= map_index < len(maps) and seconds > 0
+                except (ValueError, AssertionError):
+                    await connection.send('error no map %s or bad seconds %s' % (words[1], words[2]))
+                    continue
+                if len(words) == 4 and words[3] not in self.engine_specs:
+                    await connection.send('error no engine %s, the engines are %s' % (
+                        words[3], ' '.join(sorted(self.engine_specs))))
+                    continue
+                if len(words) == 4:
+                    seats = [RemoteSeat(connection), EngineSeat(words[3], self.pool, self.engines)]
+                    await self.play_game(seats, map_index, seconds)
+                    continue
+                key = map_index, seconds
+                if key in self.waiting:  # the rival is waiting for us, its handler plays the game
+                    _, started = self.waiting.pop(key)
+                    ended = asyncio.get_running_loop().create_future()
+                    started.set_result((connection, ended))
+                    await ended
+                else:
+                    started = asyncio.get_running_loop().create_future()
+                    self.waiting[key] = connection, started
+                    await connection.send('waiting')
+                    rival, ended = await self.wait_for_rival(connection, started)
+                    try:
+                        await self.play_game([RemoteSeat(connection), RemoteSeat(rival)], map_index, seconds)
+                    finally:
+                        ended.set_result(None)
+        except (SeatLost, ConnectionError):
+            pass
+        finally:
+            for key, (waiting, started) in list(self.waiting.items()):
+                if waiting is connection:
+                    del self.waiting[key]
+                    started.cancel()
+            writer.close()
+
+    async def wait_for_rival(self, connection, started):
+        '''
+        Waits for a rival to ask for the same game and returns what its handler set started to. Meanwhile the
+        connection is read, so a client that closes it (or quits) is dropped at once, freeing its place, rather
+        than found gone by the game. Other lines before the game are answered with an error.
+        '''
+        while True:
+            line = asyncio.ensure_future(connection.readline())
+            await asyncio.wait({line, started}, return_when=asyncio.FIRST_COMPLETED)
+            if started.done():
+                line.cancel()
+                await asyncio.gather(line, return_exceptions=True)  # the game is the connection's only reader
+                return started.result()
+            words = line.result().split()  # SeatLost when the client is gone
+            if words and words[0] == 'quit':
+                raise SeatLost('disconnect')
+            await connection.send('error waiting for a rival, quit to leave')
+
+    async def play_game(self, seats, map_index, seconds):
+        game_id = next(self.game_ids)
+        self.open_games += 1
+        size, blocks, starts = maps[map_index]
+        game = Game(size, blocks, starts)
+        moves = []
+        move_times = []
+        winner, reason, detail = None, 'blocked', None
+        try:
+            for player_index, seat in enumerate(seats, 1):
+                try:
+                    await seat.start(game_id, player_index, game.board.get_map_for_player_i(player_index), seconds)
+                except SeatLost as lost:
+                    winner, reason = 3 - player_index, lost.reason
+                    break
+            while winner is None:
+                winner = game.result()
+                if winner is not None:
+                    break
+                player_index = game.current_player
+                try:
+                    move, elapsed = await seats[player_index - 1].move(game, player_index, seconds)
+                    loc = game.tup_add(game.board.get_player_location(player_index), move)
+                    if move not in directions or not game.check_move(loc):
+                        raise SeatLost('illegal', 'move %d %d' % move)
+                    moves.append(move)
+                    move_times.append(elapsed)
+                except SeatLost as lost:
+                    winner, reason, detail = 3 - player_index, lost.reason, lost.detail
+                    break
+                try:
+                    await seats[2 - player_index].rival(loc)
+                except SeatLost as lost:
+                    winner, reason = player_index, lost.reason
+        finally:
+            self.open_games -= 1
+        self.played += 1
+        for seat in seats:
+            await seat.end(winner, reason)
+        if self.out is not None:
+            self.out.write(json.dumps({'game': game_id, 'player_1': seats[0].name, 'player_2': seats[1].name,
+                                       'map': map_index, 'time': seconds, 'winner': winner, 'reason': reason,
+                                       'moves': [list(move) for move in moves],
+                                       'move_times': [round(t, 4) for t in move_times], 'error': detail}) + '\n')
+            self.out.flush()
+
+    async def serve(self, host=None, port=None, unix_path=None):
+        servers = []
+        if port is not None:
+            servers.append(await asyncio.start_server(self.handle, host, port))
+        if unix_path is not None:
+            servers.append(await asyncio.start_unix_server(self.handle, unix_path))
+        print('serving on', ', '.join(str(server.sockets[0].getsockname()) for server in servers), file=sys.stderr)
+        try:
+            await asyncio.gather(*(server.serve_forever() for server in servers))
+        finally:
+            self.pool.shutdown(cancel_futures=True)
+            for engine in self.engines:
+                engine.close()
+
+
+async def client_game(player_spec, map_index, seconds, engine, host, port, unix_path):
+    '''
+    A stand-in client: plays one game on the server with a player of this process, answering the server's
+    lines with the player protocol. Returns (winner, reason, player index, seconds of its moves).
+    '''
+    if unix_path is not None:
+        reader, writer = await asyncio.open_unix_connection(unix_path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    writer.write(('play %d %g%s\n' % (map_index, seconds, ' ' + engine if engine else '')).encode())
+    await writer.drain()
+    player = make_player(player_spec)
+    player_index = None
+    try:
+        while True:
+            words = (await reader.readline()).decode().split()
+            if not words:
+                raise ConnectionError('the server closed the connection')
+            if words[0] == 'start':
+                player_index = int(words[2])
+            elif words[0] == 'board':
+                rows, columns = int(words[1]), int(words[2])
+                cells = [int(val) for val in words[3:]]
+                player.set_game_params(np.array(cells).reshape(rows, columns))
+            elif words[0] == 'your_move':
+                move = player.make_move(float(words[1]))
+                writer.write(('move %d %d\n' % tuple(move)).encode())
+                await writer.drain()
+            elif words[0] == 'rival':
+                player.set_rival_move((int(words[1]), int(words[2])))
+            elif words[0] == 'end':
+                return int(words[1]), words[2], player_index, float(words[3])
+            elif words[0] == 'error':
+                raise ValueError(' '.join(words[1:]))
+    finally:
+        writer.close()
+
+
+async def run_clients(d):
+    # d['clients'] clients at once, in pairs against each other (or each against the engine)
+    start = time.time()
+    results = await asyncio.gather(*(client_game(d['player'], d['map'], d['time'], d['engine'], d['host'],
+                                                 d['port'], d['unix']) for _ in range(d['clients'])),
+                                   return_exceptions=True)
+    reasons = {}
+    for result in results:
+        reason = result[1] if isinstance(result, tuple) else type(result).__name__
+        reasons[reason] = reasons.get(reason, 0) + 1
+    print('%d clients in %.2f seconds, game ends: %s' % (
+        len(results), time.time() - start, ', '.join('%s %d' % item for item in sorted(reasons.items()))))
+
+
+def create_flags():
+    d = {'host': '127.0.0.1', 'port': default_port, 'unix': None, 'workers': os.cpu_count(), 'out': None,
+         'player': 'SimplePlayer', 'map': 0, 'time': 1.0, 'engine': None, 'clients': 2, 'engines': default_engines}
+    flags_input = sys.argv[2:]
+    while len(flags_input) > 0:
+        flag = flags_input[0]
+        assert flag[0] == '-'
+        flag = flag[1:]
+        val = flags_input[1]
+        if flag in ('host', 'unix', 'out', 'player', 'engine'):
+            d[flag] = val
+        elif flag == 'engines':
+            d['engines'] = val.split()
+        elif flag == 'time':
+            d['time'] = float(val)
+        else:
+            assert flag in ('port', 'workers', 'map', 'clients'), 'unknown flag ' + flag
+            d[flag] = int(val)
+        flags_input = flags_input[2:]
+    return d
+
+
+if __name__ == '__main__':
+    # python GameServer.py serve [-host address] [-port n] [-unix path] [-workers n] [-out games.jsonl]
+    #                            [-engines "A B:arg=value"]
+    # python GameServer.py client [-host address] [-port n | -unix path] [-player spec] [-map n] [-time s]
+    #                             [-engine spec] [-clients n]
+    # -port 0 serves on the Unix socket only; -workers are the engines computing a move at once; -engines are
+    # the specs clients may play against, exactly as written
+    if len(sys.argv) < 2 or sys.argv[1] not in ('serve', 'client'):
+        print('usage: GameServer.py serve [-host address] [-port n] [-unix path] [-workers n] [-out games.jsonl] '
+              '[-engines "A B:arg=value"] | client [-host address] [-port n | -unix path] [-player spec] [-map n] '
+              '[-time s] [-engine spec] [-clients n]')
+        exit(-1)
+    d = create_flags()
+    if sys.argv[1] == 'serve':
+        server = GameServer(d['workers'], d['out'], d['engines'])
+        try:
+            asyncio.run(server.serve(d['host'], d['port'] or None, d['unix']))
+        except KeyboardInterrupt:
+            pass
+    else:
+        asyncio.run(run_clients(d))
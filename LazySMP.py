@@ -0,0 +1,296 @@
+import multiprocessing as mp
+import os
+import queue
+import random
+import sys
+import time
+import weakref
+from multiprocessing import shared_memory
+import numpy as np
+from TimeManager import safety_margin
+from TranspositionTable import entry_bytes
+
+directions = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+value_offset = 1 << 31
+state_header_words = 4  # loc1, loc2, hash, search id (0 when no search runs)
+history_noise = 16  # the helpers' history tables start with random values up to this, to vary their move order
+stop_timeout = 1.0  # seconds stop_search waits for the helpers to report the end of the search
+
+
+def unlink_shared_memory(view, block):
+    # the cast view exports the block's buffer, the block can only be closed after it is released
+    view.release()
+    block.close()
+    block.unlink()
+
+
+class SharedTranspositionTable:
+    def __init__(self, memory_mb=64, name=None):
+        '''
+        :param memory_mb: approximate memory cap, as in TranspositionTable.
+        :param name: name of an existing table to attach to (in a worker), None creates a new one.
+
+        Same interface and replacement policy as TranspositionTable, kept in a shared_memory block so all the
+        search processes read and write the same table. Every slot is two 64 bit words, (key ^ data, data),
+        with depth, value, bound, move and generation packed into data. A slot torn by two processes writing
+        it at once does not pass the key check, so it reads as a miss and no lock is needed.
+        '''
+        if name is None:
+            slots = max(2, memory_mb * 2 ** 20 // (2 * entry_bytes))
+            size = 1 << (slots.bit_length() - 1)
+            self.shm = shared_memory.SharedMemory(create=True, size=size * 4 * 8)
+            self.shm.buf[:] = bytes(len(self.shm.buf))
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            size = len(self.shm.buf) // (4 * 8)
+        self.name = self.shm.name
+        self.size = size
+        self.mask = size - 1
+        self.words = self.shm.buf.cast('Q')
+        self.finalizer = weakref.finalize(self, unlink_shared_memory, self.words, self.shm) if name is None else None
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+
+    def new_search(self):
+        self.generation += 1
+
+    def clear(self):
+        self.shm.buf[:] = bytes(len(self.shm.buf))
+
+    def unpack(self, key, data):
+        move = data >> 50 & 7
+        return (key, data >> 32 & 0xffff, (data & 0xffffffff) - value_offset, data >> 48 & 3,
+                directions[move - 1] if move else None, data >> 53 & 0xff)
+
+    def probe(self, key):
+        self.probes += 1
+        words = self.words
+        slot = (key & self.mask) << 2
+        for index in (slot, slot + 2):
+            data = words[index + 1]
+            if words[index] ^ data == key and data:
+                self.hits += 1
+                return self.unpack(key, data)
+        return None
+
+    def store(self, key, depth, value, bound, move):
+        words = self.words
+        slot = (key & self.mask) << 2
+        generation = self.generation & 0xff
+        data = ((int(value) + value_offset) & 0xffffffff | min(depth, 0xffff) << 32 | bound << 48 |
+                (directions.index(move) + 1 if move in directions else 0) << 50 | generation << 53)
+        deep = words[slot + 1]
+        if deep == 0 or depth >= (deep >> 32 & 0xffff) or (deep >> 53 & 0xff) != generation:
+            index = slot
+        else:
+            index = slot + 2
+        words[index + 1] = data
+        words[index] = key ^ data
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+    def close(self):
+        if self.finalizer is not None:
+            self.finalizer()
+        else:
+            self.words.release()
+            self.shm.close()
+
+
+def smp_worker(worker_index, make_player, board, tt_name, state_name, commands, results):
+    '''
+    A helper of the Lazy SMP search. For every ('search', search_id, deadline) command it reads the root
+    position from the shared state block and deepens until the deadline or until the block's search id
+    changes. Odd workers start one ply deeper and every worker seeds its history table randomly, so the
+    helpers spread over the tree instead of all following the same path. Each completed iteration is sent as
+    (search_id, depth, value, move). The end of every search command, searched or not, is sent as
+    (search_id, None, nodes, None), with the nodes the helper searched for it.
+    '''
+    player = make_player()
+    player.set_game_params(board)
+    player.tt = SharedTranspositionTable(name=tt_name)
+    rand = random.Random(worker_index)
+    state_block = shared_memory.SharedMemory(name=state_name)
+    header = state_block.buf.cast('Q')
+    state = player.state
+    free_offset = state_header_words * 8
+    free_bytes = len(state_block.buf) - free_offset
+
+    while True:
+        command = commands.get()
+        if command is None:
+            break
+        _, search_id, deadline = command
+        if header[3] != search_id:  # stopped before we got to it
+            results.put((search_id, None, 0, None))
+            continue
+        state.locs[1], state.locs[2], state.hash = header[0], header[1], header[2]
+        state.free = int.from_bytes(state_block.buf[free_offset:free_offset + free_bytes], 'little')
+        player.loc, player.opp_loc = state.get_location(1), state.get_location(2)
+        if not player.has_moves(1):
+            results.put((search_id, None, 0, None))
+            continue
+        nodes_start = player.nodes_visited
+
+        time_manager = player.time_manager
+        time_manager.start(deadline - time.time() + safety_margin)
+        time_manager.should_stop = lambda: header[3] != search_id
+        player.tt.generation = search_id
+        player.ordering.new_search()
+        for history in player.ordering.history[1:]:
+            for k in range(len(history)):
+                history[k] = rand.randrange(history_noise)
+        depth = 1 + worker_index % 2
+        while time_manager.can_start_iteration() and depth < player.board.size:
+            player.root_depth = depth
+            val, move = player.search(1, depth, -float('inf'), float('inf'))
+            if time_manager.stopped:
+                break
+            results.put((search_id, depth, val, move))
+            time_manager.iteration_finished()
+            player.ordering.age()
+            depth += 1
+        results.put((search_id, None, player.nodes_visited - nodes_start, None))
+
+    header.release()
+    state_block.close()
+    player.tt.close()
+
+
+class LazySMP:
+    def __init__(self, workers_num, make_player, state, tt):
+        '''
+        :param workers_num: helper processes, the calling process searches as well.
+        :param make_player: picklable callable creating the player each helper searches with.
+        :param state: BitBoard of the game, its position is published to the helpers on every search.
+        :param tt: SharedTranspositionTable the calling process searches with, the helpers attach to it.
+
+        The root position is written into a shared_memory block (locations, hash and the free mask bytes) that
+        the helpers read in place, so only a (search_id, deadline) command goes through the queues.
+        helper_nodes is the nodes the helpers reported for the last search.
+        '''
+        self.state = state
+        self.search_id = tt.generation
+        self.helper_nodes = 0
+        free_bytes = (state.height * state.width + 63) // 64 * 8  # whole words, the block is cast to them
+        self.state_block = shared_memory.SharedMemory(create=True, size=state_header_words * 8 + free_bytes)
+        self.header = self.state_block.buf.cast('Q')
+        self.results = mp.Queue()
+        self.commands = []
+        self.workers = []
+        board = state.to_array()
+        for worker_index in range(workers_num):
+            commands = mp.Queue()
+            worker = mp.Process(target=smp_worker,
+                                args=(worker_index, make_player, board, tt.name, self.state_block.name,
+                                      commands, self.results),
+                                daemon=True)
+            worker.start()
+            self.commands.append(commands)
+            self.workers.append(worker)
+        self.finalizer = weakref.finalize(self, unlink_shared_memory, self.header, self.state_block)
+
+    def start_search(self, search_id, deadline):
+        state = self.state
+        self.header[0], self.header[1], self.header[2] = state.locs[1], state.locs[2], state.hash
+        self.header[3] = search_id
+        free_offset = state_header_words * 8
+        free_bytes = len(self.state_block.buf) - free_offset
+        self.state_block.buf[free_offset:] = state.free.to_bytes(free_bytes, 'little')
+        self.search_id = search_id
+        for commands in self.commands:
+            commands.put(('search', search_id, deadline))
+
+    def stop_search(self):
+        # returns the deepest iteration a helper completed in the current search, as (depth, value, move), or None.
+        # Waits for every helper's end of search message: a result still in a helper's queue feeder is not lost
+        self.header[3] = 0
+        best = None
+        self.helper_nodes = 0
+        searching = len(self.workers)
+        deadline = time.time() + stop_timeout
+        while searching > 0:
+            try:
+                search_id, depth, val, move = self.results.get(timeout=max(deadline - time.time(), 0))
+            except queue.Empty:  # a stuck helper, what it sends later is of an old search id
+                break
+            if search_id != self.search_id:
+                continue
+            if depth is None:
+                searching -= 1
+                self.helper_nodes += val
+            elif best is None or depth > best[0]:
+                best = (depth, val, move)
+        return best
+
+    def close(self):
+        for commands in self.commands:
+            commands.put(None)
+        for worker in self.workers:
+            worker.join(1)
+            if worker.is_alive():
+                worker.terminate()
+        self.workers = []
+        self.finalizer()
+
+
+def depth_scaling(depth, max_workers, time_limit):
+    # time to reach depth with 0 to max_workers helpers, over Benchmark's check positions
+    from AlphaBetaPlayer import AlphaBetaPlayer
+    from Benchmark import load_corpus, check_positions
+    boards = [position['board'] for position in load_corpus() if position['name'] in check_positions]
+    single = None
+    for workers_num in range(max_workers + 1):
+        total = 0.0
+        reached = 0
+        for board in boards:
+            player = AlphaBetaPlayer(use_book=False, use_tablebase=False, smp_workers=workers_num)
+            player.set_game_params(np.array(board))
+            start = time.time()
+            player.iterative_deepening(time_limit, max_depth=depth)
+            total += time.time() - start
+            reached += player.completed_depth >= depth
+            player.stop_smp()
+        single = total if single is None else single
+        print('%d helpers: depth %d in %.2f seconds (%d/%d positions reached it), speedup %.2f' % (
+            workers_num, depth, total, reached, len(boards), single / total))
+
+
+def nps_scaling(seconds, max_workers):
+    # nodes per second of all the search processes and the depth completed in a move of seconds, with 0 to
+    # max_workers helpers, over the ai_map positions of Benchmark's corpus
+    from AlphaBetaPlayer import AlphaBetaPlayer
+    from Benchmark import load_corpus
+    positions = [position for position in load_corpus() if position['name'].startswith('ai_map/')]
+    for workers_num in range(max_workers + 1):
+        results = []
+        for position in positions:
+            player = AlphaBetaPlayer(use_book=False, use_tablebase=False, smp_workers=workers_num)
+            player.set_game_params(np.array(position['board']))
+            start = time.time()
+            player.iterative_deepening(seconds)
+            elapsed = time.time() - start
+            nodes = player.nodes_visited + (player.smp.helper_nodes if player.smp is not None else 0)
+            results.append('%s %.0f nodes/sec depth %d' % (position['name'], nodes / elapsed,
+                                                            player.completed_depth))
+            player.stop_smp()
+        print('%d helpers: %s' % (workers_num, ', '.join(results)))
+
+
+if __name__ == '__main__':
+    # python LazySMP.py depth [depth] [max_workers] [time_limit]
+    # python LazySMP.py nps [seconds] [max_workers]
+    # the scaling with 0 to max_workers helpers: the time to reach depth, or nodes/sec and depth in a fixed
+    # time on ai_map. The numbers only mean something on a machine with at least max_workers + 1 free cores
+    mode = sys.argv[1] if len(sys.argv) > 1 else 'depth'
+    default_workers = (os.cpu_count() or 1) - 1
+    if mode == 'nps':
+        nps_scaling(float(sys.argv[2]) if len(sys.argv) > 2 else 2.0,
+                    int(sys.argv[3]) if len(sys.argv) > 3 else default_workers)
+    else:
+        assert mode == 'depth', 'usage: LazySMP.py depth [depth] [max_workers] [time_limit] | nps [seconds] [max_workers]'
+        depth_scaling(int(sys.argv[2]) if len(sys.argv) > 2 else 20,
+                      int(sys.argv[3]) if len(sys.argv) > 3 else default_workers,
+                      float(sys.argv[4]) if len(sys.argv) > 4 else 60.0)
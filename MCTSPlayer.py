@@ -0,0 +1,179 @@
+import math
+import sys
+import numpy as np
+from BitBoard import BitBoard
+from BatchGames import BatchGames, NoisySimplePolicy
+from TimeManager import TimeManager
+from SearchStats import SearchStats
+
+exploration = math.sqrt(2)  # UCT exploration constant
+batch_size = 64  # rollouts run together from every expanded leaf
+policy_noise = 1.5  # added to the rollout policy scores, 0 makes every rollout of a leaf the same game
+
+
+class MCTSNode:
+    def __init__(self, player, move=None, parent=None):
+        '''
+        :param player: the player to move at this node.
+        :param move: the move that led here from parent, by the other player.
+
+        wins is counted for the player who made move (the other player), so a parent picks children by their
+        own win rate. A tie counts as half a win.
+        '''
+        self.player = player
+        self.move = move
+        self.parent = parent
+        self.children = {}
+        self.untried = None
+        self.visits = 0
+        self.wins = 0.0
+
+    def uct_child(self):
+        log_visits = math.log(self.visits)
+        return max(self.children.values(),
+                   key=lambda child: child.wins / child.visits + exploration * math.sqrt(log_visits / child.visits))
+
+
+class MCTSPlayer:
+    def __init__(self, batch=batch_size):
+        '''
+        :param batch: rollouts per expanded leaf.
+
+        UCT search. Every iteration walks down the tree by UCT, expands one untried move and plays batch
+        rollouts from the new leaf at once, as the games of a BatchGames.
+        The rollout policy is BatchGames' NoisySimplePolicy: SimplePlayer.state_score (prefer the move to the
+        cell with the fewest free neighbors, a dead end last) with random noise, so rollouts from the same leaf
+        differ.
+        The tree is kept between moves: after our move and after the rival's the root moves to that child.
+        rollouts_per_second is measured on every make_move, and stats is its SearchStats: the rollouts as nodes,
+        the tree iterations as leaves, the length of the most visited line as completed_depth and the deepest
+        line walked as attempted_depth, the win rate of the move played (0 to 1) as score.
+        '''
+        self.loc = None
+        self.board = None
+        self.directions = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+        self.opp_loc = None
+        self.state = None
+        self.time_manager = TimeManager(check_every=1)
+        self.batch = batch
+        self.root = None
+        self.random = np.random.default_rng()
+        self.policy = NoisySimplePolicy(policy_noise)
+        self.rollouts = 0
+        self.iterations = 0
+        self.deepest = 0
+        self.rollouts_per_second = 0.0
+        self.stats = None
+
+    def set_game_params(self, board):
+        self.board = board
+        for i, row in enumerate(board):
+            for j, val in enumerate(row):
+                if val == 1:
+                    self.loc = (i, j)
+                if val == 2:
+                    self.opp_loc = (i, j)
+        self.state = BitBoard(board)
+        self.root = MCTSNode(1)
+
+    def set_rival_move(self, loc):
+        move = self.state.move_to(2, loc)
+        self.root = self.next_root(move, 1)
+        self.board[self.opp_loc] = -1
+        self.opp_loc = loc
+        self.board[loc] = 2
+
+    def next_root(self, move, player):
+        child = self.root.children.get(move)
+        if child is None:
+            return MCTSNode(player)
+        child.parent = None
+        return child
+
+    def rollouts_result(self, player) -> float:
+        '''
+        Plays batch rollouts from the current state with player to move.
+        :return: the number of rollouts won by the other player (who moved into this state), ties count half.
+        '''
+        games = BatchGames.from_board(self.state.to_array(), self.batch, player)
+        games.run(self.policy)
+        return games.scores(3 - player).sum()
+
+    def search(self):
+        state = self.state
+        root = self.root
+        while self.time_manager.has_time():
+            node = root
+            path = []
+            # selection
+            while node.untried is not None and not node.untried and node.children:
+                node = node.uct_child()
+                state.apply_move(3 - node.player, node.move)
+                path.append(node)
+            # expansion
+            if node.untried is None:
+                node.untried = list(state.get_legal_moves(node.player))
+            if node.untried:
+                move = node.untried.pop(self.random.integers(len(node.untried)))
+                child = MCTSNode(3 - node.player, move, node)
+                node.children[move] = child
+                state.apply_move(node.player, move)
+                path.append(child)
+                node = child
+            # simulation, a node with no moves is played out by rollouts_result as well
+            wins = self.rollouts_result(node.player)
+            self.rollouts += self.batch
+            self.iterations += 1
+            self.deepest = max(self.deepest, len(path))
+            # back propagation, every level counts the wins of the player who moved into it
+            for tree_node in reversed(path):
+                state.undo_move(3 - tree_node.player, tree_node.move)
+            for tree_node in [root] + path:
+                tree_node.visits += self.batch
+                tree_node.wins += wins if tree_node.player == node.player else self.batch - wins
+        if not root.children:  # not even one iteration had time
+            return state.get_legal_moves(root.player)[0]
+        return max(root.children.values(), key=lambda child: child.visits).move
+
+    def make_move(self, player_time) -> (int, int):
+        self.time_manager.start(player_time)
+        self.rollouts = self.iterations = self.deepest = 0
+        move = self.search()
+        elapsed = self.time_manager.last_check_time - self.time_manager.start_time
+        self.rollouts_per_second = self.rollouts / elapsed if elapsed > 0 else 0.0
+        self.stats = self.search_stats(move, elapsed)
+        self.root = self.next_root(move, 2)
+        new_loc = self.loc[0] + move[0], self.loc[1] + move[1]
+        self.board[self.loc] = -1
+        self.board[new_loc] = 1
+        self.state.apply_move(1, move)
+        self.loc = new_loc
+        return move
+
+    def search_stats(self, move, elapsed) -> SearchStats:
+        line = 0
+        node = self.root
+        while node.children:
+            node = max(node.children.values(), key=lambda child: child.visits)
+            line += 1
+        chosen = self.root.children.get(move)
+        score = chosen.wins / chosen.visits if chosen is not None and chosen.visits else None
+        # the lines in plies, as the depths of the other players
+        return SearchStats('search', self.rollouts, self.iterations, elapsed, completed_depth=line if line else -1,
+                           attempted_depth=self.deepest if self.deepest else -1, score=score)
+
+
+if __name__ == '__main__':
+    # rollouts per second of MCTSPlayer against nodes per second of AlphaBetaPlayer, at equal time on ai_map
+    from MapsGenerator import ai_board
+    from AlphaBetaPlayer import AlphaBetaPlayer
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2
+    player = MCTSPlayer()
+    player.set_game_params(ai_board.copy())
+    move = player.make_move(seconds)
+    print('MCTSPlayer', move, player.rollouts, 'rollouts,', round(player.rollouts_per_second), 'rollouts/sec')
+    player = AlphaBetaPlayer(use_book=False)
+    player.set_game_params(ai_board.copy())
+    move = player.make_move(seconds)
+    print('AlphaBetaPlayer', move, player.nodes_visited, 'nodes,', round(player.nodes_visited / seconds), 'nodes/sec,',
+          'depth', player.completed_depth)
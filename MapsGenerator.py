@@ -63,6 +63,18 @@ def get_board_data(board):
                 blocks[val - 1] = (i, j)
     return size, blocks, starts
 
+def random_map(rand, max_size, density=(0.05, 0.3)):
+    '''
+    A random map: a size up to max_size (at least 4 x 4), blocked cells of a random share in density and the two
+    starts on free cells. The players may be separated, or stuck, callers reject what they do not want.
+    :param rand: random.Random
+    '''
+    size = rand.randint(4, max_size[0]), rand.randint(4, max_size[1])
+    cells = [(i, j) for i in range(size[0]) for j in range(size[1])]
+    rand.shuffle(cells)
+    blocks_num = int(rand.uniform(*density) * len(cells))
+    return size, cells[2:2 + blocks_num], cells[:2]
+
 # Creating Maps
 n = 9
 m = 10
@@ -160,4 +172,11 @@ size, blocks, _ = get_board_data(board)
 starts = [(4, 1), (4, 4)]
 small_map = [size, blocks, starts]
 
-maps = [small_map, diag_map, tunnels_map, trick_map, ai_map]
\ No newline at end of file
+maps = [small_map, diag_map, tunnels_map, trick_map, ai_map]
+map_names = ['small_map', 'diag_map', 'tunnels_map', 'trick_map', 'ai_map']  # in the order of maps
+
+
+def map_board(map_index, player):
+    # the initial map as player sees it in set_game_params, itself as 1
+    size, blocks, starts = maps[map_index]
+    return build_board(size, blocks, starts if player == 1 else starts[::-1])
@@ -0,0 +1,132 @@
+import random
+import time
+import traceback
+from BitBoard import BitBoard
+from EndgameSolver import EndgameSolver
+from Game import Game
+from MapsGenerator import maps, build_board
+
+
+class MoveTimeout(Exception):
+    # raised by a player that was stopped when its move's time ran out (see SandboxPlayer)
+    pass
+
+
+def random_opening(map_index, plies, rand):
+    '''
+    :return: a game map (size, blocks, starts) of maps[map_index] after plies random moves (an even number, so
+             the player at starts[0] still moves first), or None if a player got stuck or the players got
+             separated on the way, the engines would only play out a decided game.
+    '''
+    return opening_from(maps[map_index], plies, rand)
+
+
+def opening_from(game_map, plies, rand):
+    # random_opening of any game map, with 0 plies a check that the map is worth playing
+    size, blocks, starts = game_map
+    state = BitBoard(build_board(size, blocks, starts))
+    for ply in range(plies):
+        player = 1 + ply % 2
+        moves = list(state.get_legal_moves(player))
+        if not moves:
+            return None
+        state.apply_move(player, rand.choice(moves))
+    if not state.has_moves(1) or not state.has_moves(2):
+        return None
+    if EndgameSolver(state).separated():
+        return None
+    board = state.to_array()
+    blocked = [(i, j) for i, row in enumerate(board) for j, val in enumerate(row) if val == -1]
+    return size, blocked, [state.coords[state.locs[1]], state.coords[state.locs[2]]]
+
+
+def seeded_opening(game_map, plies, seed):
+    '''
+    The opening of game_map that seed stands for: opening_from after a random even number of moves up to plies,
+    drawn again until the game is worth playing. Every process gets the same one, a game record keeps the seed.
+    '''
+    if plies == 0:
+        return game_map
+    rand = random.Random(seed)
+    opening = None
+    while opening is None:
+        opening = opening_from(game_map, 2 * rand.randrange(plies // 2 + 1), rand)
+    return opening
+
+
+class MatchResult:
+    def __init__(self, winner, reason, moves, move_times, cpu_times, error=None):
+        '''
+        :param winner: 1 or 2, 0 for a tie.
+        :param reason: how the game ended: 'blocked' (a player to move could not move), 'time' (the loser went
+                       over the move time), 'illegal' (the loser made an illegal move) or 'error' (the loser
+                       raised an exception, its traceback in error).
+        :param moves: the moves played, player 1's first and then alternating. The move that lost on time or
+                      was illegal is not one of them.
+        :param move_times: the seconds every move of moves took.
+        :param cpu_times: the CPU seconds of every move of moves, by the player's process.
+        '''
+        self.winner = winner
+        self.reason = reason
+        self.moves = moves
+        self.move_times = move_times
+        self.cpu_times = cpu_times
+        self.error = error
+
+    def as_dict(self) -> dict:
+        return {'winner': self.winner, 'reason': self.reason, 'moves': [list(move) for move in self.moves],
+                'move_times': [round(t, 4) for t in self.move_times],
+                'cpu_times': [round(t, 4) for t in self.cpu_times], 'error': self.error}
+
+
+def play_match(player_1, player_2, game_map, time_to_make_a_move=2, on_move=None) -> MatchResult:
+    '''
+    Plays one game between two players with the rules of NotAnimatedGame, without printing or exiting.
+    :param game_map: (size, blocks, starts), an entry of MapsGenerator.maps. player_1 starts at starts[0] and
+                     moves first.
+    :param on_move: called after every move with (player index, move, seconds, player), e.g. to log its stats.
+    A player that goes over time_to_make_a_move, makes an illegal move or raises loses the game.
+    The CPU time of a move is the player's last_cpu_time if it runs in a process of its own (SandboxPlayer),
+    otherwise this process's CPU time during make_move.
+    '''
+    size, blocks, starts = game_map
+    game = Game(size, blocks, starts)
+    players = [None, player_1, player_2]
+    player_1.set_game_params(game.board.get_map_for_player_i(1))
+    player_2.set_game_params(game.board.get_map_for_player_i(2))
+    moves = []
+    move_times = []
+    cpu_times = []
+    while True:
+        winner = game.result()
+        if winner is not None:
+            return MatchResult(winner, 'blocked', moves, move_times, cpu_times)
+        player_index = game.current_player
+        start = time.time()
+        cpu_start = time.process_time()
+        try:
+            move = players[player_index].make_move(time_to_make_a_move)
+        except MoveTimeout:
+            return MatchResult(3 - player_index, 'time', moves, move_times, cpu_times)
+        except Exception:
+            return MatchResult(3 - player_index, 'error', moves, move_times, cpu_times, traceback.format_exc())
+        diff = time.time() - start
+        cpu = time.process_time() - cpu_start
+        if diff > time_to_make_a_move:
+            return MatchResult(3 - player_index, 'time', moves, move_times, cpu_times)
+        try:
+            loc = game.tup_add(game.board.get_player_location(player_index), move)
+            legal = len(loc) == 2 and game.check_move(loc)
+        except (TypeError, ValueError, IndexError):  # not a move at all
+            legal = False
+        if not legal:
+            return MatchResult(3 - player_index, 'illegal', moves, move_times, cpu_times)
+        moves.append(tuple(move))
+        move_times.append(diff)
+        cpu_times.append(getattr(players[player_index], 'last_cpu_time', cpu))
+        if on_move is not None:
+            on_move(player_index, move, diff, players[player_index])
+        try:
+            players[3 - player_index].set_rival_move(loc)
+        except Exception:
+            return MatchResult(player_index, 'error', moves, move_times, cpu_times, traceback.format_exc())
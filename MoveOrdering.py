@@ -0,0 +1,79 @@
+killer_slots = 2
+pv_moves_limit = 1 << 20  # positions remembered by remember_best, to bound its memory
+pv_score = 1 << 40
+killer_score = 1 << 30
+
+
+class MoveOrdering:
+    def __init__(self, state):
+        '''
+        :param state: BitBoard of the game, the player's location is read from it when ordering.
+
+        Moves at a node are tried in this order:
+            1. the PV move - given by the caller (transposition table move), or the best move found for this
+               position in an earlier iteration (remember_best).
+            2. the killer moves of the ply - the last killer_slots moves that caused a cutoff at this ply.
+            3. the rest, by the history table: depth^2 summed over the cutoffs a move caused, kept per
+               (player, target cell) and halved between iterations (age), so old iterations fade out.
+        Cutoffs are counted, split by whether the first move tried caused them.
+        '''
+        self.state = state
+        cells_num = state.height * state.width
+        self.history = [None, [0] * cells_num, [0] * cells_num]
+        self.killers = []
+        self.pv_moves = {}
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def new_search(self):
+        # plies are counted from the root, so killers and PV moves of the previous make_move do not apply
+        self.killers = []
+        self.pv_moves = {}
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def age(self):
+        for player in (1, 2):
+            self.history[player] = [val >> 1 for val in self.history[player]]
+
+    def pv_move(self, key):
+        return self.pv_moves.get(key)
+
+    def remember_best(self, key, move):
+        if len(self.pv_moves) < pv_moves_limit or key in self.pv_moves:
+            self.pv_moves[key] = move
+
+    def order(self, player: int, ply: int, moves, pv_move=None):
+        if len(moves) < 2:
+            return moves
+        killers = self.killers[ply] if ply < len(self.killers) else ()
+        loc = self.state.locs[player]
+        deltas = self.state.deltas
+        history = self.history[player]
+        scored = []
+        for index, move in enumerate(moves):
+            if move == pv_move:
+                score = pv_score
+            elif move in killers:
+                score = killer_score - killers.index(move)
+            else:
+                score = history[loc + deltas[move]]
+            scored.append((-score, index, move))
+        scored.sort()
+        return [move for _, _, move in scored]
+
+    def record_cutoff(self, player: int, ply: int, move, depth: int, first: bool):
+        # called at the node that was cut, after the move was undone
+        self.cutoffs += 1
+        if first:
+            self.first_move_cutoffs += 1
+        while len(self.killers) <= ply:
+            self.killers.append([])
+        killers = self.killers[ply]
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[killer_slots:]
+        self.history[player][self.state.locs[player] + self.state.deltas[move]] += depth * depth
+
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
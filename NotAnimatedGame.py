@@ -4,13 +4,16 @@ from Game import Game
 from LivePlayer import LivePlayer
 from MapsGenerator import *
 from SimplePlayer import SimplePlayer
+from SandboxPlayer import SandboxPlayer
+from Match import MoveTimeout
 import time
+import json
 import sys, os
 # from PyQt4.QtCore import pyqtRemoveInputHook
 
 class NotAnimatedGame:
     def __init__(self, size, block_locations, starts, player_1, player_2, moves='regular', time_to_make_a_move=2,
-                 print_game_in_terminal=True):
+                 print_game_in_terminal=True, ponder=False, stats_file=None):
         assert hasattr(player_1, 'set_game_params')
         assert hasattr(player_2, 'set_game_params')
         assert hasattr(player_1, 'make_move')
@@ -25,6 +28,13 @@ class NotAnimatedGame:
         self.player_1.set_game_params(self.game.board.get_map_for_player_i(1))
         self.player_2.set_game_params(self.game.board.get_map_for_player_i(2))
         self.players = [self.player_1, self.player_2]
+        if ponder:
+            # players that support it search on the rival's time
+            for player in self.players:
+                if hasattr(player, 'set_pondering'):
+                    player.set_pondering(True)
+        # one JSON line per move of a player with search stats (see SearchStats), flushed as the game goes
+        self.stats_stream = open(stats_file, 'w') if stats_file is not None else None
         self.t = 0
         self.run_game()
 
@@ -70,10 +80,13 @@ class NotAnimatedGame:
                 sys.stdout = sys.__stdout__
             else:
                 start = time.time()
-                move = self.players[player_index].make_move(self.time_to_make_a_move)
+                try:
+                    move = self.players[player_index].make_move(self.time_to_make_a_move)
+                except MoveTimeout:  # a sandboxed player, stopped when its time was up
+                    move = None
                 end = time.time()
                 diff = end - start
-                if diff > self.time_to_make_a_move:
+                if move is None or diff > self.time_to_make_a_move:
                     print()
                     print('####################')
                     print('####################')
@@ -82,6 +95,8 @@ class NotAnimatedGame:
                     print('####################')
                     print('####################')
                     exit()
+            if self.stats_stream is not None and getattr(self.players[player_index], 'stats', None) is not None:
+                self.write_stats(player_index, move, diff)
             prev_loc = self.game.board.get_player_location(player_index + 1)
             # print('player is at loc', prev_loc)
             loc = (prev_loc[0] + move[0], prev_loc[1] + move[1])
@@ -107,6 +122,15 @@ class NotAnimatedGame:
                 self.print_board_to_terminal(board)
             self.t += 1
 
+    def write_stats(self, player_index, move, move_time):
+        line = {'turn': self.t, 'player': player_index + 1, 'type': type(self.players[player_index]).__name__,
+                'move': list(move), 'move_time': round(move_time, 4)}
+        if getattr(self.players[player_index], 'last_cpu_time', None) is not None:
+            line['cpu_time'] = round(self.players[player_index].last_cpu_time, 4)
+        line.update(self.players[player_index].stats.as_dict())
+        self.stats_stream.write(json.dumps(line) + '\n')
+        self.stats_stream.flush()
+
     def print_board_to_terminal(self, board):
         board_to_print = np.flipud(board.copy())
         # print(board_to_print)
@@ -134,20 +158,23 @@ def get_player(player_type, module):
         player = module.LiteAlphaBetaPlayer()
     elif player_type == 'ContestPlayer':
         player = module.ContestPlayer()
+    elif player_type == 'MCTSPlayer':
+        player = module.MCTSPlayer()
     else:
         print('bad input')
         exit(-1)
     return player
 
 def create_flags():
-    d = {'time_to_make_a_move': 2, 'map': 0, 'time_to_set_game_param': 2, 'print_in_terminal': True}
+    d = {'time_to_make_a_move': 2, 'map': 0, 'time_to_set_game_param': 2, 'print_in_terminal': True, 'ponder': False,
+         'stats_file': None, 'sandbox': False}
     flags_input = sys.argv[3:]
     # assert len(flags_input) % 2 == 0, 'bad flags'
     while len(flags_input) > 0:
         flag = flags_input[0]
         assert flag[0] == '-'
         flag = flag[1:]
-        if flag != 'dont_print_game':
+        if flag not in ('dont_print_game', 'ponder', 'sandbox'):
             val = flags_input[1]
         else:
             val = None
@@ -158,8 +185,18 @@ def create_flags():
             d['print_in_terminal'] = False
             flags_input = flags_input[1:]
             continue
+        elif flag == 'ponder':
+            d['ponder'] = True
+            flags_input = flags_input[1:]
+            continue
+        elif flag == 'sandbox':
+            d['sandbox'] = True
+            flags_input = flags_input[1:]
+            continue
         elif flag == 'set_params_time':
             d['time_to_set_game_param'] = float(val)
+        elif flag == 'stats':
+            d['stats_file'] = val
         else:
             assert flag == 'board', 'unknown flag ' + flag
             d['map'] = int(val)
@@ -173,20 +210,27 @@ if __name__ == '__main__':
 
     player_1_type = args[1]
     player_2_type = args[2]
-    module_1 = __import__(player_1_type)
-    module_2 = __import__(player_2_type)
-    player_1 = get_player(player_1_type, module_1)
-    player_2 = get_player(player_2_type, module_2)
-
     d = create_flags()
+    players = []
+    for player_type in (player_1_type, player_2_type):
+        if d['sandbox'] and player_type != 'LivePlayer':
+            # in a process of its own, stopped as soon as its move's time is up
+            players.append(SandboxPlayer(player_type))
+        else:
+            players.append(get_player(player_type, __import__(player_type)))
+    player_1, player_2 = players
+
     map_index = d['map']
     map = maps[map_index]
     time_to_make_a_move = d['time_to_make_a_move']
     print_in_terminal = d['print_in_terminal']
+    ponder = d['ponder']
+    stats_file = d['stats_file']
 
     print('Starting Game')
     print(player_1_type, 'VS', player_2_type)
     print('Board', map_index)
     print('Players (besides LivePlayer) have', time_to_make_a_move, 'seconds to make a move')
     NotAnimatedGame(map[0], map[1], map[2], player_1=player_1, player_2=player_2,
-                     time_to_make_a_move=time_to_make_a_move, print_game_in_terminal=print_in_terminal)
\ No newline at end of file
+                     time_to_make_a_move=time_to_make_a_move, print_game_in_terminal=print_in_terminal, ponder=ponder,
+                     stats_file=stats_file)
\ No newline at end of file
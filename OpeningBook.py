@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+
+import hashlib
+import os
+import struct
+import sys
+import time
+from BitBoard import BitBoard
+from MapsGenerator import maps, map_names, map_board
+
+books_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'books')
+book_magic = b'TRB2'
+header = struct.Struct('<4sQQI')  # magic, map fingerprint, engine fingerprint, entries number
+record = struct.Struct('<QBH')  # position hash, move index in directions, searched depth
+directions = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+
+
+def map_fingerprint(board) -> int:
+    '''
+    :param board: a map as given to set_game_params, from either player's point of view.
+    A change in the size, the blocked cells or the starts of a map changes its fingerprint, and makes its book invalid.
+    '''
+    blocked = [(i, j) for i, row in enumerate(board) for j, val in enumerate(row) if val == -1]
+    starts = sorted((i, j) for i, row in enumerate(board) for j, val in enumerate(row) if val in (1, 2))
+    description = repr((len(board), len(board[0]), blocked, starts)).encode()
+    return int.from_bytes(hashlib.blake2b(description, digest_size=8).digest(), 'little')
+
+
+def engine_fingerprint(player) -> int:
+    '''
+    :param player: an AlphaBetaPlayer.
+    The evaluator weights, the chambers and PVS settings of the player: a book searched by an engine of another
+    configuration would play that engine's moves, it is invalid for this one.
+    '''
+    description = repr((sorted(player.weights.items()), player.use_chambers, player.use_pvs)).encode()
+    return int.from_bytes(hashlib.blake2b(description, digest_size=8).digest(), 'little')
+
+
+class OpeningBook:
+    def __init__(self, fingerprint, engine, entries=None):
+        '''
+        :param fingerprint: map_fingerprint of the book's map.
+        :param engine: engine_fingerprint of the player that searched the book's moves.
+        :param entries: position hash -> (move, depth).
+
+        Positions are keyed by the BitBoard hash of the player to move, built from its own initial map and
+        updated by every move since, as the players keep it. The side key of the hash makes player 1's
+        positions (an even number of moves played) and player 2's (odd) different, so one book answers both.
+        On disk: a header (magic, fingerprints, entries number) and a fixed-size record per entry, 11 bytes.
+        '''
+        self.fingerprint = fingerprint
+        self.engine = engine
+        self.entries = entries if entries is not None else {}
+
+    @staticmethod
+    def path(map_index):
+        return os.path.join(books_dir, map_names[map_index] + '.book')
+
+    @staticmethod
+    def load(path):
+        # None if there is no book at path
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, fingerprint, engine, entries_num = header.unpack_from(data)
+        assert magic == book_magic, 'not a book file ' + path
+        entries = {}
+        for key, move, depth in record.iter_unpack(data[header.size:header.size + entries_num * record.size]):
+            entries[key] = (directions[move], depth)
+        return OpeningBook(fingerprint, engine, entries)
+
+    @staticmethod
+    def find(board, engine):
+        # the book of the map board was made from searched by the engine of fingerprint engine, or None if no
+        # valid book exists for them
+        fingerprint = map_fingerprint(board)
+        for map_index in range(len(maps)):
+            path = OpeningBook.path(map_index)
+            if not os.path.exists(path):
+                continue
+            with open(path, 'rb') as f:
+                _, book_fingerprint, book_engine, _ = header.unpack(f.read(header.size))
+            if book_fingerprint == fingerprint and book_engine == engine:
+                return OpeningBook.load(path)
+        return None
+
+    def save(self, path):
+        # written to a temporary file first, an interrupted build never leaves a broken book
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = [header.pack(book_magic, self.fingerprint, self.engine, len(self.entries))]
+        for key in sorted(self.entries):
+            move, depth = self.entries[key]
+            data.append(record.pack(key, directions.index(move), min(depth, 0xffff)))
+        with open(path + '.tmp', 'wb') as f:
+            f.write(b''.join(data))
+        os.replace(path + '.tmp', path)
+
+    def probe(self, key):
+        # (move, depth) or None
+        return self.entries.get(key)
+
+
+def make_searcher():
+    from AlphaBetaPlayer import AlphaBetaPlayer
+    return AlphaBetaPlayer()
+
+
+def build(map_index, plies=6, search_time=5, min_depth=0):
+    '''
+    Extends the book of maps[map_index] with every position of the first plies moves of the game in which
+    the book's player plays its book move and the rival any move, for both players.
+    Positions already in the book are searched again only if their depth is below min_depth, so running
+    again with more plies, or a higher min_depth and a longer search_time, extends the book incrementally.
+    A book of a changed map or engine configuration is rebuilt from scratch. The book is saved after every search.
+    '''
+    path = OpeningBook.path(map_index)
+    fingerprint = map_fingerprint(map_board(map_index, 1))
+    engine = engine_fingerprint(make_searcher())
+    book = OpeningBook.load(path)
+    if book is None or book.fingerprint != fingerprint or book.engine != engine:
+        if book is not None:
+            print(map_names[map_index], 'or the engine changed, rebuilding its book')
+        book = OpeningBook(fingerprint, engine)
+    searched = 0
+
+    def extend(state, player, plies_left):
+        nonlocal searched
+        if plies_left == 0 or not state.has_moves(player):
+            return
+        if player == 2:
+            for move in state.get_legal_moves(2):
+                state.apply_move(2, move)
+                extend(state, 1, plies_left - 1)
+                state.undo_move(2, move)
+            return
+        entry = book.probe(state.hash)
+        if entry is None or entry[1] < min_depth:
+            searcher = make_searcher()
+            searcher.set_game_params(state.to_array())
+            move = searcher.iterative_deepening(search_time)
+            book.entries[state.hash] = (move, searcher.completed_depth)
+            book.save(path)
+            searched += 1
+            print(map_names[map_index], 'position', len(book.entries), 'move', move, 'depth',
+                  searcher.completed_depth)
+        move = book.probe(state.hash)[0]
+        state.apply_move(1, move)
+        extend(state, 2, plies_left - 1)
+        state.undo_move(1, move)
+
+    extend(BitBoard(map_board(map_index, 1)), 1, plies)
+    extend(BitBoard(map_board(map_index, 2)), 2, plies)
+    book.save(path)
+    return searched
+
+
+def check():
+    # prints the state of every map's book, returns True if all of them exist and match their maps and the engine
+    all_valid = True
+    engine = engine_fingerprint(make_searcher())
+    for map_index, name in enumerate(map_names):
+        book = OpeningBook.load(OpeningBook.path(map_index))
+        if book is None:
+            print(name, 'no book')
+            all_valid = False
+        elif book.fingerprint != map_fingerprint(map_board(map_index, 1)):
+            print(name, 'INVALID, the map changed since the book was built')
+            all_valid = False
+        elif book.engine != engine:
+            print(name, 'INVALID, the evaluator weights or the engine settings changed since the book was built')
+            all_valid = False
+        else:
+            depths = [depth for _, depth in book.entries.values()]
+            print(name, len(book.entries), 'positions, depth', min(depths, default=0), '-', max(depths, default=0))
+    return all_valid
+
+
+def create_flags():
+    d = {'map': None, 'plies': 6, 'search_time': 5, 'min_depth': 0}
+    flags_input = sys.argv[2:]
+    while len(flags_input) > 0:
+        flag = flags_input[0]
+        assert flag[0] == '-'
+        flag = flag[1:]
+        val = flags_input[1]
+        if flag == 'map':
+            d['map'] = int(val)
+        elif flag == 'plies':
+            d['plies'] = int(val)
+        elif flag == 'search_time':
+            d['search_time'] = float(val)
+        else:
+            assert flag == 'min_depth', 'unknown flag ' + flag
+            d['min_depth'] = int(val)
+        flags_input = flags_input[2:]
+    return d
+
+
+if __name__ == '__main__':
+    # python OpeningBook.py build [-map i] [-plies n] [-search_time seconds] [-min_depth d]
+    # python OpeningBook.py check
+    if len(sys.argv) < 2 or sys.argv[1] not in ('build', 'check'):
+        print('usage: OpeningBook.py build [-map i] [-plies n] [-search_time seconds] [-min_depth d] | check')
+        exit(-1)
+    if sys.argv[1] == 'check':
+        exit(0 if check() else 1)
+    d = create_flags()
+    map_indices = range(len(maps)) if d['map'] is None else [d['map']]
+    for map_index in map_indices:
+        start = time.time()
+        searched = build(map_index, d['plies'], d['search_time'], d['min_depth'])
+        print(map_names[map_index], searched, 'positions searched in', round(time.time() - start, 1), 'seconds')
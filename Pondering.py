@@ -0,0 +1,162 @@
+import heapq
+import multiprocessing as mp
+import queue
+import threading
+
+min_export_depth = 2  # shallower transposition table entries are cheap to recompute, not worth the transfer
+export_limit = 20000  # the deepest entries of a ponder sent back, the worker keeps the whole table for the next one
+predicted_lead = 4  # the predicted reply is searched this many plies deeper than the other replies
+stop_timeout = 5  # seconds to wait for the worker's last message after asking it to stop
+
+
+def stop_on_event(stop_event, time_manager):
+    stop_event.wait()
+    time_manager.deadline = 0  # the worker's next clock read stops its search
+
+
+def ponder(player, predicted_reply, results, stop_event):
+    '''
+    From the player's position after our move (the rival's turn), deepens over all rival replies, the
+    predicted one first and predicted_lead plies ahead of the others, and after every completed
+    (reply, depth) search sends ('answer', reply, depth, value, move).
+    When stopped, sends ('done', tt_entries): the deepest export_limit entries of this ponder of depth
+    >= min_export_depth.
+    '''
+    replies = list(player.get_legal_moves(2))
+    if predicted_reply in replies:
+        replies.remove(predicted_reply)
+        replies.insert(0, predicted_reply)
+    time_manager = player.time_manager
+    time_manager.start(float('inf'))
+    threading.Thread(target=stop_on_event, args=(stop_event, time_manager), daemon=True).start()
+    player.tt.new_search()
+    player.ordering.new_search()
+
+    depth = 0
+    while not time_manager.stopped and depth < player.board.size + predicted_lead:
+        for reply in replies:
+            reply_depth = depth if reply == predicted_reply else depth - predicted_lead
+            if reply_depth < 0:
+                continue
+            player.apply_move(2, reply)
+            if player.has_moves(1):
+                player.root_depth = reply_depth
+                val, move = player.search(1, reply_depth, -float('inf'), float('inf'))
+                if not time_manager.stopped:
+                    results.put(('answer', reply, reply_depth, val, move))
+            player.undo_move(2, reply)
+            if time_manager.stopped:
+                break
+        depth += 1
+
+    generation = player.tt.generation
+    entries = heapq.nlargest(export_limit, (entry for entry in player.tt.deep + player.tt.recent
+                                            if entry is not None and entry[5] == generation and
+                                            entry[1] >= min_export_depth), key=lambda entry: entry[1])
+    # a search that ran out of depth ends before it is stopped: wake our waiting thread before the referee
+    # gets 'done' and clears the event for the next ponder, an Event waiter left behind would never end
+    stop_event.set()
+    results.put(('done', entries))
+
+
+def ponder_worker(make_player, commands, results, stop_event):
+    '''
+    Runs in its own process for as long as the Ponderer, one player per game:
+        ('game', board) -> a fresh player of the game's initial board
+        ('ponder', (loc1, loc2, position_hash, free, predicted_reply)) -> ponder from that position
+    The position is our state's, its hash included: a BitBoard built from the board does not know how many
+    moves led to it (the side key), the entries would not match ours without it. The player's transposition
+    table is kept from one ponder to the next of a game.
+    '''
+    player = None
+    while True:
+        command = commands.get()
+        if command is None:
+            break
+        name, arg = command
+        if name == 'game':
+            player = make_player()
+            player.set_game_params(arg)
+            continue
+        loc1, loc2, position_hash, free, predicted_reply = arg
+        state = player.state
+        state.locs[1], state.locs[2], state.hash, state.free = loc1, loc2, position_hash, free
+        player.loc, player.opp_loc = state.get_location(1), state.get_location(2)
+        ponder(player, predicted_reply, results, stop_event)
+
+
+class Ponderer:
+    def __init__(self, make_player):
+        '''
+        :param make_player: picklable callable creating the player that searches in the worker process.
+
+        Searches on the rival's time in a separate process, so it does not compete for the GIL with the
+        rival when both engines run in the same process (NotAnimatedGame). The process is started once and
+        ponders every move of every game, told the game by new_game and the position by start.
+        stop returns the prepared answers, reply -> (depth, move), and a bounded slice of the worker's
+        transposition table entries (the deepest of this ponder), so a mispredicted reply still gets what
+        was learned.
+        '''
+        self.make_player = make_player
+        self.process = None
+        self.commands = None
+        self.results = None
+        self.stop_event = None
+        self.pondering = False
+
+    def is_running(self):
+        return self.pondering
+
+    def new_game(self, board):
+        # a running ponder of the last game is dropped
+        if self.pondering:
+            self.stop()
+        if self.process is None or not self.process.is_alive():
+            self.close()
+            self.commands = mp.Queue()
+            self.results = mp.Queue()
+            self.stop_event = mp.Event()
+            self.process = mp.Process(target=ponder_worker,
+                                      args=(self.make_player, self.commands, self.results, self.stop_event),
+                                      daemon=True)
+            self.process.start()
+        self.commands.put(('game', board))
+
+    def start(self, state, predicted_reply=None):
+        self.stop_event.clear()
+        self.commands.put(('ponder', (state.locs[1], state.locs[2], state.hash, state.free, predicted_reply)))
+        self.pondering = True
+
+    def stop(self):
+        if not self.pondering:
+            return {}, []
+        self.pondering = False
+        self.stop_event.set()
+        answers = {}
+        entries = []
+        while True:
+            try:
+                message = self.results.get(timeout=stop_timeout)
+            except queue.Empty:  # a stuck worker, the next game starts another one
+                self.close()
+                break
+            if message[0] == 'answer':
+                _, reply, depth, _, move = message
+                answers[reply] = (depth, move)
+            else:
+                entries = message[1]
+                break
+        return answers, entries
+
+    def close(self):
+        # ends the worker process, a running ponder is stopped first: its queued entries would keep it from exiting
+        if self.pondering:
+            self.stop()
+        if self.process is None:
+            return
+        if self.process.is_alive():
+            self.commands.put(None)
+            self.process.join(stop_timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+        self.process = None
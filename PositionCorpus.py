@@ -0,0 +1,201 @@
+import json
+import os
+import numpy as np
+
+corpus_version = 1
+chunk_positions = 4096  # a chunk is written once at least this many positions (of whole games) are waiting
+meta_name = 'meta.json'
+index_name = 'index.jsonl'
+
+
+def position_dtype(height, width) -> np.dtype:
+    '''
+    One position, of a board of up to height x width cells:
+        free: the free cells, bit packed row by row over the height x width board (np.packbits)
+        size: the board's own (height, width), the cells outside it are blocked
+        locs: (row, column) of player 1 and of player 2
+        to_move: the player to move, 1 or 2
+        score: the search value of the move played, for the player to move, in its evaluator's points (a win
+               rate for MCTSPlayer), nan if it was not searched
+        depth: the deepest completed iteration of that search, -1 if none
+        result: the game's end for the player to move, 1 won, 0 tie, -1 lost
+        game, ply, map: the game, the move's number in it, the map index (-1 for a generated map)
+    '''
+    return np.dtype([('free', np.uint8, ((height * width + 7) // 8,)), ('size', np.uint8, (2,)),
+                     ('locs', np.uint8, (2, 2)), ('to_move', np.int8), ('score', np.float32), ('depth', np.int16),
+                     ('result', np.int8), ('game', np.int32), ('ply', np.int16), ('map', np.int16)])
+
+
+def pack_free(board, height, width) -> np.ndarray:
+    # the free bits of a board (Board.map's encoding) placed in a height x width board, as position_dtype's free
+    free = np.zeros((height, width), dtype=bool)
+    free[:len(board), :len(board[0])] = np.asarray(board) == 0
+    return np.packbits(free.ravel())
+
+
+def keys_name(chunk_name):
+    # the file of a chunk's game keys, game id -> key
+    return chunk_name[:-len('.npy')] + '.keys.json'
+
+
+def fsync_dir(path):
+    if hasattr(os, 'O_DIRECTORY'):  # POSIX, a rename is durable once its directory is synced
+        fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def read_index(path):
+    # the complete lines of the index, a line cut by a crash is dropped
+    entries = []
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                if line.endswith('\n'):
+                    entries.append(json.loads(line))
+    return entries
+
+
+class PositionCorpus:
+    def __init__(self, path):
+        '''
+        Reads a corpus written by CorpusWriter: a directory of chunk files (numpy .npy arrays of position_dtype)
+        listed in index.jsonl. A chunk is memory mapped when it is read, nothing is loaded up front.
+        '''
+        self.path = path
+        with open(os.path.join(path, meta_name)) as f:
+            self.meta = json.load(f)
+        self.height, self.width = self.meta['board_size']
+        self.dtype = position_dtype(self.height, self.width)
+        self.index = read_index(os.path.join(path, index_name))
+
+    def __len__(self):
+        return sum(entry['positions'] for entry in self.index)
+
+    def games(self) -> int:
+        return sum(len(entry['games']) for entry in self.index)
+
+    def chunk(self, k) -> np.ndarray:
+        return np.load(os.path.join(self.path, self.index[k]['chunk']), mmap_mode='r')
+
+    def chunks(self):
+        for k in range(len(self.index)):
+            yield self.chunk(k)
+
+    def boards(self, positions) -> np.ndarray:
+        # (N, height, width) boards of positions in Board.map's encoding, the player to move is not marked
+        cells = self.height * self.width
+        free = np.unpackbits(positions['free'], axis=1, count=cells).reshape(-1, self.height, self.width)
+        boards = np.where(free == 1, 0, -1).astype(np.int8)
+        rows = np.arange(len(positions))
+        for player in (1, 2):
+            boards[rows, positions['locs'][:, player - 1, 0], positions['locs'][:, player - 1, 1]] = player
+        return boards
+
+
+class CorpusWriter:
+    def __init__(self, path, board_size=(20, 30), chunk_size=chunk_positions):
+        '''
+        Appends games to the corpus at path, created if missing (board_size is then the largest board it holds).
+        A chunk is written to a temporary file, synced, renamed into place and only then added to the index,
+        each step synced: after a crash the corpus holds every game of every indexed chunk and nothing else.
+        Opening an existing corpus deletes the temporary files of an interrupted write and indexes a chunk
+        that was renamed in place but not indexed yet. Games are never split over chunks.
+        A game can be added with a key, its settings as the program that played it names them: done_keys are the
+        keys of the corpus's games, so a run resumes by its keys whatever game ids its games got, and next_game is
+        the first game id not in the corpus.
+        '''
+        self.path = path
+        self.chunk_size = chunk_size
+        meta_path = os.path.join(path, meta_name)
+        if not os.path.exists(meta_path):
+            os.makedirs(path, exist_ok=True)
+            with open(meta_path + '.tmp', 'w') as f:
+                json.dump({'version': corpus_version, 'board_size': list(board_size)}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(meta_path + '.tmp', meta_path)
+            fsync_dir(path)
+        with open(meta_path) as f:
+            meta = json.load(f)
+        assert meta['version'] == corpus_version, 'corpus version %s, expected %d' % (meta['version'], corpus_version)
+        self.height, self.width = meta['board_size']
+        self.dtype = position_dtype(self.height, self.width)
+        self.recover()
+        self.buffer = []
+        self.buffered = 0
+        self.buffer_keys = {}
+
+    def index_path(self):
+        return os.path.join(self.path, index_name)
+
+    def recover(self):
+        index_path = self.index_path()
+        if os.path.exists(index_path):
+            with open(index_path, 'rb+') as f:
+                f.truncate(f.read().rfind(b'\n') + 1)  # a line cut by a crash
+        entries = read_index(index_path)
+        indexed = {entry['chunk'] for entry in entries}
+        for name in sorted(os.listdir(self.path)):
+            if name.endswith('.tmp'):
+                os.remove(os.path.join(self.path, name))
+            elif name.startswith('chunk_') and name.endswith('.npy') and name not in indexed:
+                keys_path = os.path.join(self.path, keys_name(name))
+                keys = {}
+                if os.path.exists(keys_path):
+                    with open(keys_path) as f:
+                        keys = {int(game): key for game, key in json.load(f).items()}
+                self.append_index(name, np.load(os.path.join(self.path, name), mmap_mode='r'), keys)
+        entries = read_index(index_path)
+        self.chunks_num = len(entries)
+        self.done_games = {game for entry in entries for game in entry['games']}
+        # a corpus written before game keys has none, its games are never taken for a run's
+        self.done_keys = {key for entry in entries for key in entry.get('keys', []) if key is not None}
+        self.next_game = max(self.done_games, default=-1) + 1
+
+    def append_index(self, name, positions, keys):
+        games = sorted(set(positions['game'].tolist()))
+        with open(self.index_path(), 'a') as f:
+            f.write(json.dumps({'chunk': name, 'positions': len(positions), 'games': games,
+                                'keys': [keys.get(game) for game in games]}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def add_game(self, positions, key=None):
+        # positions: an array of position_dtype, all the positions of one game
+        assert positions.dtype == self.dtype, 'positions of another board size'
+        self.buffer.append(positions)
+        self.buffer_keys[int(positions['game'][0])] = key
+        self.buffered += len(positions)
+        if self.buffered >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        positions = np.concatenate(self.buffer)
+        name = 'chunk_%06d.npy' % self.chunks_num
+        chunk_path = os.path.join(self.path, name)
+        # the keys go next to the chunk before it is renamed into place, for recover to index it with them
+        with open(os.path.join(self.path, keys_name(name)), 'w') as f:
+            json.dump(self.buffer_keys, f)
+            f.flush()
+            os.fsync(f.fileno())
+        with open(chunk_path + '.tmp', 'wb') as f:
+            np.save(f, positions)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(chunk_path + '.tmp', chunk_path)
+        fsync_dir(self.path)
+        self.append_index(name, positions, self.buffer_keys)
+        self.chunks_num += 1
+        self.done_games.update(positions['game'].tolist())
+        self.done_keys.update(key for key in self.buffer_keys.values() if key is not None)
+        self.buffer = []
+        self.buffered = 0
+        self.buffer_keys = {}
+
+    def close(self):
+        self.flush()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+import json
+import math
+import multiprocessing as mp
+import os
+import random
+import sys
+import traceback
+from MapsGenerator import maps, map_names
+from Match import play_match, random_opening
+from Tournament import make_player
+
+pair_scores = [0.0, 0.25, 0.5, 0.75, 1.0]  # the mean score of A in a pair of games, the 5 pentanomial outcomes
+# the least variance of a pair's score: pairs that all scored the same (all ties) still decide, after a few
+# hundred of them for the default bounds, rather than never
+min_variance = 0.01
+
+
+def elo_to_score(elo) -> float:
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def score_to_elo(score) -> float:
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+
+def play_pair(task):
+    # two games from one opening in a worker process, A moving first and then B, A's points of each
+    spec_a, spec_b, game_map, time_to_make_a_move = task
+    first = play_match(make_player(spec_a), make_player(spec_b), game_map, time_to_make_a_move)
+    second = play_match(make_player(spec_b), make_player(spec_a), game_map, time_to_make_a_move)
+    points = {1: 1.0, 0: 0.5, 2: 0.0}
+    return points[first.winner], 1 - points[second.winner], first.reason, second.reason
+
+
+def pair_worker(tasks, results):
+    # plays the (pair index, task) of tasks until None, puts (pair index, play_pair's result or an error text)
+    while True:
+        item = tasks.get()
+        if item is None:
+            break
+        pair_index, task = item
+        try:
+            results.put((pair_index, play_pair(task), None))
+        except Exception:
+            results.put((pair_index, None, traceback.format_exc()))
+
+
+def stop_workers(processes):
+    # the pairs still running are not waited for, their workers are killed
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
+
+
+def llr(counts, elo0, elo1) -> float:
+    '''
+    Log-likelihood ratio of elo1 against elo0 of the pairs so far, counts[k] the pairs that scored
+    pair_scores[k] for A: the normal approximation of the generalized SPRT on the pentanomial outcomes,
+    which counts the correlation of the two games of a pair (same opening) that per-game counting ignores.
+    The variance is at least min_variance.
+    '''
+    pairs = sum(counts)
+    if pairs == 0:
+        return 0.0
+    mean = sum(count * score for count, score in zip(counts, pair_scores)) / pairs
+    variance = sum(count * (score - mean) ** 2 for count, score in zip(counts, pair_scores)) / pairs
+    variance = max(variance, min_variance)
+    score0, score1 = elo_to_score(elo0), elo_to_score(elo1)
+    return pairs * (score1 - score0) * (2 * mean - score0 - score1) / (2 * variance)
+
+
+class SPRT:
+    def __init__(self, elo0=0, elo1=10, alpha=0.05, beta=0.05):
+        '''
+        :param elo0, elo1: H0 is that A is elo0 stronger than B, H1 that it is elo1 stronger.
+        :param alpha: the chance to accept H1 when H0 is true, beta: to accept H0 when H1 is true.
+        '''
+        self.elo0 = elo0
+        self.elo1 = elo1
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+        self.counts = [0] * len(pair_scores)
+        self.games = [0, 0, 0]  # A's wins, ties, losses
+
+    def add_pair(self, first_points, second_points):
+        self.counts[pair_scores.index((first_points + second_points) / 2)] += 1
+        for points in (first_points, second_points):
+            self.games[{1.0: 0, 0.5: 1, 0.0: 2}[points]] += 1
+
+    def llr(self) -> float:
+        return llr(self.counts, self.elo0, self.elo1)
+
+    def decision(self):
+        # 'H1' (A is elo1 stronger), 'H0' (A is elo0 stronger) or None to keep playing
+        value = self.llr()
+        if value >= self.upper:
+            return 'H1'
+        if value <= self.lower:
+            return 'H0'
+        return None
+
+    def elo(self) -> float:
+        pairs = sum(self.counts)
+        if pairs == 0:
+            return 0.0
+        return score_to_elo(sum(count * score for count, score in zip(self.counts, pair_scores)) / pairs)
+
+    def summary(self) -> str:
+        return '%d pairs, W/T/L %d/%d/%d, elo %+.1f, LLR %.2f [%.2f, %.2f]' % (
+            sum(self.counts), *self.games, self.elo(), self.llr(), self.lower, self.upper)
+
+
+def run(spec_a, spec_b, test, map_indices, time_to_make_a_move, workers, max_pairs, opening_plies, seed,
+        out_path=None):
+    '''
+    Plays pairs of games until the test decides or max_pairs were played, workers pairs at a time.
+    Every pair is a random opening of a map (in turn) of up to opening_plies moves, played twice with the
+    colors swapped, so the openings and the first move advantage cancel out. The engines are deterministic
+    enough that without the random openings most pairs would repeat the same two games.
+    :return: the decision, None if max_pairs were played first.
+    '''
+    rand = random.Random(seed)
+    out = open(out_path, 'a') if out_path is not None else None
+
+    def next_task(pair_index):
+        game_map = None
+        while game_map is None:
+            map_index = map_indices[pair_index % len(map_indices)]
+            game_map = random_opening(map_index, 2 * rand.randrange(opening_plies // 2 + 1), rand)
+        return (spec_a, spec_b, game_map, time_to_make_a_move), map_index
+
+    submitted = 0
+    tasks = mp.Queue()
+    results = mp.Queue()
+    processes = [mp.Process(target=pair_worker, args=(tasks, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    try:
+        running = {}  # pair index -> map index, of the pairs given to the workers
+        while True:
+            while len(running) < workers and submitted < max_pairs:
+                task, map_index = next_task(submitted)
+                tasks.put((submitted, task))
+                running[submitted] = map_index
+                submitted += 1
+            if not running:
+                break
+            pair_index, result, error = results.get()
+            if error is not None:
+                raise RuntimeError('pair %d failed:\n%s' % (pair_index, error))
+            map_index = running.pop(pair_index)
+            first_points, second_points, first_reason, second_reason = result
+            test.add_pair(first_points, second_points)
+            if out is not None:
+                out.write(json.dumps({'map': map_index, 'points': [first_points, second_points],
+                                      'reasons': [first_reason, second_reason]}) + '\n')
+                out.flush()
+            print(map_names[map_index], test.summary(), file=sys.stderr)
+            if test.decision() is not None:
+                break
+    finally:
+        stop_workers(processes)
+    if out is not None:
+        out.close()
+    return test.decision()
+
+
+def create_flags():
+    d = {'a': None, 'b': None, 'elo0': 0.0, 'elo1': 10.0, 'alpha': 0.05, 'beta': 0.05,
+         'maps': list(range(len(maps))), 'time': 1.0, 'workers': os.cpu_count(), 'max_pairs': 20000,
+         'opening_plies': 8, 'seed': 0, 'out': None}
+    flags_input = sys.argv[1:]
+    while len(flags_input) > 0:
+        flag = flags_input[0]
+        assert flag[0] == '-'
+        flag = flag[1:]
+        val = flags_input[1]
+        if flag in ('a', 'b', 'out'):
+            d[flag] = val
+        elif flag in ('elo0', 'elo1', 'alpha', 'beta', 'time'):
+            d[flag] = float(val)
+        elif flag == 'maps':
+            d['maps'] = [int(map_index) for map_index in val.split(',')]
+        else:
+            assert flag in ('workers', 'max_pairs', 'opening_plies', 'seed'), 'unknown flag ' + flag
+            d[flag] = int(val)
+        flags_input = flags_input[2:]
+    return d
+
+
+if __name__ == '__main__':
+    # python SPRT.py -a A -b B [-elo0 0] [-elo1 10] [-alpha 0.05] [-beta 0.05] [-maps 0,1] [-time s] [-workers n]
+    #                [-max_pairs n] [-opening_plies n] [-seed n] [-out pairs.jsonl]
+    # A and B are player specs as in Tournament.py, A is usually the changed engine and B the reference
+    d = create_flags()
+    if d['a'] is None or d['b'] is None:
+        print('usage: SPRT.py -a A -b B [-elo0 0] [-elo1 10] [-alpha 0.05] [-beta 0.05] [-maps 0,1] [-time s] '
+              '[-workers n] [-max_pairs n] [-opening_plies n] [-seed n] [-out pairs.jsonl]')
+        exit(-1)
+    test = SPRT(d['elo0'], d['elo1'], d['alpha'], d['beta'])
+    decision = run(d['a'], d['b'], test, d['maps'], d['time'], d['workers'], d['max_pairs'], d['opening_plies'],
+                   d['seed'], d['out'])
+    print(test.summary())
+    if decision == 'H1':
+        print('H1 accepted: %s is at least %+g elo stronger than %s' % (d['a'], d['elo1'], d['b']))
+    elif decision == 'H0':
+        print('H0 accepted: %s is not %+g elo stronger than %s' % (d['a'], d['elo1'], d['b']))
+    else:
+        print('no decision after', d['max_pairs'], 'pairs')
+    exit(0 if decision == 'H1' else 1)
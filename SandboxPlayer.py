@@ -0,0 +1,184 @@
+import multiprocessing as mp
+import os
+import signal
+import time
+import traceback
+from multiprocessing.util import Finalize, register_after_fork
+from Match import MoveTimeout
+
+setup_seconds = 30.0  # for set_game_params and set_rival_move, which the rules do not time
+stop_seconds = 1.0  # a worker asked to stop is killed if it has not exited by then
+
+
+class SandboxError(Exception):
+    pass
+
+
+def close_player(player):
+    # stops the helper processes of the previous game's player, the worker outlives it
+    for stop in ('stop_pondering', 'stop_smp'):
+        if hasattr(player, stop):
+            getattr(player, stop)()
+
+
+def sandbox_worker(conn):
+    '''
+    The player's process: runs the commands of the pipe until it is told to stop or the pipe closes.
+        ('new', (spec, board, ponder)) -> a fresh player of spec (Tournament.make_player) for a new game
+        ('move', player_time) -> (move, wall seconds, cpu seconds, stats)
+        ('rival', loc), ('ponder', ponder)
+    Every command is answered with ('ok', reply) or ('error', traceback).
+    '''
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()  # a killed worker takes its pondering and SMP processes with it
+    from Tournament import make_player
+    player = None
+    while True:
+        try:
+            command, arg = conn.recv()
+        except EOFError:  # the referee is gone
+            break
+        if command == 'stop':
+            break
+        try:
+            reply = None
+            if command == 'new':
+                spec, board, ponder = arg
+                if player is not None:
+                    close_player(player)
+                player = make_player(spec)
+                if ponder and hasattr(player, 'set_pondering'):
+                    player.set_pondering(True)
+                player.set_game_params(board)
+            elif command == 'move':
+                wall, cpu = time.time(), time.process_time()
+                move = player.make_move(arg)
+                reply = (move, time.time() - wall, time.process_time() - cpu, getattr(player, 'stats', None))
+            elif command == 'rival':
+                player.set_rival_move(arg)
+            else:
+                assert command == 'ponder', 'unknown command ' + command
+                if hasattr(player, 'set_pondering'):
+                    player.set_pondering(arg)
+            conn.send(('ok', reply))
+        except Exception:
+            conn.send(('error', traceback.format_exc()))
+    if player is not None:
+        close_player(player)
+
+
+def kill_worker(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (AttributeError, ProcessLookupError, PermissionError):  # no process groups, or not its group yet
+        process.kill()
+    process.join()
+
+
+def stop_worker(process, conn):
+    try:
+        conn.send(('stop', None))
+    except (OSError, ValueError):
+        pass
+    process.join(stop_seconds)
+    if process.is_alive():
+        kill_worker(process)
+    conn.close()
+
+
+class SandboxPlayer:
+    worker = staticmethod(sandbox_worker)  # the function of the process, a subclass can run another protocol
+
+    def __init__(self, spec, setup_time=setup_seconds):
+        '''
+        A player that runs in a process of its own, behind a pipe with the player protocol: spec is the
+        player as in Tournament.make_player. The process stays up across games (set_game_params starts a new
+        one with a fresh player), so the imports and the start up are paid once.
+        make_move raises Match.MoveTimeout as soon as the move's time is up, killing the process (it is
+        started again for the next game). last_wall_time and last_cpu_time are the seconds the player's
+        make_move took in its process, the CPU time of its threads (helper processes not included).
+        '''
+        self.spec = spec
+        self.setup_time = setup_time
+        self.ponder = False
+        self.process = None
+        self.conn = None
+        self.finalizer = None
+        self.stats = None
+        self.last_wall_time = None
+        self.last_cpu_time = None
+        register_after_fork(self, SandboxPlayer.forget)
+
+    def start(self):
+        self.conn, child_conn = mp.Pipe()
+        self.process = mp.Process(target=self.worker, args=(child_conn,))
+        self.process.start()
+        child_conn.close()
+        # runs before multiprocessing joins the process on exit, which would wait forever for a waiting worker
+        self.finalizer = Finalize(self, stop_worker, (self.process, self.conn), exitpriority=10)
+
+    def forget(self):
+        # in a process forked from ours (our worker or another sandbox's): its copy of our end of the pipe
+        # would keep our worker from seeing the pipe close if we die
+        if self.conn is not None:
+            self.conn.close()
+        self.process = None
+
+    def kill(self):
+        self.finalizer.cancel()
+        kill_worker(self.process)
+        self.conn.close()
+        self.process = None
+
+    def close(self):
+        if self.process is not None:
+            self.finalizer()
+            self.process = None
+
+    def call(self, command, arg, timeout):
+        self.conn.send((command, arg))
+        return self.receive(command, timeout)
+
+    def receive(self, command, timeout):
+        # the next reply of the process, within timeout seconds
+        if not self.conn.poll(max(timeout, 0)):
+            self.kill()
+            raise MoveTimeout('%s did not answer %s within %.3f seconds' % (self.spec, command, timeout))
+        try:
+            status, reply = self.conn.recv()
+        except EOFError:
+            self.kill()
+            raise SandboxError(self.spec + ' process died')
+        if status == 'error':
+            raise SandboxError(self.spec + ' raised in its process:\n' + reply)
+        return reply
+
+    def set_game_params(self, board):
+        if self.process is None or not self.process.is_alive():
+            if self.process is not None:
+                self.kill()
+            self.start()
+        self.stats = None
+        self.call('new', (self.spec, board, self.ponder), self.setup_time)
+
+    def set_pondering(self, ponder: bool):
+        self.ponder = ponder
+        if self.process is not None:
+            self.call('ponder', ponder, self.setup_time)
+
+    def make_move(self, player_time) -> (int, int):
+        move, self.last_wall_time, self.last_cpu_time, self.stats = self.call('move', player_time, player_time)
+        return move
+
+    def set_rival_move(self, loc):
+        self.call('rival', loc, self.setup_time)
+
+
+warm_players = {}  # (spec, slot) -> SandboxPlayer, kept across the games a process plays
+
+
+def warm_player(spec, slot):
+    # the sandboxed player of spec for seat slot (1 or 2, a player can play itself), started once per process
+    if (spec, slot) not in warm_players:
+        warm_players[spec, slot] = SandboxPlayer(spec)
+    return warm_players[spec, slot]
@@ -0,0 +1,374 @@
+import time
+from BitBoard import BitBoard
+from TimeManager import TimeManager
+from MoveOrdering import MoveOrdering
+from TranspositionTable import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+from Evaluators import TerritoryEvaluator
+from SearchStats import SearchStats
+
+big_int = 1000000
+aspiration_window = 8  # cells, times the evaluator's unit: narrower windows fail and re-search too often
+timing_sample = 16  # one in timing_sample evaluations and move generations is timed for the stats
+
+# search policies
+MINIMAX = 'minimax'  # every move of every node
+ALPHA_BETA = 'alpha_beta'  # alpha-beta cutoffs, moves in generation order
+ORDERED = 'ordered'  # alpha-beta cutoffs, moves ordered by MoveOrdering
+
+
+class SearchEngine:
+    def __init__(self, evaluator=TerritoryEvaluator, policy=ALPHA_BETA, tt_memory_mb=0, use_pvs=False):
+        '''
+        :param evaluator: called with the BitBoard in set_game_params, returns the evaluator (see Evaluators).
+        :param policy: MINIMAX, ALPHA_BETA or ORDERED.
+        :param tt_memory_mb: transposition table size, 0 for no transposition table.
+        :param use_pvs: null windows after the first move, and aspiration windows between iterations. Off by
+                        default: to a fixed depth it saves about 5% of the nodes on ai_map only, and costs up to
+                        12% on the corridor maps, where the first move is often not the best one.
+
+        The search of every player: the BitBoard make/unmake and move generator, the game end rules,
+        search (the one recursive search of all the policies) and iterative deepening under the TimeManager.
+        The player classes are configurations of it. The best move of a position is the PV move of the
+        ordering, from the transposition table when there is one, else from the previous iteration.
+        stats is the SearchStats of the last make_move. Its counters are kept by the search as it goes: a few
+        integer additions per node, and the clock read around one in timing_sample evaluations and move
+        generations, scaled up.
+        '''
+        self.loc = None
+        self.board = None
+        self.directions = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+        self.opp_loc = None
+        self.state = None
+        self.time_manager = TimeManager()
+        self.make_evaluator = evaluator
+        self.evaluator = None
+        self.evaluate = None
+        self.eval_unit = 1
+        self.policy = policy
+        self.prune = policy != MINIMAX
+        self.ordering = None
+        self.root_depth = 0
+        self.tt_memory_mb = tt_memory_mb
+        self.tt = TranspositionTable(tt_memory_mb) if tt_memory_mb > 0 else None
+        self.use_pvs = use_pvs
+        self.nodes_visited = 0
+        self.completed_depth = -1
+        self.last_search_depth = -1  # completed_depth of the last iterative deepening, kept across moves
+        self.attempted_depth = -1
+        self.leaves = 0
+        self.beta_cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.eval_time = 0.0
+        self.movegen_time = 0.0
+        self.stats_start_time = 0
+        self.tt_probes_start = 0
+        self.tt_hits_start = 0
+        self.stats = None
+        self.score = None
+
+    def set_game_params(self, board):
+        self.board = board
+        for i, row in enumerate(board):
+            for j, val in enumerate(row):
+                if val == 1:
+                    self.loc = (i, j)
+                if val == 2:
+                    self.opp_loc = (i, j)
+        self.state = BitBoard(board)
+        self.evaluator = self.make_evaluator(self.state)
+        self.evaluate = self.evaluator.evaluate
+        self.eval_unit = self.evaluator.unit
+        self.ordering = MoveOrdering(self.state) if self.policy == ORDERED else None
+        # a player can play several games: nothing of the last game's searches carries over to this one
+        self.last_search_depth = -1
+        self.completed_depth = -1
+        self.attempted_depth = -1
+        self.score = None
+        self.stats = None
+
+    def set_rival_move(self, loc):
+        self.state.move_to(2, loc)
+        self.board[self.opp_loc] = -1
+        self.opp_loc = loc
+        self.board[loc] = 2
+
+    def play_move(self, move):
+        # our move, on the board and the state
+        new_loc = self.loc[0] + move[0], self.loc[1] + move[1]
+        self.board[self.loc] = -1
+        self.board[new_loc] = 1
+        self.state.apply_move(1, move)
+        self.loc = new_loc
+
+    def get_player_loc(self, player: int):
+        return self.loc if player == 1 else self.opp_loc
+
+    def get_other_player(self, player: int):
+        return 3 - player
+
+    def calc_heuristic_val(self) -> float:
+        return self.evaluate(self.state)
+
+    def get_legal_moves(self, player: int):  # returns the direction!
+        return self.state.get_legal_moves(player)
+
+    # the search works on the state only, loc and opp_loc follow the moves actually played
+    def apply_move(self, player: int, move: (int, int)):
+        self.state.apply_move(player, move)
+
+    def undo_move(self, player: int, move: (int, int)):
+        self.state.undo_move(player, move)
+
+    """
+    checks if game ended for player
+    returns:
+    true in case game ended else false
+    the last 2 return values are relevant for game end case only
+    game result: -1 is player lost, 0 if tie, 1 if winning
+    move to make: if winning or tie then don't make a move, if winning then make a winning move
+    """
+
+    def game_ended(self, player: int) -> (bool, int, (int, int)):
+        state = self.state
+        if not state.has_moves(player):
+            if not state.has_moves(3 - player):  # tie
+                return True, 0, (0, 0)
+            return True, -1, (0, 0)  # player lost
+
+        #  check winning
+        if not state.has_moves(3 - player):
+            winning_move = self.get_final_winning_move(player)
+            if winning_move is None:  # all coming moves will bring a tie
+                return True, 0, self.get_random_legal_move(player)
+            # there is a way to win
+            return True, 1, winning_move
+
+        return False, -2, (-2, -2)
+
+    def get_random_legal_move(self, player):
+        assert self.has_moves(player)
+        for m in self.get_legal_moves(player):
+            return m
+
+    def has_time(self, deadline_time):
+        return self.time_manager.has_time()
+
+    def has_moves(self, player):
+        return self.state.has_moves(player)
+
+    def legal_moves_num(self, player):
+        return self.state.legal_moves_num(player)
+
+    def get_final_winning_move(self, player: int) -> (int, int):
+        state = self.state
+        winning_move = None
+        for move in state.get_legal_moves(player):
+            state.apply_move(player, move)
+            if state.has_moves(player):
+                winning_move = move
+            state.undo_move(player, move)
+        return winning_move
+
+    def search(self, player: int, depth: int, alpha, beta) -> (float, (int, int)):
+        self.nodes_visited += 1
+        game_ended, utility, move = self.game_ended(player)
+
+        if game_ended:
+            if utility == 1:
+                if player == 1:
+                    return big_int, move
+                return -big_int, move
+            if utility == -1:
+                if player == 1:
+                    return -big_int, move
+                return big_int, move
+            return 0, move
+
+        state = self.state
+        tt = self.tt
+        key = state.hash
+        pv_move = None
+        if tt is not None:
+            entry = tt.probe(key)
+            if entry is not None:
+                _, entry_depth, entry_val, entry_bound, pv_move, _ = entry
+                if entry_depth >= depth and (entry_bound == EXACT or
+                                             (entry_bound == LOWER_BOUND and entry_val >= beta) or
+                                             (entry_bound == UPPER_BOUND and entry_val <= alpha)):
+                    return entry_val, pv_move
+
+        # assuming we have at least one sec, and function in never called when player has lost -> will always find another move
+        if depth == 0 or not self.time_manager.has_time():
+            self.leaves += 1
+            if self.leaves % timing_sample:
+                h = self.evaluate(state), state.get_legal_moves(player)[0]
+            else:
+                eval_start = time.perf_counter()
+                h = self.evaluate(state), state.get_legal_moves(player)[0]
+                self.eval_time += (time.perf_counter() - eval_start) * timing_sample
+            if tt is not None and not self.time_manager.stopped:
+                tt.store(key, 0, h[0], EXACT, h[1])
+            return h
+
+        ordering = self.ordering
+        ply = self.root_depth - depth
+        timed = self.nodes_visited % timing_sample == 0
+        if timed:
+            movegen_start = time.perf_counter()
+        moves = state.get_legal_moves(player)
+        if ordering is not None:
+            moves = ordering.order(player, ply, moves, pv_move if tt is not None else ordering.pv_move(key))
+        if timed:
+            self.movegen_time += (time.perf_counter() - movegen_start) * timing_sample
+        alpha_orig, beta_orig = alpha, beta
+        prune = self.prune
+        pvs = self.use_pvs
+
+        if player == 1:  # my turn
+            cur_max = -float('inf')
+            best_move = None
+            for index, move in enumerate(moves):
+                state.apply_move(1, move)
+                if pvs and best_move is not None:  # null window for every child after the first
+                    res = self.search(2, depth - 1, alpha, alpha + 1)[0]
+                    if alpha < res < beta:  # re-searched, even a leaf: a child from the table may be a bound
+                        res = self.search(2, depth - 1, res, beta)[0]
+                else:
+                    res = self.search(2, depth - 1, alpha, beta)[0]
+                state.undo_move(1, move)
+                if res > cur_max:
+                    cur_max = res
+                    best_move = move
+                if cur_max > alpha:
+                    alpha = cur_max
+                if prune and cur_max >= beta:
+                    self.beta_cutoffs += 1
+                    if index == 0:
+                        self.first_move_cutoffs += 1
+                    if ordering is not None:
+                        ordering.record_cutoff(1, ply, move, depth, index == 0)
+                    break
+            self.store_best(key, depth, cur_max, alpha_orig, beta_orig, best_move)
+            return cur_max, best_move
+        else:  # opponent's turn
+            cur_min = float('inf')
+            worst_move = None
+            for index, move in enumerate(moves):
+                state.apply_move(2, move)
+                if pvs and worst_move is not None:  # null window for every child after the first
+                    res = self.search(1, depth - 1, beta - 1, beta)[0]
+                    if alpha < res < beta:  # re-searched, even a leaf: a child from the table may be a bound
+                        res = self.search(1, depth - 1, alpha, res)[0]
+                else:
+                    res = self.search(1, depth - 1, alpha, beta)[0]
+                state.undo_move(2, move)
+                if res < cur_min:
+                    cur_min = res
+                    worst_move = move
+                if cur_min < beta:
+                    beta = cur_min
+                if prune and cur_min <= alpha:
+                    self.beta_cutoffs += 1
+                    if index == 0:
+                        self.first_move_cutoffs += 1
+                    if ordering is not None:
+                        ordering.record_cutoff(2, ply, move, depth, index == 0)
+                    break
+            self.store_best(key, depth, cur_min, alpha_orig, beta_orig, worst_move)
+            return cur_min, worst_move
+
+    def store_best(self, key, depth, val, alpha_orig, beta_orig, move):
+        if self.time_manager.stopped:  # values of an aborted search are not exact
+            return
+        if self.tt is not None:
+            if val <= alpha_orig:
+                bound = UPPER_BOUND
+            elif val >= beta_orig:
+                bound = LOWER_BOUND
+            else:
+                bound = EXACT
+            self.tt.store(key, depth, val, bound, move)
+        elif self.ordering is not None:
+            self.ordering.remember_best(key, move)
+
+    def aspiration_search(self, depth: int, prev_val) -> (float, (int, int)):
+        # a window around the previous iteration's value, widened on the failing side until the value is inside
+        delta = aspiration_window * self.eval_unit
+        alpha, beta = prev_val - delta, prev_val + delta
+        while True:
+            val, move = self.search(1, depth, alpha, beta)
+            if self.time_manager.stopped:
+                return val, move
+            if val <= alpha:
+                alpha = -float('inf') if val <= -big_int else val - delta
+            elif val >= beta:
+                beta = float('inf') if val >= big_int else val + delta
+            else:
+                return val, move
+            delta *= 2
+
+    def reset_stats(self):
+        self.stats_start_time = time.time()
+        self.nodes_visited = 0
+        self.leaves = 0
+        self.beta_cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.eval_time = 0.0
+        self.movegen_time = 0.0
+        self.completed_depth = -1
+        self.attempted_depth = -1
+        self.score = None
+        if self.tt is not None:
+            self.tt_probes_start, self.tt_hits_start = self.tt.probes, self.tt.hits
+
+    def search_stats(self, source='search') -> SearchStats:
+        # the counters since reset_stats
+        tt = self.tt
+        searched = self.attempted_depth >= 0  # else the time manager still holds an older search
+        return SearchStats(source, self.nodes_visited, self.leaves, time.time() - self.stats_start_time,
+                           self.completed_depth, self.attempted_depth,
+                           self.time_manager.effective_branching_factor() if searched else 1.0,
+                           self.beta_cutoffs, self.first_move_cutoffs, self.eval_time, self.movegen_time,
+                           tt.probes - self.tt_probes_start if tt is not None else 0,
+                           tt.hits - self.tt_hits_start if tt is not None else 0, tt is not None, self.score)
+
+    def start_search(self, player_time):
+        # returns the deadline
+        deadline_time = self.time_manager.start(player_time)
+        self.reset_stats()
+        if self.tt is not None:
+            self.tt.new_search()
+        if self.ordering is not None:
+            self.ordering.new_search()
+        return deadline_time
+
+    def iterative_deepening(self, player_time, max_depth=None) -> (int, int):
+        # max_depth: the last iteration, when the time allows it (the whole game when None)
+        self.start_search(player_time)
+        depth = 0
+        move = self.get_random_legal_move(1)
+        val = 0
+        last_depth = self.board.size - 1 if max_depth is None else min(max_depth, self.board.size - 1)
+        while self.time_manager.can_start_iteration() and depth <= last_depth:
+            self.root_depth = depth
+            self.attempted_depth = depth
+            if self.use_pvs and depth > 0:
+                cur_val, cur_move = self.aspiration_search(depth, val)
+            else:
+                cur_val, cur_move = self.search(1, depth, -float('inf'), float('inf'))
+            if self.time_manager.stopped:  # a half-searched iteration is never used
+                break
+            val, move = cur_val, cur_move
+            self.time_manager.iteration_finished()
+            if self.ordering is not None:
+                self.ordering.age()
+            depth += 1
+        self.completed_depth = self.last_search_depth = depth - 1
+        self.score = val if depth > 0 else None
+        return move
+
+    def make_move(self, player_time) -> (int, int):
+        move = self.iterative_deepening(player_time)
+        self.stats = self.search_stats()
+        self.play_move(move)
+        return move
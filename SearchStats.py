@@ -0,0 +1,53 @@
+class SearchStats:
+    def __init__(self, source='search', nodes=0, leaves=0, seconds=0.0, completed_depth=-1, attempted_depth=-1,
+                 ebf=1.0, beta_cutoffs=0, first_move_cutoffs=0, eval_seconds=0.0, movegen_seconds=0.0,
+                 tt_probes=0, tt_hits=0, has_tt=False, score=None):
+        '''
+        The statistics of one make_move, a SearchEngine player's stats after every move.
+        :param source: where the move came from: 'search', 'ponder', 'endgame', 'book' or 'tablebase'.
+        :param completed_depth: the deepest iteration that finished, -1 if none did.
+        :param attempted_depth: the deepest iteration that started, the last one is cut by the clock.
+        :param ebf: effective branching factor, from the nodes of the completed iterations (see TimeManager).
+        :param beta_cutoffs: cutoffs of both players, first_move_cutoffs of them were by the first move searched.
+        :param eval_seconds: time in the evaluator at the leaves, movegen_seconds in move generation and ordering.
+        :param tt_probes: transposition table probes of this move only, tt_hits of them found an entry.
+        :param score: the value of the move for the player who made it, by the deepest completed iteration
+                      (+-big_int for a won or lost position), None if the move did not come from a search.
+                      MCTSPlayer's stats are its rollouts as nodes and the move's win rate, 0 to 1, as score.
+        '''
+        self.source = source
+        self.nodes = nodes
+        self.leaves = leaves
+        self.seconds = seconds
+        self.completed_depth = completed_depth
+        self.attempted_depth = attempted_depth
+        self.ebf = ebf
+        self.beta_cutoffs = beta_cutoffs
+        self.first_move_cutoffs = first_move_cutoffs
+        self.eval_seconds = eval_seconds
+        self.movegen_seconds = movegen_seconds
+        self.tt_probes = tt_probes
+        self.tt_hits = tt_hits
+        self.has_tt = has_tt
+        self.score = score
+
+    def nodes_per_second(self) -> float:
+        return self.nodes / self.seconds if self.seconds > 0 else 0.0
+
+    def first_move_cutoff_ratio(self) -> float:
+        # move ordering quality, 1 when every cutoff came from the first move
+        return self.first_move_cutoffs / self.beta_cutoffs if self.beta_cutoffs else 0.0
+
+    def tt_hit_rate(self):
+        # None without a transposition table
+        if not self.has_tt:
+            return None
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0.0
+
+    def as_dict(self) -> dict:
+        return {'source': self.source, 'nodes': self.nodes, 'leaves': self.leaves, 'seconds': round(self.seconds, 4),
+                'nps': round(self.nodes_per_second()), 'completed_depth': self.completed_depth,
+                'attempted_depth': self.attempted_depth, 'ebf': round(self.ebf, 3),
+                'beta_cutoffs': self.beta_cutoffs, 'first_move_cutoff_ratio': round(self.first_move_cutoff_ratio(), 3),
+                'eval_seconds': round(self.eval_seconds, 4), 'movegen_seconds': round(self.movegen_seconds, 4),
+                'tt_hit_rate': self.tt_hit_rate(), 'score': self.score}
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from Game import Game
+from MapsGenerator import maps, map_names, random_map
+from Match import play_match, opening_from, seeded_opening
+from PositionCorpus import PositionCorpus, CorpusWriter, position_dtype, pack_free, chunk_positions
+from Tournament import make_player
+
+default_pairs = ['AlphaBetaPlayer:use_book=False/AlphaBetaPlayer:use_book=False']
+generated_size = (12, 16)  # the largest generated map
+
+
+def make_tasks(pairs, map_indices, generated, games_num, time_to_make_a_move, opening_plies, seed):
+    '''
+    One task per game: every pair on every map, the maps of map_indices and generated random maps, games_num
+    times with the colors swapped every other game. A task is (game key, spec_1, spec_2, map index (-1 for a
+    generated map), generated map number, opening plies, game seed, time, seed). The key holds all of a game's
+    settings, so a run resumes by them (CorpusWriter.done_keys) and runs of other settings add their own games
+    to the same corpus.
+    '''
+    tasks = []
+    sources = [(map_index, None) for map_index in map_indices] + [(-1, k) for k in range(generated)]
+    for map_index, generated_index in sources:
+        source = 'map %d' % map_index if map_index >= 0 else 'generated %d' % generated_index
+        for pair in pairs:
+            spec_a, spec_b = pair.split('/')
+            for game in range(games_num):
+                spec_1, spec_2 = (spec_a, spec_b) if game % 2 == 0 else (spec_b, spec_a)
+                key = '%s/%s/%s/game=%d,seed=%d,opening_plies=%d,time=%g' % (
+                    spec_1, spec_2, source, game, seed, opening_plies, time_to_make_a_move)
+                game_seed = random.Random(key).getrandbits(32)
+                tasks.append((key, spec_1, spec_2, map_index, generated_index, opening_plies, game_seed,
+                              time_to_make_a_move, seed))
+    return tasks
+
+
+def task_size(task):
+    # (rows, columns) of the task's map
+    map_index = task[3]
+    return tuple(maps[map_index][0]) if map_index >= 0 else generated_size
+
+
+def generated_map(seed, generated_index):
+    # the same map for every game on it: a random map the players can both move on, not separated
+    rand = random.Random('%d/map/%d' % (seed, generated_index))
+    while True:
+        game_map = opening_from(random_map(rand, generated_size), 0, rand)
+        if game_map is not None:
+            return game_map
+
+
+def task_map(task):
+    _, _, _, map_index, generated_index, opening_plies, game_seed, _, seed = task
+    game_map = maps[map_index] if map_index >= 0 else generated_map(seed, generated_index)
+    return seeded_opening(game_map, opening_plies, game_seed)
+
+
+def play_game(task, game_id, board_size):
+    '''
+    Plays the game of a task in a worker process, its positions are game game_id of the corpus.
+    :return: (positions, reason): an array of position_dtype, the position before every move with the mover's
+             search score, and how the game ended.
+    '''
+    _, spec_1, spec_2, map_index, _, _, _, time_to_make_a_move, _ = task
+    game_map = task_map(task)
+    searched = []
+
+    def on_move(player_index, move, seconds, player):
+        stats = getattr(player, 'stats', None)
+        score = stats.score if stats is not None and stats.score is not None else np.nan
+        searched.append((score, stats.completed_depth if stats is not None else -1))
+
+    result = play_match(make_player(spec_1), make_player(spec_2), game_map, time_to_make_a_move, on_move)
+    positions = np.zeros(len(result.moves), dtype=position_dtype(*board_size))
+    game = Game(*game_map)
+    for ply, move in enumerate(result.moves):
+        position = positions[ply]
+        player = game.current_player
+        position['free'] = pack_free(game.board.map, *board_size)
+        position['size'] = game.size
+        position['locs'] = game.board.players_locations
+        position['to_move'] = player
+        position['score'], position['depth'] = searched[ply]
+        position['result'] = 0 if result.winner == 0 else (1 if result.winner == player else -1)
+        position['game'], position['ply'], position['map'] = game_id, ply, map_index
+        assert game.check_move(game.tup_add(game.board.get_player_location(player), move))
+    return positions, result.reason
+
+
+def run(tasks, out_path, workers, board_size, chunk_size=chunk_positions):
+    '''
+    Plays the tasks over a process pool into the corpus at out_path, a game's positions are written when it
+    ended. Games that did not end on the board (a player lost on time, by an illegal move or an exception)
+    are not written, their positions do not tell who was winning. Games already in the corpus (by their keys)
+    are skipped, the others get the game ids after the corpus's.
+    '''
+    writer = CorpusWriter(out_path, board_size, chunk_size)
+    board_size = writer.height, writer.width  # of the corpus, when it existed
+    too_big = sorted({task_size(task) for task in tasks if task_size(task)[0] > board_size[0] or
+                      task_size(task)[1] > board_size[1]})
+    if too_big:
+        writer.close()
+        raise ValueError('the corpus at %s holds boards up to %d x %d, this run has maps of %s: write them to '
+                         'another corpus' % (out_path, board_size[0], board_size[1],
+                                             ', '.join('%d x %d' % size for size in too_big)))
+    asked = len(tasks)
+    tasks = [task for task in tasks if task[0] not in writer.done_keys]
+    print(asked - len(tasks), 'of the games already in the corpus,', len(tasks), 'to play on', workers, 'workers',
+          file=sys.stderr)
+    skipped = 0
+    try:
+        with ProcessPoolExecutor(workers) as pool:
+            futures = {pool.submit(play_game, task, writer.next_game + k, board_size): task[0]
+                       for k, task in enumerate(tasks)}
+            for played, future in enumerate(as_completed(futures), 1):
+                positions, reason = future.result()
+                if reason == 'blocked':
+                    writer.add_game(positions, futures[future])
+                else:
+                    skipped += 1
+                if played % 10 == 0 or played == len(tasks):
+                    print('%d/%d games, %d chunks, %d skipped' % (played, len(tasks), writer.chunks_num, skipped),
+                          file=sys.stderr)
+    finally:
+        writer.close()
+
+
+def info(path):
+    corpus = PositionCorpus(path)
+    print('%d positions of %d games in %d chunks, boards up to %d x %d' % (
+        len(corpus), corpus.games(), len(corpus.index), corpus.height, corpus.width))
+    counts = {}
+    results = np.zeros(3, dtype=np.int64)
+    searched = 0
+    for chunk in corpus.chunks():
+        for map_index in np.unique(chunk['map']):
+            counts[map_index] = counts.get(map_index, 0) + int((chunk['map'] == map_index).sum())
+        results += np.bincount(chunk['result'] + 1, minlength=3)
+        searched += int((~np.isnan(chunk['score'])).sum())
+    for map_index, count in sorted(counts.items()):
+        print('%-20s %8d positions' % (map_names[map_index] if map_index >= 0 else 'generated', count))
+    print('mover won %d, tied %d, lost %d; %d positions with a search score' % (
+        results[2], results[1], results[0], searched))
+
+
+def create_flags():
+    d = {'pairs': default_pairs, 'maps': list(range(len(maps))), 'generated': 10, 'games': 2, 'time': 0.5,
+         'opening_plies': 8, 'seed': 0, 'workers': os.cpu_count(), 'chunk_size': chunk_positions, 'out': 'corpus'}
+    flags_input = sys.argv[2:]
+    while len(flags_input) > 0:
+        flag = flags_input[0]
+        assert flag[0] == '-'
+        flag = flag[1:]
+        val = flags_input[1]
+        if flag == 'pairs':
+            d['pairs'] = val.split()
+            assert all(pair.count('/') == 1 for pair in d['pairs']), 'a pair is A/B'
+        elif flag == 'maps':
+            d['maps'] = [int(map_index) for map_index in val.split(',')] if val else []
+        elif flag == 'time':
+            d['time'] = float(val)
+        elif flag == 'out':
+            d['out'] = val
+        else:
+            assert flag in ('generated', 'games', 'opening_plies', 'seed', 'workers', 'chunk_size'), \
+                'unknown flag ' + flag
+            d[flag] = int(val)
+        flags_input = flags_input[2:]
+    return d
+
+
+if __name__ == '__main__':
+    # python SelfPlay.py run [-pairs "A/B C/D"] [-maps 0,1] [-generated n] [-games n] [-time s] [-opening_plies n]
+    #                        [-seed n] [-workers n] [-chunk_size n] [-out corpus_dir]
+    # python SelfPlay.py info corpus_dir
+    # players are specs as in Tournament.py, -games is per pair and map; run again with the same flags to
+    # finish an interrupted corpus
+    if len(sys.argv) < 2 or sys.argv[1] not in ('run', 'info') or (sys.argv[1] == 'info' and len(sys.argv) < 3):
+        print('usage: SelfPlay.py run [-pairs "A/B C/D"] [-maps 0,1] [-generated n] [-games n] [-time s] '
+              '[-opening_plies n] [-seed n] [-workers n] [-chunk_size n] [-out corpus_dir] | info corpus_dir')
+        exit(-1)
+    if sys.argv[1] == 'info':
+        info(sys.argv[2])
+    else:
+        d = create_flags()
+        board_size = (max([maps[map_index][0][0] for map_index in d['maps']] + [generated_size[0]]),
+                      max([maps[map_index][0][1] for map_index in d['maps']] + [generated_size[1]]))
+        run(make_tasks(d['pairs'], d['maps'], d['generated'], d['games'], d['time'], d['opening_plies'], d['seed']),
+            d['out'], d['workers'], board_size, d['chunk_size'])
+        info(d['out'])
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+
+import mmap
+import os
+import pickle
+import struct
+import sys
+import time
+from BitBoard import BitBoard
+from EndgameSolver import EndgameSolver
+from TimeManager import TimeManager
+from MapsGenerator import maps, map_names, build_board
+from OpeningBook import map_fingerprint
+
+WIN = 1
+TIE = 0
+LOSS = -1
+
+tablebases_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tablebases')
+tablebase_magic = b'TRTB'
+header = struct.Struct('<4sQQQ')  # magic, map fingerprint, slots number, entries number
+record = struct.Struct('<QH')  # position key (0 marks an empty slot), result code | distance << 2
+result_codes = {TIE: 0, WIN: 1, LOSS: 2}
+code_results = [TIE, WIN, LOSS]
+
+
+def position_key(state, mover):
+    '''
+    Zobrist key of the position in state with mover to move, from the mover's point of view: the mover's
+    location is keyed as player 1 and the other's as player 2, so both players of a game probe the same entry
+    for a position, whichever of them built its BitBoard as player 1.
+    '''
+    key = state.zobrist_locs[1][state.locs[mover]] ^ state.zobrist_locs[2][state.locs[3 - mover]]
+    blocked = state.all_cells & ~state.free & ~state.bits[state.locs[1]] & ~state.bits[state.locs[2]]
+    zobrist_blocked = state.zobrist_blocked
+    while blocked:
+        low = blocked & -blocked
+        key ^= zobrist_blocked[low.bit_length() - 1]
+        blocked ^= low
+    return key or 1
+
+
+def tablebase_path(fingerprint):
+    return os.path.join(tablebases_dir, '%016x.tb' % fingerprint)
+
+
+def combine(children):
+    '''
+    :param children: (result, distance) of every child, for the child's mover.
+    :return: (result, distance) for the mover: a win as fast as possible, else a tie, else a loss as slow
+             as possible.
+    '''
+    wins = [distance for result, distance in children if result == LOSS]
+    if wins:
+        return WIN, min(wins) + 1
+    ties = [distance for result, distance in children if result == TIE]
+    if ties:
+        return TIE, min(ties) + 1
+    return LOSS, max(distance for _, distance in children) + 1
+
+
+class Tablebase:
+    def __init__(self, path):
+        '''
+        :param path: a file written by solve.
+
+        The file is a header and an open addressing hash table of fixed-size records, indexed by the low bits
+        of the position key with linear probing (at most half full), read in place through mmap: a probe
+        is a few record reads, whatever the number of positions. close (or a with block) unmaps the file.
+        '''
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.fingerprint, self.slots, self.entries_num = header.unpack_from(self.data)
+        assert magic == tablebase_magic, 'not a tablebase file ' + path
+        self.mask = self.slots - 1
+
+    def close(self):
+        # the mapping holds its own descriptor of the file, both are released here
+        self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @staticmethod
+    def find(board):
+        # the tablebase of the map board was made from, or None if it was not solved
+        path = tablebase_path(map_fingerprint(board))
+        return Tablebase(path) if os.path.exists(path) else None
+
+    def probe_key(self, key):
+        # (result, distance) for the mover, None if the position is not in the table
+        index = key & self.mask
+        while True:
+            entry_key, value = record.unpack_from(self.data, header.size + index * record.size)
+            if entry_key == key:
+                return code_results[value & 3], value >> 2
+            if entry_key == 0:
+                return None
+            index = (index + 1) & self.mask
+
+    def probe(self, state, mover=1):
+        return self.probe_key(position_key(state, mover))
+
+    def best_move(self, state, mover=1):
+        '''
+        :return: (result, distance, move) of the best move for mover in state, None if a position is missing.
+        The state is restored before returning.
+        '''
+        best = None
+        best_rank = None
+        for move in state.get_legal_moves(mover):
+            state.apply_move(mover, move)
+            child = self.probe(state, 3 - mover)
+            state.undo_move(mover, move)
+            if child is None:
+                return None
+            result, distance = combine([child])
+            # wins first and fastest, then ties, then losses and slowest
+            rank = (result, -distance if result != LOSS else distance)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = (result, distance, move), rank
+        return best
+
+
+def write_table(path, fingerprint, values):
+    slots = 2
+    while slots < 2 * len(values):
+        slots *= 2
+    mask = slots - 1
+    table = bytearray(header.size + slots * record.size)
+    header.pack_into(table, 0, tablebase_magic, fingerprint, slots, len(values))
+    for key, (result, distance) in values.items():
+        index = key & mask
+        while record.unpack_from(table, header.size + index * record.size)[0] != 0:
+            index = (index + 1) & mask
+        record.pack_into(table, header.size + index * record.size, key, result_codes[result] | distance << 2)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(table)
+    os.replace(path + '.tmp', path)
+
+
+def solve(board, verbose=True):
+    '''
+    :param board: the map, player 1 moves first.
+    :return: the path of the written tablebase.
+
+    Enumerates the positions reachable from board layer by layer (a layer is the positions after a number of
+    moves, every move blocks a cell so no position is in two layers), then labels them from the last layer
+    back to the first, each from the already labeled next layer. Positions where the players are separated
+    are not expanded, EndgameSolver labels them from the two longest paths: the mover with m moves left
+    against r wins if m >= r + 2, loses if m < r and ties otherwise.
+    The labels are checkpointed after every layer to a .partial file, a new solve of the same map resumes
+    from the last checkpoint.
+    '''
+    fingerprint = map_fingerprint(board)
+    os.makedirs(tablebases_dir, exist_ok=True)
+    path = tablebase_path(fingerprint)
+    checkpoint_path = path + '.partial'
+    state = BitBoard(board)
+    endgame = EndgameSolver(state)
+    endgame.time_manager = TimeManager()
+    endgame.time_manager.start(float('inf'))
+    start_time = time.time()
+
+    layers = [[(state.free, state.locs[1], state.locs[2])]]
+    while True:
+        mover = 1 + (len(layers) - 1) % 2
+        next_layer = set()
+        for state.free, state.locs[1], state.locs[2] in layers[-1]:
+            if state.has_moves(mover) and not endgame.separated():
+                for move in state.get_legal_moves(mover):
+                    state.apply_move(mover, move)
+                    next_layer.add((state.free, state.locs[1], state.locs[2]))
+                    state.undo_move(mover, move)
+        if not next_layer:
+            break
+        layers.append(list(next_layer))
+    if verbose:
+        print(len(layers), 'layers,', sum(len(layer) for layer in layers), 'positions, enumerated in',
+              round(time.time() - start_time, 1), 'seconds')
+
+    values = {}
+    first_solved = len(layers)
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path, 'rb') as f:
+            first_solved, values = pickle.load(f)
+        if verbose:
+            print('resuming from layer', first_solved - 1)
+
+    for ply in range(first_solved - 1, -1, -1):
+        mover = 1 + ply % 2
+        other = 3 - mover
+        for state.free, state.locs[1], state.locs[2] in layers[ply]:
+            key = position_key(state, mover)
+            if not state.has_moves(mover):
+                values[key] = (TIE if not state.has_moves(other) else LOSS), 0
+            elif endgame.separated():
+                mine = endgame.longest(state.locs[mover], endgame.region(state.locs[mover], state.free))[0]
+                theirs = endgame.longest(state.locs[other], endgame.region(state.locs[other], state.free))[0]
+                if mine >= theirs + 2:
+                    values[key] = WIN, 2 * theirs + 1
+                elif mine < theirs:
+                    values[key] = LOSS, 2 * mine
+                else:
+                    values[key] = TIE, mine + theirs
+            else:
+                children = []
+                for move in state.get_legal_moves(mover):
+                    state.apply_move(mover, move)
+                    children.append(values[position_key(state, other)])
+                    state.undo_move(mover, move)
+                values[key] = combine(children)
+        with open(checkpoint_path + '.tmp', 'wb') as f:
+            pickle.dump((ply, values), f)
+        os.replace(checkpoint_path + '.tmp', checkpoint_path)
+        if verbose:
+            print('layer', ply, 'solved,', len(layers[ply]), 'positions,', len(values), 'in total,',
+                  round(time.time() - start_time, 1), 'seconds')
+
+    write_table(path, fingerprint, values)
+    os.remove(checkpoint_path)
+    if verbose:
+        state.free, state.locs[1], state.locs[2] = layers[0][0]
+        result, distance = values[position_key(state, 1)]
+        print('solved:', {WIN: 'player 1 wins', TIE: 'tie', LOSS: 'player 2 wins'}[result], 'in', distance,
+              'moves,', path)
+    return path
+
+
+if __name__ == '__main__':
+    # python Tablebase.py map_index [map_index ...]
+    if len(sys.argv) < 2:
+        print('usage: Tablebase.py map_index [map_index ...]')
+        exit(-1)
+    for map_index in map(int, sys.argv[1:]):
+        size, blocks, starts = maps[map_index]
+        print(map_names[map_index])
+        solve(build_board(size, blocks, starts))
@@ -0,0 +1,98 @@
+import time
+
+safety_margin = 0.2  # seconds kept for returning the move, as the players always did
+check_interval = 0.002  # aimed seconds between two clock reads
+
+
+class TimeManager:
+    def __init__(self, check_every=1024):
+        '''
+        :param check_every: the most nodes searched between two reads of the clock.
+
+        has_time is called at every node, it reads the clock only when a countdown runs out. The countdown is
+        set from the node rate measured between the last two reads, so the clock is read about every
+        check_interval seconds, both for cheap leaves and for expensive ones.
+        Between iterations, can_start_iteration predicts the next iteration's time as the last one's times
+        the effective branching factor (nodes ratio of completed iterations), and refuses iterations that
+        would not finish before the deadline.
+        should_stop, when set, is a callable read with the clock that stops the search early by returning True.
+        '''
+        self.check_every = check_every
+        self.start_time = 0
+        self.deadline = 0
+        self.stopped = False
+        self.nodes = 0
+        self.countdown = 0
+        self.last_check_time = 0
+        self.last_check_nodes = 0
+        self.iteration_start_time = 0
+        self.iteration_start_nodes = 0
+        self.iteration_times = []
+        self.iteration_nodes = []
+        self.should_stop = None
+
+    def start(self, player_time):
+        # returns the deadline, for the search functions that take deadline_time
+        self.start_time = time.time()
+        self.deadline = self.start_time + player_time - safety_margin
+        self.stopped = False
+        self.nodes = 0
+        self.countdown = 0
+        self.last_check_time = self.start_time
+        self.last_check_nodes = 0
+        self.iteration_start_time = self.start_time
+        self.iteration_start_nodes = 0
+        self.iteration_times = []
+        self.iteration_nodes = []
+        return self.deadline
+
+    def has_time(self) -> bool:
+        self.nodes += 1
+        if self.countdown > 0:
+            self.countdown -= 1
+            return True
+        return self.check_clock()
+
+    def check_clock(self) -> bool:
+        if self.stopped:
+            return False
+        now = time.time()
+        if now >= self.deadline or (self.should_stop is not None and self.should_stop()):
+            self.stopped = True
+            return False
+        elapsed = now - self.last_check_time
+        nodes = self.nodes - self.last_check_nodes
+        if elapsed > 0:
+            self.countdown = min(self.check_every, int(nodes * check_interval / elapsed))
+        self.last_check_time = now
+        self.last_check_nodes = self.nodes
+        return True
+
+    def iteration_finished(self):
+        now = time.time()
+        self.iteration_times.append(now - self.iteration_start_time)
+        self.iteration_nodes.append(max(1, self.nodes - self.iteration_start_nodes))
+        self.iteration_start_time = now
+        self.iteration_start_nodes = self.nodes
+
+    def effective_branching_factor(self) -> float:
+        # two iterations back when possible, the odd and even depths of a 2-player search grow differently
+        nodes = self.iteration_nodes
+        if len(nodes) >= 3:
+            return max(1.0, (nodes[-1] / nodes[-3]) ** 0.5)
+        if len(nodes) == 2:
+            return max(1.0, nodes[-1] / nodes[-2])
+        return 1.0
+
+    def predicted_iteration_time(self) -> float:
+        if not self.iteration_times:
+            return 0.0
+        return self.iteration_times[-1] * self.effective_branching_factor()
+
+    def can_start_iteration(self) -> bool:
+        if self.stopped:
+            return False
+        now = time.time()
+        self.iteration_start_time = now
+        self.iteration_start_nodes = self.nodes
+        return now + self.predicted_iteration_time() < self.deadline
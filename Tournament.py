@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+
+import ast
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from MapsGenerator import maps, map_names
+from Match import play_match, seeded_opening
+from SandboxPlayer import warm_player
+
+elo_prior_games = 1  # virtual tied games between every pair of players, keeps the ratings of a 0% or 100% score finite
+bootstrap_samples = 200  # resamples of the openings for the confidence intervals
+
+
+def make_player(spec):
+    '''
+    :param spec: a player class name, with constructor arguments after a colon:
+                 'AlphaBetaPlayer' or 'AlphaBetaPlayer:use_pvs=True,tt_memory_mb=32'.
+    The class is in the module of its name, as NotAnimatedGame finds it.
+    '''
+    name, _, arguments = spec.partition(':')
+    kwargs = {}
+    for argument in filter(None, arguments.split(',')):
+        key, _, value = argument.partition('=')
+        kwargs[key] = ast.literal_eval(value)
+    return getattr(__import__(name), name)(**kwargs)
+
+
+def game_players(spec_1, spec_2, sandbox):
+    # sandboxed players are kept warm in the process across its games (see SandboxPlayer)
+    if sandbox:
+        return warm_player(spec_1, 1), warm_player(spec_2, 2)
+    return make_player(spec_1), make_player(spec_2)
+
+
+def play_task(task):
+    '''
+    One game in a worker process, task = (spec_1, spec_2, map_index, round, seed, opening_plies,
+    time_to_make_a_move, sandbox): from the opening of the map that seed stands for (Match.seeded_opening).
+    '''
+    spec_1, spec_2, map_index, round_index, seed, opening_plies, time_to_make_a_move, sandbox = task
+    game_map = seeded_opening(maps[map_index], opening_plies, seed)
+    start = time.time()
+    result = play_match(*game_players(spec_1, spec_2, sandbox), game_map, time_to_make_a_move)
+    game = {'player_1': spec_1, 'player_2': spec_2, 'map': map_index, 'round': round_index, 'seed': seed,
+            'opening_plies': opening_plies, 'time': time_to_make_a_move, 'sandbox': sandbox,
+            'seconds': round(time.time() - start, 2)}
+    game.update(result.as_dict())
+    return game
+
+
+def game_key(game):
+    # all the settings of a game, as its task holds them: a game of other settings is another game
+    return (game['player_1'], game['player_2'], game['map'], game['round'], game.get('seed'),
+            game.get('opening_plies', 0), game.get('time'), game.get('sandbox', False))
+
+
+def opening_key(game):
+    # the start position of a game: the games of one opening are not independent samples of the players
+    opening_plies = game.get('opening_plies', 0)
+    return game['map'], game.get('seed') if opening_plies > 0 else None, opening_plies
+
+
+def schedule(specs, map_indices, rounds, time_to_make_a_move, sandbox=False, seed=0, opening_plies=8):
+    '''
+    Round robin: every pair of players on every map with both colors, rounds times. Every round starts every
+    map from a random opening of up to opening_plies moves, seeded by (seed, round, map): all the games of a
+    round on a map start from it, so the colors and the pairs are compared on the same position. The engines
+    are deterministic enough that without the openings the rounds would repeat the same games.
+    '''
+    return [(spec_1, spec_2, map_index, round_index,
+             random.Random('%d/%d/%d' % (seed, round_index, map_index)).getrandbits(32), opening_plies,
+             time_to_make_a_move, sandbox)
+            for round_index in range(rounds)
+            for first, second in itertools.combinations(specs, 2)
+            for map_index in map_indices
+            for spec_1, spec_2 in ((first, second), (second, first))]
+
+
+def load_games(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def task_games(tasks, path):
+    # the games of path played for tasks, not those of the other tournaments in the file
+    tasks = set(tasks)
+    return [game for game in load_games(path) if game_key(game) in tasks]
+
+
+def run(tasks, out_path, workers):
+    '''
+    Plays the tasks over a process pool, appending every finished game to out_path as a JSON line.
+    Games already in out_path are not played again, an interrupted tournament resumes where it stopped.
+    out_path can hold other tournaments: a game counts for a task of the same settings only (game_key).
+    Every worker process is a player's whole machine while it moves: more workers than cores slows the
+    searches down and changes the results.
+    '''
+    done = {game_key(game) for game in load_games(out_path)}
+    asked = len(tasks)
+    tasks = [task for task in tasks if task not in done]
+    print(asked - len(tasks), 'games already played,', len(tasks), 'to play on', workers, 'workers',
+          file=sys.stderr)
+    with open(out_path, 'a') as out, ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(play_task, task) for task in tasks]
+        for played, future in enumerate(as_completed(futures), 1):
+            game = future.result()
+            out.write(json.dumps(game) + '\n')
+            out.flush()
+            print('%d/%d' % (played, len(tasks)), game['player_1'], 'vs', game['player_2'],
+                  map_names[game['map']], 'winner', game['winner'], game['reason'], file=sys.stderr)
+
+
+def scores(games, players):
+    # wins[i][j]: the points of players[i] against players[j], a tie is half a point; games[i][j] the games
+    index = {player: k for k, player in enumerate(players)}
+    wins = np.zeros((len(players), len(players)))
+    played = np.zeros((len(players), len(players)))
+    for game in games:
+        first, second = index[game['player_1']], index[game['player_2']]
+        points = {1: 1.0, 2: 0.0, 0: 0.5}[game['winner']]
+        wins[first][second] += points
+        wins[second][first] += 1 - points
+        played[first][second] += 1
+        played[second][first] += 1
+    return wins, played
+
+
+def bradley_terry(wins, played) -> np.ndarray:
+    '''
+    Elo ratings (mean 0) of the maximum likelihood Bradley-Terry strengths of the players, by the
+    minorization-maximization iteration. A tie counts as half a win of each player.
+    '''
+    players_num = len(wins)
+    prior = elo_prior_games * (1 - np.eye(players_num))
+    wins = wins + prior / 2
+    played = played + prior
+    strengths = np.ones(players_num)
+    for _ in range(1000):
+        totals = (played / (strengths[:, None] + strengths[None, :])).sum(axis=1)
+        new_strengths = wins.sum(axis=1) / totals
+        new_strengths /= np.exp(np.log(new_strengths).mean())
+        if np.abs(new_strengths - strengths).max() < 1e-9:
+            break
+        strengths = new_strengths
+    elo = 400 * np.log10(strengths)
+    return elo - elo.mean()
+
+
+def elo_ratings(games, players, confidence=0.95, seed=0):
+    '''
+    :return: {player: (elo, low, high)}, the interval from resampling the openings (bootstrap percentiles): the
+             games of an opening are resampled together, near copies of a game do not count as evidence.
+    '''
+    wins, played = scores(games, players)
+    elo = bradley_terry(wins, played)
+    openings = {}
+    for game in games:
+        openings.setdefault(opening_key(game), []).append(game)
+    openings = list(openings.values())
+    rand = np.random.default_rng(seed)
+    samples = []
+    for _ in range(bootstrap_samples):
+        resampled = [game for k in rand.integers(len(openings), size=len(openings)) for game in openings[k]]
+        samples.append(bradley_terry(*scores(resampled, players)))
+    tail = 100 * (1 - confidence) / 2
+    low, high = np.percentile(samples, [tail, 100 - tail], axis=0)
+    return {player: (elo[k], low[k], high[k]) for k, player in enumerate(players)}
+
+
+def report(games):
+    players = sorted({game['player_1'] for game in games} | {game['player_2'] for game in games})
+    ratings = elo_ratings(games, players)
+    wins, played = scores(games, players)
+    print('%d games from %d openings' % (len(games), len({opening_key(game) for game in games})))
+    print('%-40s %6s %6s %6s %6s %7s %7s %s' % ('player', 'games', 'wins', 'ties', 'losses', 'score', 'elo',
+                                              '95% interval'))
+    for k, player in sorted(enumerate(players), key=lambda item: -ratings[item[1]][0]):
+        games_num = int(played[k].sum())
+        player_games = [game for game in games if player in (game['player_1'], game['player_2'])]
+        ties = sum(1 for game in player_games if game['winner'] == 0)
+        won = sum(1 for game in player_games if game['winner'] == (1 if game['player_1'] == player else 2))
+        elo, low, high = ratings[player]
+        print('%-40s %6d %6d %6d %6d %6.1f%% %+7.0f [%+.0f, %+.0f]' % (
+            player, games_num, won, ties, games_num - won - ties, 100 * wins[k].sum() / max(1, games_num), elo,
+            low, high))
+    print()
+    print('score of the row player against the column player, by map:')
+    for map_index in sorted({game['map'] for game in games}):
+        map_wins, map_played = scores([game for game in games if game['map'] == map_index], players)
+        print('%-40s %s' % (map_names[map_index], ' '.join('%6d' % (j + 1) for j in range(len(players)))))
+        for k, player in enumerate(players):
+            cells = ['%5.1f%%' % (100 * map_wins[k][j] / map_played[k][j]) if map_played[k][j] else '     -'
+                     for j in range(len(players))]
+            print('  %2d %-35s %s' % (k + 1, player, ' '.join(cells)))
+    reasons = {}
+    for game in games:
+        reasons[game['reason']] = reasons.get(game['reason'], 0) + 1
+    print('game ends:', ', '.join('%s %d' % item for item in sorted(reasons.items())))
+
+
+def create_flags():
+    d = {'players': ['AlphaBetaPlayer', 'ContestPlayer', 'HeavyAlphaBetaPlayer'], 'maps': list(range(len(maps))),
+         'rounds': 1, 'time': 1.0, 'seed': 0, 'opening_plies': 8, 'workers': os.cpu_count(),
+         'out': 'tournament.jsonl', 'sandbox': False}
+    flags_input = sys.argv[2:]
+    while len(flags_input) > 0:
+        flag = flags_input[0]
+        assert flag[0] == '-'
+        flag = flag[1:]
+        if flag == 'sandbox':
+            d['sandbox'] = True
+            flags_input = flags_input[1:]
+            continue
+        val = flags_input[1]
+        if flag == 'players':
+            d['players'] = val.split()
+        elif flag == 'maps':
+            d['maps'] = [int(map_index) for map_index in val.split(',')]
+        elif flag == 'rounds':
+            d['rounds'] = int(val)
+        elif flag == 'time':
+            d['time'] = float(val)
+        elif flag in ('workers', 'seed', 'opening_plies'):
+            d[flag] = int(val)
+        else:
+            assert flag == 'out', 'unknown flag ' + flag
+            d['out'] = val
+        flags_input = flags_input[2:]
+    return d
+
+
+if __name__ == '__main__':
+    # python Tournament.py run [-players "A B:arg=value,arg=value"] [-maps 0,1] [-rounds n] [-time s] [-seed n]
+    #                           [-opening_plies n] [-workers n] [-out path] [-sandbox]
+    # -opening_plies 0 plays every round from the map's start
+    # -sandbox: every player runs in a process of its own, stopped as soon as its move's time is up
+    # python Tournament.py report path
+    if len(sys.argv) < 2 or sys.argv[1] not in ('run', 'report') or (sys.argv[1] == 'report' and len(sys.argv) < 3):
+        print('usage: Tournament.py run [-players "A B:arg=value"] [-maps 0,1] [-rounds n] [-time s] [-seed n] '
+              '[-opening_plies n] [-workers n] [-out results.jsonl] [-sandbox] | report results.jsonl')
+        exit(-1)
+    if sys.argv[1] == 'report':
+        report(load_games(sys.argv[2]))
+    else:
+        d = create_flags()
+        if len(d['players']) < 2:
+            print('a tournament needs at least 2 players')
+            exit(-1)
+        tasks = schedule(d['players'], d['maps'], d['rounds'], d['time'], d['sandbox'], d['seed'],
+                         d['opening_plies'])
+        run(tasks, d['out'], d['workers'])
+        report(task_games(tasks, d['out']))
@@ -0,0 +1,58 @@
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+entry_bytes = 160  # rough size of one stored entry (slot, tuple and its ints) in CPython
+
+
+class TranspositionTable:
+    def __init__(self, memory_mb=64):
+        '''
+        :param memory_mb: approximate memory cap, decides the number of slots (rounded down to a power of 2).
+
+        Entries are tuples (key, depth, value, bound, move, generation), indexed by the low bits of the key.
+        Every index has two slots:
+            deep - kept for the deepest search, replaced by an entry of at least its depth or when it
+                   comes from an older search (generation, advanced by new_search).
+            recent - always replaced, takes the entries the deep slot refused.
+        '''
+        slots = max(2, memory_mb * 2 ** 20 // (2 * entry_bytes))
+        self.size = 1 << (slots.bit_length() - 1)
+        self.mask = self.size - 1
+        self.deep = [None] * self.size
+        self.recent = [None] * self.size
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+
+    def new_search(self):
+        self.generation += 1
+
+    def clear(self):
+        self.deep = [None] * self.size
+        self.recent = [None] * self.size
+
+    def probe(self, key):
+        self.probes += 1
+        index = key & self.mask
+        entry = self.deep[index]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        entry = self.recent[index]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        return None
+
+    def store(self, key, depth, value, bound, move):
+        index = key & self.mask
+        entry = (key, depth, value, bound, move, self.generation)
+        deep = self.deep[index]
+        if deep is None or depth >= deep[1] or deep[5] != self.generation:
+            self.deep[index] = entry
+        else:
+            self.recent[index] = entry
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
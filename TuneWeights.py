@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import sys
+import time
+import numpy as np
+from Evaluators import default_weights, weights_path, territory_unit
+from PositionCorpus import PositionCorpus
+
+feature_names = ['territory', 'mobility', 'stuck', 'path']  # the order of default_weights' terms
+batch_positions = 1 << 16  # positions whose features are computed at once
+validation_games = 10  # one game in validation_games is kept out of the fit, to measure the error on
+tuning_iterations = 300
+
+
+def popcount(rows) -> np.ndarray:
+    # the set bits of every position, rows is (N, H) uint64
+    if hasattr(np, 'bitwise_count'):  # NumPy 2
+        return np.bitwise_count(rows).sum(axis=1, dtype=np.int64)
+    return np.unpackbits(rows.view(np.uint8), axis=1).sum(axis=1, dtype=np.int64)
+
+
+class BatchBoards:
+    def __init__(self, positions, height, width):
+        '''
+        :param positions: an array of PositionCorpus.position_dtype, of height x width boards (width <= 64).
+
+        The positions as VoronoiEvaluator sees a BitBoard, for all of them at once: a board is an (H,) array of
+        uint64 rows, bit j of row i the cell (i, j), so a BFS front of every position moves to its neighbors
+        with a few shifts of an (N, H) array. The player to move of a position is its player 1.
+        '''
+        assert width <= 64, 'a row of the board is one uint64'
+        count = len(positions)
+        self.row_mask = np.uint64((1 << width) - 1)
+        cells = np.unpackbits(positions['free'], axis=1, count=height * width).reshape(count, height, width)
+        padded = np.zeros((count, height, 64), dtype=np.uint8)
+        padded[:, :, :width] = cells
+        self.free = np.packbits(padded, axis=2, bitorder='little').view('<u8')[:, :, 0].astype(np.uint64)
+        rows = np.arange(count)
+        mover = positions['to_move'].astype(np.int64) - 1
+        self.locs = []
+        for player in (mover, 1 - mover):  # player 1 then player 2 of the evaluation
+            loc = positions['locs'][rows, player].astype(np.int64)
+            bits = np.zeros((count, height), dtype=np.uint64)
+            bits[rows, loc[:, 0]] = np.left_shift(np.uint64(1), loc[:, 1].astype(np.uint64))
+            self.locs.append(bits)
+
+    def expand(self, cells) -> np.ndarray:
+        expanded = ((cells << np.uint64(1)) & self.row_mask) | (cells >> np.uint64(1))
+        expanded[:, 1:] |= cells[:, :-1]
+        expanded[:, :-1] |= cells[:, 1:]
+        return expanded
+
+    def features(self) -> np.ndarray:
+        '''
+        :return: (N, 4) the terms of TerritoryEvaluator (Voronoi territory) for player 1, in the order of
+                 feature_names: the evaluation is their dot product with the weights.
+        '''
+        free = self.free
+        front1 = reached1 = self.locs[0]
+        front2 = reached2 = self.locs[1]
+        mine = np.zeros_like(free)
+        theirs = np.zeros_like(free)
+        while front1.any() or front2.any():
+            front1 = self.expand(front1) & free & ~reached1
+            front2 = self.expand(front2) & free & ~reached2
+            mine |= front1 & ~(reached2 | front2)
+            theirs |= front2 & ~(reached1 | front1)
+            reached1 = reached1 | front1
+            reached2 = reached2 | front2
+        connected = (self.expand(reached1) & reached2).any(axis=1)
+        legal_moves = popcount(self.expand(self.locs[0]) & free)
+        return np.stack([popcount(mine) - popcount(theirs), np.where(legal_moves > 0, -legal_moves, 0),
+                         np.where(legal_moves > 0, 0, -1), np.where(connected, -1, 1)], axis=1).astype(np.float64)
+
+
+def corpus_features(corpus, batch_size=batch_positions):
+    '''
+    The features of every position of the corpus, computed batch_size positions at a time.
+    :return: (features, results, games): (N, 4) features, the results for the player to move, the games.
+    '''
+    features, results, games = [], [], []
+    pending = []
+    pending_count = 0
+    chunks = corpus.chunks()
+    while True:
+        chunk = next(chunks, None)
+        if chunk is not None:
+            pending.append(chunk)
+            pending_count += len(chunk)
+        if pending and (pending_count >= batch_size or chunk is None):
+            positions = np.concatenate(pending)
+            for start in range(0, len(positions), batch_size):
+                batch = positions[start:start + batch_size]
+                features.append(BatchBoards(batch, corpus.height, corpus.width).features())
+                results.append(batch['result'].astype(np.float64))
+                games.append(batch['game'].astype(np.int64))
+            pending, pending_count = [], 0
+        if chunk is None:
+            break
+    if not features:
+        return np.zeros((0, len(feature_names))), np.zeros(0), np.zeros(0, dtype=np.int64)
+    return np.concatenate(features), np.concatenate(results), np.concatenate(games)
+
+
+def sigmoid(values):
+    return 1 / (1 + np.exp(-np.clip(values, -500, 500)))
+
+
+def error(features, targets, weights) -> float:
+    # Texel's error: the mean squared difference of the predicted score and the game's score
+    return float(np.mean((sigmoid(features @ weights) - targets) ** 2))
+
+
+def fit_scale(features, targets, weights) -> float:
+    # the k that makes sigmoid(k * evaluation) predict the scores best, by golden section search of log k
+    low, high = np.log(1e-4), np.log(10.0)
+    ratio = (np.sqrt(5) - 1) / 2
+    for _ in range(60):
+        a, b = high - ratio * (high - low), low + ratio * (high - low)
+        if error(features, targets, np.exp(a) * weights) < error(features, targets, np.exp(b) * weights):
+            high = b
+        else:
+            low = a
+    return float(np.exp((low + high) / 2))
+
+
+def tune(features, targets, start, iterations=tuning_iterations):
+    '''
+    Minimizes error(features, targets, weights) from start, by gradient descent with a backtracking step
+    over standardized features (the territory is tens of cells, the other terms a few units).
+    :return: the weights, with the scale of the evaluation in them.
+    '''
+    spread = features.std(axis=0)
+    spread[spread == 0] = 1
+    scaled = features / spread
+    weights = start * spread
+    step = 1.0
+    current = error(scaled, targets, weights)
+    for _ in range(iterations):
+        predicted = sigmoid(scaled @ weights)
+        gradient = scaled.T @ ((predicted - targets) * predicted * (1 - predicted)) * (2 / len(targets))
+        while step > 1e-12:
+            candidate = weights - step * gradient
+            candidate_error = error(scaled, targets, candidate)
+            if candidate_error < current:
+                weights, current = candidate, candidate_error
+                step *= 2
+                break
+            step /= 2
+        else:
+            break
+    return weights / spread
+
+
+def save_weights(path, weights, info):
+    # weights as Evaluators.load_weights reads them, written to a temporary file and renamed
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(dict(info, weights=weights), f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def check(corpus, positions_num):
+    # compares the batch features of the first positions_num positions with TerritoryEvaluator on their BitBoards
+    from BitBoard import BitBoard
+    from Evaluators import TerritoryEvaluator
+    positions = []
+    for chunk in corpus.chunks():
+        positions.append(chunk[:positions_num - sum(len(part) for part in positions)])
+    positions = np.concatenate(positions)
+    features = BatchBoards(positions, corpus.height, corpus.width).features()
+    boards = corpus.boards(positions)
+    weights = np.array([default_weights[name] for name in feature_names])
+    mismatches = 0
+    for k, position in enumerate(positions):
+        board = boards[k, :position['size'][0], :position['size'][1]]
+        if position['to_move'] == 2:  # the player to move is player 1 of the evaluation
+            board = np.where(board > 0, 3 - board, board)
+        state = BitBoard(board.tolist())
+        if TerritoryEvaluator(state, weights=default_weights).evaluate(state) != territory_unit * features[k] @ weights:
+            mismatches += 1
+    return mismatches
+
+
+def create_flags():
+    d = {'out': weights_path, 'batch': batch_positions, 'iterations': tuning_iterations, 'check': 0}
+    flags_input = sys.argv[2:]
+    while len(flags_input) > 0:
+        flag = flags_input[0]
+        assert flag[0] == '-'
+        flag = flag[1:]
+        val = flags_input[1]
+        if flag == 'out':
+            d['out'] = val
+        else:
+            assert flag in ('batch', 'iterations', 'check'), 'unknown flag ' + flag
+            d[flag] = int(val)
+        flags_input = flags_input[2:]
+    return d
+
+
+if __name__ == '__main__':
+    # python TuneWeights.py corpus_dir [-out weights_file] [-batch n] [-iterations n] [-check n]
+    # fits TerritoryEvaluator's weights to the results of a SelfPlay.py corpus. The players load the weights of
+    # weights/evaluator.json when they are imported (AlphaBetaPlayer's weights_file loads another file).
+    # -check n compares the features of n positions with the evaluator instead of tuning
+    if len(sys.argv) < 2:
+        print('usage: TuneWeights.py corpus_dir [-out weights_file] [-batch n] [-iterations n] [-check n]')
+        exit(-1)
+    d = create_flags()
+    corpus = PositionCorpus(sys.argv[1])
+    if d['check']:
+        mismatches = check(corpus, d['check'])
+        print('checked against TerritoryEvaluator:', mismatches, 'mismatches')
+        exit(1 if mismatches else 0)
+    start = time.time()
+    features, results, games = corpus_features(corpus, d['batch'])
+    seconds = time.time() - start
+    print('features of %d positions in %.2f seconds, %.0f positions/sec' % (
+        len(features), seconds, len(features) / max(seconds, 1e-9)))
+    assert len(features) > 0, 'the corpus is empty'
+    targets = (results + 1) / 2
+    train = games % validation_games != 0
+    validation = ~train if (~train).any() else train
+    default = np.array([default_weights[name] for name in feature_names], dtype=np.float64)
+    scale = fit_scale(features[train], targets[train], default)
+    tuned = tune(features[train], targets[train], scale * default, d['iterations'])
+    assert tuned[0] > 0, 'the territory does not predict the results, no weights written'
+    weights = {name: round(float(weight / tuned[0]), 4) for name, weight in zip(feature_names, tuned)}
+    normalized = np.array([weights[name] for name in feature_names])
+    for name in feature_names:
+        print('%-10s %6s -> %8.4f' % (name, default_weights[name], weights[name]))
+    default_error = error(features[validation], targets[validation], scale * default)
+    tuned_error = error(features[validation], targets[validation], tuned[0] * normalized)
+    print('validation error %.5f -> %.5f (scale %.4f -> %.4f)' % (default_error, tuned_error, scale, tuned[0]))
+    # the weights are relative to the territory's, so the evaluation stays in cells for the search's windows
+    save_weights(d['out'], weights, {'scale': float(tuned[0]), 'positions': len(features),
+                                     'default_error': default_error, 'error': tuned_error,
+                                     'corpus': os.path.abspath(sys.argv[1])})
+    print('weights written to', d['out'])
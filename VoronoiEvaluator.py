@@ -0,0 +1,51 @@
+class VoronoiEvaluator:
+    def __init__(self, state):
+        '''
+        :param state: BitBoard of the map, only its dimensions are used.
+
+        Territory is computed with a simultaneous BFS from both players over the BitBoard masks: a whole
+        BFS front is one int, and shifting it by 1 or by the width moves every cell of it to a neighbor at
+        once. The column masks, built once per map, stop the row wrap-around of the horizontal shifts.
+        '''
+        self.width = state.width
+        left_column = 0
+        for i in range(state.height):
+            left_column |= state.bits[i * state.width]
+        self.not_left_column = state.all_cells ^ left_column
+        self.not_right_column = state.all_cells ^ (left_column << (state.width - 1))
+
+    def expand(self, cells):
+        return (((cells << 1) & self.not_left_column) | ((cells >> 1) & self.not_right_column) |
+                (cells << self.width) | (cells >> self.width))
+
+    def regions(self, state):
+        '''
+        :return: (mine, theirs, contested, connected), the first three as masks of free cells
+            mine - free cells player 1 reaches strictly before player 2.
+            theirs - free cells player 2 reaches strictly before player 1.
+            contested - free cells both players reach at the same step.
+            connected - True <=> there is a path between the players.
+        '''
+        free = state.free
+        front1 = reached1 = state.bits[state.locs[1]]
+        front2 = reached2 = state.bits[state.locs[2]]
+        mine = theirs = contested = 0
+        while front1 or front2:
+            front1 = self.expand(front1) & free & ~reached1
+            front2 = self.expand(front2) & free & ~reached2
+            mine |= front1 & ~(reached2 | front2)
+            theirs |= front2 & ~(reached1 | front1)
+            contested |= front1 & front2
+            reached1 |= front1
+            reached2 |= front2
+        connected = (self.expand(reached1) & reached2) != 0
+        return mine, theirs, contested, connected
+
+    def territory(self, state):
+        # the sizes of regions
+        mine, theirs, contested, connected = self.regions(state)
+        return bin(mine).count('1'), bin(theirs).count('1'), bin(contested).count('1'), connected
+
+    def territory_score(self, state):
+        mine, theirs, _, connected = self.territory(state)
+        return mine - theirs, connected